@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Measures how long it takes to build the juju podspec with a large number
+of provisioned dashboards, and how big that podspec gets.
+
+Usage: python3 bench/dashboards_bench.py [--dashboards 1000] [--panels 20]
+       [--groups 32]
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from uuid import uuid4
+
+sys.path.append('lib')
+sys.path.append('src')
+from adapters.framework import ImageMeta
+import domain
+
+
+def generate_dashboard(panels):
+    return json.dumps({
+        'id': random.randint(1, 100000),
+        'uid': str(uuid4()),
+        'title': str(uuid4()),
+        'schemaVersion': 22,
+        'panels': [{
+            'id': i,
+            'type': 'graph',
+            'title': str(uuid4()),
+            'datasource': 'Prometheus',
+            'gridPos': {'h': 8, 'w': 12, 'x': 12 * (i % 2), 'y': 8 * i},
+            'targets': [{
+                'expr': f'rate(http_requests_total{{job="{uuid4()}"}}[5m])',
+                'legendFormat': '{{instance}}',
+                'refId': 'A',
+            }],
+        } for i in range(panels)],
+    }, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dashboards', type=int, default=1000)
+    parser.add_argument('--panels', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--groups', type=int, default=32)
+    parser.add_argument('--group-size-budget', type=int, default=512000)
+    args = parser.parse_args()
+
+    dashboards = {f'{uuid4()}.json': generate_dashboard(args.panels)
+                  for _ in range(args.dashboards)}
+    charm_config = {
+        'advertised-port': 3000,
+        'dashboards-groups': args.groups,
+        'dashboards-group-size-budget': args.group_size_budget,
+        'dashboards-size-budget': sys.maxsize,
+    }
+    image_meta = ImageMeta({
+        'registrypath': str(uuid4()),
+        'username': str(uuid4()),
+        'password': str(uuid4()),
+    })
+
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        spec = domain.build_juju_pod_spec(app_name='grafana',
+                                          charm_config=charm_config,
+                                          image_meta=image_meta,
+                                          dashboards=dashboards)
+        timings.append(time.perf_counter() - start)
+
+    raw_size = sum(len(i.encode()) for i in dashboards.values())
+    spec_size = len(json.dumps(spec).encode())
+    groups = [i for i in spec['containers'][0]['volumeConfig']
+              if i['mountPath'].startswith(f'{domain.DASHBOARDS_PATH}/')]
+    group_sizes = [sum(len(j['content'].encode()) for j in i['files'])
+                   for i in groups]
+
+    print(f"dashboards:        {args.dashboards} x {args.panels} panels")
+    print(f"raw size:          {raw_size} bytes")
+    print(f"spec size:         {spec_size} bytes")
+    print(f"groups:            {len(groups)} "
+          f"(largest {max(group_sizes)} bytes, "
+          f"median {statistics.median(group_sizes):.0f} bytes)")
+    print(f"build time:        {statistics.median(timings) * 1000:.1f}ms "
+          f"median, {min(timings) * 1000:.1f}ms best of {args.runs}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Runs the hooks of a fleet of N simulated Grafana units concurrently, one
+thread per unit, against a local fake k8s API server. Reports how many
+k8s API requests the fleet makes, how long its hooks take and the API
+QPS it generates as N grows.
+
+The fake API server models pod startup delay, per-request latency and
+throttling: requests beyond --qps-limit within a second get a 429. Each
+unit also gets a stub Grafana that only reports healthy once its pod has
+started.
+
+Usage: python3 bench/k8s_load_bench.py [--units 1 5 10 25] [--hooks 3]
+       [--startup-delay 2] [--latency 0.005] [--qps-limit 0]
+"""
+import argparse
+import collections
+import http.client
+import http.server
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.append('lib')
+sys.path.append('src')
+from ops.charm import (
+    CharmMeta,
+    RelationChangedEvent,
+)
+from ops.framework import (
+    EventSource,
+    Framework,
+    Object,
+    ObjectEvents,
+)
+
+from adapters import (
+    framework,
+    k8s,
+)
+import charm
+import interface_http
+
+JUJU_APP = 'grafana'
+JUJU_MODEL = 'lma'
+PROMETHEUS_APP = 'prometheus'
+PROMETHEUS_RELATION_NAME = 'prometheus-api'
+
+
+class FakeCluster:
+    """
+    The state behind the fake API server: when each pod becomes ready and
+    how many requests were served or throttled.
+    """
+
+    def __init__(self, units, startup_delay, latency, qps_limit, retry_after):
+        self.latency = latency
+        self.qps_limit = qps_limit
+        self.retry_after = retry_after
+        self.requests = collections.Counter()
+
+        self._lock = threading.Lock()
+        self._recent = collections.deque()
+        self._started = time.monotonic()
+        # Pods do not all come up at once
+        self._ready_at = [startup_delay * random.uniform(1, 1.5)
+                          for _ in range(units)]
+
+    def is_pod_ready(self, index):
+        return time.monotonic() - self._started >= self._ready_at[index]
+
+    def is_throttled(self):
+        if not self.qps_limit:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 1:
+                self._recent.popleft()
+            if len(self._recent) >= self.qps_limit:
+                return True
+            self._recent.append(now)
+            return False
+
+    def count(self, kind):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def get_pod_list(self):
+        return {
+            'kind': 'PodList',
+            'items': [self._get_pod(i) for i in range(len(self._ready_at))],
+        }
+
+    def get_service(self, partial):
+        metadata = {'name': PROMETHEUS_APP, 'resourceVersion': '1'}
+        if partial:
+            return {'kind': 'PartialObjectMetadata', 'metadata': metadata}
+
+        return {
+            'kind': 'Service',
+            'metadata': metadata,
+            'spec': {
+                'clusterIP': '10.152.183.1',
+                'ports': [{'port': 9090, 'protocol': 'TCP'}],
+            },
+        }
+
+    def _get_pod(self, index):
+        ready = self.is_pod_ready(index)
+        return {
+            'metadata': {
+                'name': f'{JUJU_APP}-{index}',
+                'annotations': {'juju.io/unit': f'{JUJU_APP}/{index}'},
+            },
+            'status': {
+                'phase': 'Running' if ready else 'Pending',
+                'conditions': [{
+                    'type': 'ContainersReady',
+                    'status': str(ready),
+                }],
+                'podIP': '127.0.0.1',
+                'containerStatuses': [{
+                    'restartCount': 0,
+                    'state': {'running': {}} if ready else
+                    {'waiting': {'reason': 'ContainerCreating'}},
+                }],
+            },
+        }
+
+
+class FakeAPIRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        cluster = self.server.cluster
+        if cluster.is_throttled():
+            cluster.count('throttled')
+            self._respond(429, {'kind': 'Status', 'code': 429},
+                          {'Retry-After': str(cluster.retry_after)})
+            return
+
+        time.sleep(cluster.latency)
+        namespace_path = f'/api/v1/namespaces/{JUJU_MODEL}'
+        if self.path.startswith(f'{namespace_path}/pods?'):
+            cluster.count('pods')
+            self._respond(200, cluster.get_pod_list())
+        elif self.path == f'{namespace_path}/services/{PROMETHEUS_APP}':
+            cluster.count('services')
+            partial = 'PartialObjectMetadata' in self.headers.get('Accept', '')
+            self._respond(200, cluster.get_service(partial))
+        else:
+            cluster.count('other')
+            self._respond(404, {'kind': 'Status', 'code': 404})
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, code, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeGrafanaRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.server.cluster.is_pod_ready(self.server.index):
+            code, payload = 200, json.dumps({'database': 'ok',
+                                             'version': '6.6.2'}).encode()
+        else:
+            code, payload = 503, b''
+
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+SimulatedApp = collections.namedtuple('SimulatedApp', 'name')
+
+
+class SimulatedCharmEvents(ObjectEvents):
+    prometheus_api_relation_changed = EventSource(RelationChangedEvent)
+    grafana_peers_relation_changed = EventSource(RelationChangedEvent)
+
+
+class SimulatedCharm(Object):
+    """
+    Just enough of the charm for interface_http.Client to observe the
+    relation events it needs.
+    """
+    on = SimulatedCharmEvents()
+
+    def __init__(self, framework):
+        super().__init__(framework, None)
+
+
+class SimulatedUnit(framework.FrameworkAdapter):
+    """
+    Stands in for the FrameworkAdapter of one unit. All units share the
+    peer relation's app data, just like units of the same app do. Unit
+    status goes through the real FrameworkAdapter so that only the writes
+    that would reach the controller are counted.
+    """
+
+    def __init__(self, index, peer_data, grafana_port):
+        super().__init__(SimpleNamespace(model=SimpleNamespace(
+            unit=SimpleNamespace(status=None))))
+        self.status_writes = 0
+        self._index = index
+        self._peer_data = peer_data
+        # Prometheus does not publish its address so the leader has to
+        # look up its k8s Service
+        prometheus_app = SimulatedApp(PROMETHEUS_APP)
+        self._prometheus_relation = SimpleNamespace(
+            app=prometheus_app, units=[], data={prometheus_app: {}})
+        self._config = {
+            'advertised-port': grafana_port,
+            'autoscaling-max-replicas': 0,
+            'show-resource-usage': False,
+        }
+
+    def am_i_leader(self):
+        return self._index == 0
+
+    def get_app_name(self):
+        return JUJU_APP
+
+    def get_app_relation_data(self, relation_name):
+        return self._peer_data
+
+    def get_config(self, key=None):
+        return self._config.get(key) if key else self._config
+
+    def get_model_name(self):
+        return JUJU_MODEL
+
+    def get_relations(self, relation_name):
+        if relation_name == PROMETHEUS_RELATION_NAME:
+            return [self._prometheus_relation]
+        return []
+
+    def get_unit_name(self):
+        return f'{JUJU_APP}/{self._index}'
+
+    def set_app_status(self, status):
+        pass
+
+    def set_workload_version(self, version):
+        pass
+
+    def _write_unit_status(self, state_obj):
+        super()._write_unit_status(state_obj)
+        self.status_writes += 1
+
+
+def start_server(handler_cls, cluster, **attrs):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler_cls)
+    server.daemon_threads = True
+    server.cluster = cluster
+    for name, value in attrs.items():
+        setattr(server, name, value)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_hooks(unit, hooks):
+    """
+    Runs a simplified hook sequence of one unit and returns how long each
+    hook took: start waits for the pod to come up, the prometheus relation
+    is handled by interface_http.Client which has the leader resolve it
+    through the k8s Service, and update-status hooks follow.
+    """
+    # The framework's storage must be used by the thread that created it
+    unit_framework = Framework(':memory:', None, CharmMeta(), None)
+    prometheus_client = interface_http.Client(
+        SimulatedCharm(unit_framework), PROMETHEUS_RELATION_NAME,
+        peer_relation_name=charm.PEER_RELATION_NAME)
+    prometheus_client.adapter = unit
+
+    def start():
+        charm.update_unit_status(unit)
+
+    def prometheus_relation_changed():
+        prometheus_client.on_relation_changed(None)
+
+    def update_status():
+        charm.update_unit_status(unit)
+
+    durations = []
+    for hook in [start, prometheus_relation_changed] + [update_status] * hooks:
+        started = time.perf_counter()
+        hook()
+        # What the charm's pre_commit handler does at the end of a hook
+        unit.flush_unit_status()
+        durations.append(time.perf_counter() - started)
+
+    unit_framework.close()
+    return durations
+
+
+def measure(units, args):
+    cluster = FakeCluster(units=units,
+                          startup_delay=args.startup_delay,
+                          latency=args.latency,
+                          qps_limit=args.qps_limit,
+                          retry_after=args.retry_after)
+    api_server = start_server(FakeAPIRequestHandler, cluster)
+    grafana_servers = [start_server(FakeGrafanaRequestHandler, cluster,
+                                    index=i)
+                       for i in range(units)]
+
+    class FakeAPIServer(k8s.APIServer):
+
+        def _connect(self):
+            return http.client.HTTPConnection(*api_server.server_address)
+
+        def _read_token(self):
+            return 'fake-token'
+
+    peer_data = {}
+    simulated_units = [SimulatedUnit(i, peer_data,
+                                     grafana_servers[i].server_address[1])
+                       for i in range(units)]
+
+    started = time.perf_counter()
+    # The bench does not run inside a k8s cluster so the Service's DNS
+    # name would never resolve anyway
+    with patch.object(k8s, 'APIServer', FakeAPIServer), \
+            patch.object(k8s, 'get_service_dns_name', return_value=None), \
+            ThreadPoolExecutor(max_workers=units) as executor:
+        durations = [d for unit_durations in executor.map(
+            lambda unit: run_hooks(unit, args.hooks), simulated_units)
+            for d in unit_durations]
+    elapsed = time.perf_counter() - started
+
+    for server in [api_server] + grafana_servers:
+        server.shutdown()
+        server.server_close()
+
+    total_requests = sum(cluster.requests.values())
+    return {
+        'requests': total_requests,
+        'throttled': cluster.requests['throttled'],
+        'qps': total_requests / elapsed,
+        'p50': statistics.median(durations),
+        'p99': percentile(durations, 99),
+        'status_writes': sum(i.status_writes for i in simulated_units),
+        'elapsed': elapsed,
+    }
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, nargs='+', default=[1, 5, 10, 25])
+    parser.add_argument('--hooks', type=int, default=3,
+                        help='update-status hooks per unit after start')
+    parser.add_argument('--startup-delay', type=float, default=2.0,
+                        help='seconds before the first pod is ready')
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='seconds the fake API server takes per request')
+    parser.add_argument('--qps-limit', type=int, default=0,
+                        help='requests per second before 429s, 0 for none')
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'units':>5} {'requests':>9} {'429s':>6} {'API QPS':>8} "
+          f"{'hook p50':>9} {'hook p99':>9} {'status-set':>10} "
+          f"{'wall':>7}")
+    for units in args.units:
+        result = measure(units, args)
+        print(f"{units:>5} {result['requests']:>9} {result['throttled']:>6} "
+              f"{result['qps']:>8.1f} "
+              f"{result['p50'] * 1000:>7.1f}ms "
+              f"{result['p99'] * 1000:>7.1f}ms "
+              f"{result['status_writes']:>10} "
+              f"{result['elapsed']:>6.2f}s")
+
+
+if __name__ == '__main__':
+    main()
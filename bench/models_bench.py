@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Measures how long it takes to parse a PodList of realistic pods into
+PodStatus objects, how long the status summary loop takes over them, and
+how much memory the parsed statuses retain compared to the raw PodList.
+
+Usage: python3 bench/models_bench.py [--pods 10 100 1000] [--runs 10]
+"""
+import argparse
+import gc
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from unittest.mock import patch
+from uuid import uuid4
+
+sys.path.append('lib')
+sys.path.append('src')
+from adapters import k8s
+import domain
+
+
+def generate_pod(index):
+    container_names = ['grafana', 'grafana-renderer']
+    return {
+        'metadata': {
+            'name': f'grafana-{index}',
+            'namespace': 'lma',
+            'uid': str(uuid4()),
+            'resourceVersion': str(random.randint(1, 10 ** 7)),
+            'creationTimestamp': '2020-02-21T06:40:34Z',
+            'labels': {
+                'juju-app': 'grafana',
+                'controller-revision-hash': f'grafana-{uuid4().hex[:10]}',
+                'statefulset.kubernetes.io/pod-name': f'grafana-{index}',
+            },
+            'annotations': {
+                'apparmor.security.beta.kubernetes.io/pod': 'runtime/default',
+                'juju.io/controller': str(uuid4()),
+                'juju.io/model': str(uuid4()),
+                'juju.io/unit': f'grafana/{index}',
+            },
+            'ownerReferences': [{
+                'apiVersion': 'apps/v1',
+                'kind': 'StatefulSet',
+                'name': 'grafana',
+                'uid': str(uuid4()),
+            }],
+        },
+        'spec': {
+            'containers': [{
+                'name': name,
+                'image': f'{uuid4()}@sha256:{uuid4().hex}{uuid4().hex}',
+                'ports': [{'containerPort': 3000, 'protocol': 'TCP'}],
+                'env': [{'name': str(uuid4()), 'value': str(uuid4())}
+                        for _ in range(5)],
+                'volumeMounts': [{'name': str(uuid4()),
+                                  'mountPath': f'/etc/{uuid4()}'}
+                                 for _ in range(4)],
+            } for name in container_names],
+            'nodeName': str(uuid4()),
+        },
+        'status': {
+            'phase': 'Running',
+            'conditions': [{
+                'type': condition,
+                'status': 'True',
+                'lastTransitionTime': '2020-02-21T06:40:34Z',
+            } for condition in ('Initialized', 'Ready', 'ContainersReady',
+                                'PodScheduled')],
+            'hostIP': '10.0.0.1',
+            'podIP': f'10.1.{index // 256 % 256}.{index % 256}',
+            'startTime': '2020-02-21T06:40:34Z',
+            'containerStatuses': [{
+                'name': name,
+                'ready': True,
+                'restartCount': random.randint(0, 3),
+                'image': str(uuid4()),
+                'imageID': f'docker-pullable://{uuid4()}',
+                'containerID': f'containerd://{uuid4().hex}',
+                'state': {'running': {'startedAt': '2020-02-21T06:40:34Z'}},
+                'lastState': {},
+            } for name in container_names],
+        },
+    }
+
+
+def measure(pod_count, runs):
+    pod_list = {
+        'kind': 'PodList',
+        'items': [generate_pod(i) for i in range(pod_count)],
+    }
+    body = json.dumps(pod_list)
+
+    parse_timings = []
+    summary_timings = []
+    for _ in range(runs):
+        response = json.loads(body)
+        with patch.object(k8s.APIServer, 'get', return_value=response):
+            start = time.perf_counter()
+            pod_statuses = k8s.get_pod_statuses(juju_model='lma',
+                                                juju_app='grafana')
+            parse_timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        domain.build_pod_status_summary(pod_statuses)
+        summary_timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    response = json.loads(body)
+    raw_retained = tracemalloc.get_traced_memory()[0] - baseline
+    with patch.object(k8s.APIServer, 'get', return_value=response):
+        pod_statuses = k8s.get_pod_statuses(juju_model='lma',
+                                            juju_app='grafana')
+    del response
+    gc.collect()
+    parsed_retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    return {
+        'parse': statistics.median(parse_timings),
+        'summary': statistics.median(summary_timings),
+        'raw_retained': raw_retained,
+        'parsed_retained': parsed_retained,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pods', type=int, nargs='+',
+                        default=[10, 100, 1000])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'pods':>6} {'parse':>10} {'per pod':>10} {'summary':>10} "
+          f"{'raw PodList':>12} {'retained':>10}")
+    for pod_count in args.pods:
+        result = measure(pod_count, args.runs)
+        print(f"{pod_count:>6} "
+              f"{result['parse'] * 1000:>8.2f}ms "
+              f"{result['parse'] / pod_count * 10 ** 6:>8.1f}us "
+              f"{result['summary'] * 1000:>8.2f}ms "
+              f"{result['raw_retained']:>12} "
+              f"{result['parsed_retained']:>10}")
+
+
+if __name__ == '__main__':
+    main()
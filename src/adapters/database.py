@@ -0,0 +1,223 @@
+import os
+import sqlite3
+
+# Grafana records its own schema migrations in this table. It fills it
+# in on MySQL when it creates the schema there so it is not copied over.
+SKIPPED_TABLES = ('migration_log',)
+
+# Remembers how far each table got so that an interrupted migration
+# picks up where it left off
+PROGRESS_TABLE = 'charm_sqlite_migration'
+
+
+class MigrationError(Exception):
+    pass
+
+
+# SERVICES
+
+def migrate(source, target, batch_size=1000, batches_per_transaction=10,
+            restart=False, log=None):
+    """
+    Copies the rows of every table that exists in both databases from
+    source to target, only filling in the columns both sides have. Rows
+    are read and written batch_size at a time, so memory use does not
+    depend on the size of a table. Every batches_per_transaction batches
+    are committed together with how far the table got, so that running
+    the migration again resumes from the last commit unless restart is
+    set. Returns the number of rows copied per table. Errors of either
+    database driver are raised as a MigrationError that tells which table
+    the migration got to and how many of its rows were committed.
+    """
+    log = log or (lambda message: None)
+    copied = {}
+    committed = {}
+
+    try:
+        _migrate(source, target, batch_size, batches_per_transaction,
+                 restart, log, copied, committed)
+    except source.errors + target.errors as e:
+        if not copied:
+            raise MigrationError(f"Migration failed: {e}")
+
+        table = list(copied)[-1]
+        raise MigrationError(
+            f"Migration failed at {table} after committing "
+            f"{committed.get(table, 0)} of its {copied[table]} copied rows: "
+            f"{e}")
+
+    return copied
+
+
+def _migrate(source, target, batch_size, batches_per_transaction, restart,
+             log, copied, committed):
+    target.prepare()
+    if restart:
+        target.reset_progress()
+    progress = target.get_progress()
+    target_tables = set(target.get_tables())
+
+    for table in source.get_tables():
+        if table in SKIPPED_TABLES or table == PROGRESS_TABLE:
+            continue
+        if table not in target_tables:
+            log(f"Skipping {table} which does not exist in MySQL")
+            continue
+
+        copied[table] = 0
+        target_columns = set(target.get_columns(table))
+        columns = [i for i in source.get_columns(table)
+                   if i in target_columns]
+
+        uncommitted_batches = 0
+        for last_rowid, rows in source.read_batches(
+                table, columns, batch_size, after_rowid=progress.get(table, 0)):
+            target.write(table, columns, rows)
+            copied[table] += len(rows)
+            uncommitted_batches += 1
+
+            if uncommitted_batches == batches_per_transaction:
+                target.commit(table, last_rowid)
+                committed[table] = copied[table]
+                uncommitted_batches = 0
+                log(f"{table}: copied {copied[table]} rows so far")
+
+        if uncommitted_batches:
+            target.commit(table, last_rowid)
+            committed[table] = copied[table]
+        log(f"{table}: copied {copied[table]} rows")
+
+
+class SQLiteSource:
+    """
+    Reads the tables of Grafana's SQLite database in rowid order, one
+    batch at a time. The database is opened read-only so that a Grafana
+    that still uses it is not disturbed.
+    """
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise MigrationError(f"There is no SQLite database at {path}")
+
+        self._conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+
+    def close(self):
+        self._conn.close()
+
+    def get_columns(self, table):
+        cursor = self._conn.execute(f'SELECT * FROM "{table}" LIMIT 0')
+        return [i[0] for i in cursor.description]
+
+    def get_tables(self):
+        cursor = self._conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite_%' ORDER BY name")
+        return [i[0] for i in cursor]
+
+    def read_batches(self, table, columns, batch_size, after_rowid=0):
+        """
+        Yields (last_rowid, rows) for consecutive batches of rows whose
+        rowid is greater than after_rowid. Paging by rowid rather than by
+        offset keeps every batch as cheap as the first.
+        """
+        column_list = ', '.join(f'"{i}"' for i in columns)
+        query = f'SELECT rowid, {column_list} FROM "{table}" ' \
+                f'WHERE rowid > ? ORDER BY rowid LIMIT ?'
+
+        while True:
+            rows = self._conn.execute(query,
+                                      (after_rowid, batch_size)).fetchall()
+            if not rows:
+                return
+
+            after_rowid = rows[-1][0]
+            yield after_rowid, [row[1:] for row in rows]
+
+
+class MySQLTarget:
+    """
+    Writes batches of rows into the MySQL database that Grafana uses.
+    Rows replace the ones with the same key so that what Grafana seeded
+    when it created the schema, such as the main org and the admin user,
+    is overwritten with what the SQLite database had.
+    """
+    placeholder = '%s'
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    @classmethod
+    def connect(cls, mysql_server_details, connect_timeout=10):
+        try:
+            # Only this migration needs a MySQL client
+            import pymysql
+        except ImportError:
+            raise MigrationError("PyMySQL is not installed")
+
+        try:
+            conn = pymysql.connect(
+                host=mysql_server_details.host,
+                port=int(mysql_server_details.port),
+                user=mysql_server_details.username,
+                password=mysql_server_details.password,
+                database=mysql_server_details.database,
+                charset='utf8mb4',
+                connect_timeout=connect_timeout,
+                # Rows are copied table by table, not in dependency order
+                init_command='SET FOREIGN_KEY_CHECKS = 0')
+        except pymysql.MySQLError as e:
+            raise MigrationError(f"Cannot connect to MySQL: {e}")
+
+        return cls(conn)
+
+    @property
+    def errors(self):
+        import pymysql
+        return (pymysql.MySQLError,)
+
+    def close(self):
+        self._conn.close()
+
+    def commit(self, table, last_rowid):
+        self._execute(f'REPLACE INTO `{PROGRESS_TABLE}` '
+                      f'(table_name, last_rowid) VALUES '
+                      f'({self.placeholder}, {self.placeholder})',
+                      (table, last_rowid))
+        self._conn.commit()
+
+    def get_columns(self, table):
+        cursor = self._execute(f'SELECT * FROM `{table}` LIMIT 0')
+        return [i[0] for i in cursor.description]
+
+    def get_progress(self):
+        cursor = self._execute(
+            f'SELECT table_name, last_rowid FROM `{PROGRESS_TABLE}`')
+        return dict(cursor.fetchall())
+
+    def get_tables(self):
+        return [i[0] for i in self._execute('SHOW TABLES').fetchall()]
+
+    def prepare(self):
+        self._execute(f'CREATE TABLE IF NOT EXISTS `{PROGRESS_TABLE}` ('
+                      f'table_name VARCHAR(190) PRIMARY KEY, '
+                      f'last_rowid BIGINT NOT NULL)')
+        self._conn.commit()
+
+    def reset_progress(self):
+        self._execute(f'DELETE FROM `{PROGRESS_TABLE}`')
+        self._conn.commit()
+
+    def write(self, table, columns, rows):
+        column_list = ', '.join(f'`{i}`' for i in columns)
+        placeholders = ', '.join([self.placeholder] * len(columns))
+        # PyMySQL turns this into multi-row statements of at most
+        # Cursor.max_stmt_length bytes each
+        cursor = self._conn.cursor()
+        cursor.executemany(f'REPLACE INTO `{table}` ({column_list}) '
+                           f'VALUES ({placeholders})', rows)
+
+    def _execute(self, query, args=None):
+        cursor = self._conn.cursor()
+        cursor.execute(query, args or ())
+        return cursor
@@ -1,4 +1,7 @@
 # Adapted from: https://github.com/johnsca/resource-oci-image/tree/e58342913
+import tarfile
+import time
+
 from ops.framework import Object
 from ops.model import (
     BlockedStatus,
@@ -54,29 +57,76 @@ def _fetch_image_meta(image_name, resources_repo):
         return ImageMeta(resource_dict=resource_dict)
 
 
+def _fetch_dashboards(resource_name, resources_repo):
+    try:
+        path = resources_repo.fetch(resource_name)
+    except ModelError:
+        # File resources are optional. Nothing was attached.
+        return {}
+
+    if not path.exists() or path.stat().st_size == 0:
+        return {}
+
+    dashboards = {}
+    try:
+        with tarfile.open(str(path)) as tar:
+            for member in tar.getmembers():
+                if member.isfile() and member.name.endswith('.json'):
+                    dashboards[member.name] = \
+                        tar.extractfile(member).read().decode()
+    except (tarfile.TarError, UnicodeDecodeError):
+        raise ResourceError(resource_name, f'Invalid tarball at {str(path)}')
+
+    return dashboards
+
+
 class FrameworkAdapter:
     '''
     Abstracts out the implementation details of the underlying framework
     so that our Charm object's code is decoupled from it and simplifies
     its own implementation. This is inspired by Alistair Cockburn's
     Hexagonal Architecture.
+
+    Unit status writes are each a status-set call and a write on the
+    controller. Writes of the status that is already set are skipped and
+    changes that come in less than UNIT_STATUS_INTERVAL seconds after the
+    last write are held back so that only the latest of them is written.
+    flush_unit_status writes whatever is held back.
     '''
+    UNIT_STATUS_INTERVAL = 1.0
 
     def __init__(self, framework):
         self._framework = framework
+        self._unit_status = None
+        self._unit_status_written_at = None
+        self._pending_unit_status = None
 
     def am_i_leader(self):
         return self._framework.model.unit.is_leader()
 
+    def flush_unit_status(self):
+        if self._pending_unit_status is not None:
+            self._write_unit_status(self._pending_unit_status)
+
     def get_app_name(self):
         return self._framework.model.app.name
 
+    def get_app_relation_data(self, relation_name):
+        relations = self.get_relations(relation_name)
+        if not relations:
+            return None
+
+        return relations[0].data[self._framework.model.app]
+
     def get_config(self, key=None):
         if key:
             return self._framework.model.config[key]
         else:
             return self._framework.model.config
 
+    def get_dashboards(self, resource_name):
+        return _fetch_dashboards(resource_name, self.get_resources_repo())
+
     def get_image_meta(self, image_name):
         return _fetch_image_meta(image_name, self.get_resources_repo())
 
@@ -86,17 +136,62 @@ class FrameworkAdapter:
     def get_relations(self, relation_name):
         return self._framework.model.relations[relation_name]
 
+    def get_remote_unit_data(self, relation_name):
+        return [dict(relation.data[unit])
+                for relation in self.get_relations(relation_name)
+                for unit in relation.units]
+
+    def get_remote_unit_values(self, relation_name, key):
+        values = []
+        for relation in self.get_relations(relation_name):
+            for unit in relation.units:
+                value = relation.data[unit].get(key)
+                if value:
+                    values.append(value)
+
+        return values
+
     def get_resources_repo(self):
         return self._framework.model.resources
 
     def get_unit_name(self):
         return self._framework.model.unit.name
 
+    def get_unit_relation_data(self, relation_name):
+        relations = self.get_relations(relation_name)
+        if not relations:
+            return None
+
+        return relations[0].data[self._framework.model.unit]
+
     def observe(self, event, handler):
         self._framework.observe(event, handler)
 
-    def set_pod_spec(self, spec_obj):
-        self._framework.model.pod.set_spec(spec_obj)
+    def set_app_status(self, state_obj):
+        self._framework.model.app.status = state_obj
+
+    def set_pod_spec(self, spec_obj, k8s_resources=None):
+        self._framework.model.pod.set_spec(spec_obj, k8s_resources)
 
     def set_unit_status(self, state_obj):
+        if state_obj == self._unit_status:
+            # Changed back before anything else was written
+            self._pending_unit_status = None
+            return
+
+        if self._unit_status_written_at is not None and \
+                time.monotonic() - self._unit_status_written_at < \
+                self.UNIT_STATUS_INTERVAL:
+            self._pending_unit_status = state_obj
+            return
+
+        self._write_unit_status(state_obj)
+
+    def set_workload_version(self, version):
+        self._framework.model.unit.set_workload_version(version)
+
+    def _write_unit_status(self, state_obj):
         self._framework.model.unit.status = state_obj
+        self._unit_status = state_obj
+        self._unit_status_written_at = time.monotonic()
+        self._pending_unit_status = None
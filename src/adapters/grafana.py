@@ -0,0 +1,206 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import ssl
+import time
+
+
+# SERVICES
+
+def connect(host, port, timeout, use_tls=False):
+    """
+    Returns a connection to Grafana on a pod's IP. The certificate is not
+    verified when talking TLS since it does not name the pod's IP.
+    """
+    if not use_tls:
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return http.client.HTTPSConnection(host, port, timeout=timeout,
+                                       context=context)
+
+
+class HealthChecker:
+    """
+    Talks to Grafana's /api/health endpoint directly on the pod's IP,
+    bypassing the k8s API's view of the readiness probe. A single
+    keep-alive connection is reused across calls so that polling in a
+    tight loop does not pay for a new TCP handshake on every check.
+    """
+
+    def __init__(self, host, port, timeout=1.0, use_tls=False):
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._use_tls = use_tls
+        self._conn = None
+
+    def get_health(self):
+        if self._conn is None:
+            self._conn = connect(self._host, self._port, self._timeout,
+                                 self._use_tls)
+
+        try:
+            self._conn.request('GET', '/api/health')
+            response = self._conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            # Grafana is not listening yet or the connection went stale.
+            # Start over with a fresh connection on the next call.
+            self.close()
+            return None
+
+        try:
+            return GrafanaHealth(json.loads(body))
+        except ValueError:
+            return None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class LoadTester:
+    """
+    Sends a mix of dashboard searches, queries against the provisioned
+    Prometheus datasource through /api/ds/query and health checks to
+    Grafana from a pool of worker threads. Each worker reuses its own
+    keep-alive connection so that what gets measured is Grafana and not
+    TCP handshakes.
+    """
+
+    def __init__(self, host, port, timeout=5.0, username=None,
+                 password=None, use_tls=False):
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._use_tls = use_tls
+        self._headers = {'Content-Type': 'application/json'}
+        if username:
+            credentials = f'{username}:{password or ""}'.encode('utf-8')
+            self._headers['Authorization'] = \
+                f'Basic {base64.b64encode(credentials).decode("ascii")}'
+
+    def run(self, requests, concurrency, query='up'):
+        scenarios = [
+            ('search', 'GET', '/api/search?limit=100', None),
+            ('health', 'GET', '/api/health', None),
+        ]
+        datasource_id = self._get_datasource_id('Prometheus')
+        if datasource_id is not None:
+            scenarios.append(('query', 'POST', '/api/ds/query', json.dumps({
+                'from': 'now-1h',
+                'to': 'now',
+                'queries': [{
+                    'refId': 'A',
+                    'datasourceId': datasource_id,
+                    'expr': query,
+                    'intervalMs': 15000,
+                    'maxDataPoints': 240,
+                }],
+            })))
+
+        concurrency = max(1, min(concurrency, requests))
+        shares = [requests // concurrency + (i < requests % concurrency)
+                  for i in range(concurrency)]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            worker_samples = executor.map(
+                lambda worker: self._work(shares[worker], worker, scenarios),
+                range(concurrency))
+            samples = [sample for i in worker_samples for sample in i]
+
+        return LoadTestResult(samples, time.perf_counter() - started)
+
+    def _connect(self):
+        return connect(self._host, self._port, self._timeout, self._use_tls)
+
+    def _get_datasource_id(self, name):
+        conn = self._connect()
+        try:
+            conn.request('GET', f'/api/datasources/name/{name}',
+                         headers=self._headers)
+            response = conn.getresponse()
+            body = response.read()
+            if response.status != 200:
+                return None
+            return json.loads(body).get('id')
+        except (OSError, http.client.HTTPException, ValueError):
+            return None
+        finally:
+            conn.close()
+
+    def _work(self, requests, offset, scenarios):
+        conn = None
+        samples = []
+        for i in range(requests):
+            scenario, method, path, body = \
+                scenarios[(offset + i) % len(scenarios)]
+            if conn is None:
+                conn = self._connect()
+
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=self._headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                # Start over with a fresh connection on the next request
+                conn.close()
+                conn = None
+                ok = False
+            samples.append((scenario, time.perf_counter() - started, ok))
+
+        if conn is not None:
+            conn.close()
+
+        return samples
+
+
+# MODELS
+
+class GrafanaHealth:
+
+    def __init__(self, health_dict):
+        self._health = health_dict
+
+    @property
+    def database(self):
+        return self._health.get('database')
+
+    @property
+    def is_ready(self):
+        return self.database == 'ok'
+
+    @property
+    def version(self):
+        return self._health.get('version')
+
+
+class LoadTestResult:
+
+    def __init__(self, samples, elapsed):
+        self._samples = samples
+        self._elapsed = elapsed
+
+    @property
+    def elapsed(self):
+        return self._elapsed
+
+    @property
+    def samples_by_scenario(self):
+        """
+        Maps each scenario name to the (seconds, ok) pairs of the requests
+        made for it.
+        """
+        samples_by_scenario = {}
+        for scenario, seconds, ok in self._samples:
+            samples_by_scenario.setdefault(scenario, []).append((seconds, ok))
+
+        return samples_by_scenario
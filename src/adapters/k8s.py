@@ -1,11 +1,25 @@
 import json
 import http.client
+import socket
 import ssl
+import time
 
 
 # SERVICES
 
 def get_pod_status(juju_model, juju_app, juju_unit):
+    pod_statuses = get_pod_statuses(juju_model=juju_model,
+                                    juju_app=juju_app)
+
+    return pod_statuses.get(juju_unit, PodStatus(None))
+
+
+def get_pod_statuses(juju_model, juju_app):
+    """
+    Returns the PodStatus of every pod of juju_app keyed by the name of
+    the juju unit that the pod belongs to. This is a single PodList call
+    regardless of how many units the app has.
+    """
     namespace = juju_model
 
     path = f'/api/v1/namespaces/{namespace}/pods?' \
@@ -13,16 +27,15 @@ def get_pod_status(juju_model, juju_app, juju_unit):
 
     api_server = APIServer()
     response = api_server.get(path)
-    status_dict = None
+    pod_statuses = {}
 
-    if response.get('kind', '') == 'PodList' and response['items']:
-        status_dict = next(
-            (i for i in response['items']
-             if i['metadata']['annotations'].get('juju.io/unit') == juju_unit),
-            None
-        )
+    if response.get('kind', '') == 'PodList':
+        for item in response['items']:
+            juju_unit = item['metadata']['annotations'].get('juju.io/unit')
+            if juju_unit:
+                pod_statuses[juju_unit] = PodStatus(item)
 
-    return PodStatus(status_dict)
+    return pod_statuses
 
 
 def get_service_spec(juju_model, juju_app):
@@ -40,84 +53,414 @@ def get_service_spec(juju_model, juju_app):
     return service_spec
 
 
-class APIServer:
+def get_service_dns_name(juju_model, juju_app):
     """
-    Wraps the logic needed to access the k8s API server from inside a pod.
-    It does this by reading the service account token which is mounted onto
-    the pod.
+    Returns the in-cluster DNS name of the Service fronting juju_app if it
+    resolves from where the charm runs, None otherwise. Unlike the
+    Service's cluster IP, the name stays valid when the Service is
+    recreated, and resolving it does not involve the k8s API.
     """
+    dns_name = f'{juju_app}.{juju_model}.svc'
 
-    def get(self, path):
-        return self.request('GET', path)
+    try:
+        socket.getaddrinfo(dns_name, None)
+    except OSError:
+        return None
 
-    def request(self, method, path):
-        with open("/var/run/secrets/kubernetes.io/serviceaccount/token") \
-                as token_file:
-            kube_token = token_file.read()
+    return dns_name
+
+
+def get_service_resource_version(juju_model, juju_app):
+    """
+    Returns the current metadata.resourceVersion of the Service fronting
+    juju_app without downloading the full object. The API server is asked
+    for a PartialObjectMetadata representation which only carries the
+    object's metadata. Servers that do not support it fall back to the
+    full Service object which also carries the resourceVersion.
+    """
+    namespace = juju_model
+
+    path = f'/api/v1/namespaces/{namespace}/services/{juju_app}'
+
+    api_server = APIServer()
+    response = api_server.get(path, headers={
+        'Accept': 'application/json;as=PartialObjectMetadata;'
+                  'g=meta.k8s.io;v=v1,application/json'
+    })
+    resource_version = None
+
+    if response.get('kind', '') in ('PartialObjectMetadata', 'Service'):
+        resource_version = response['metadata'].get('resourceVersion')
+
+    return resource_version
+
+
+def get_pod_metrics(juju_model, pod_name):
+    """
+    Returns the current CPU and memory usage of the pod as reported by
+    the metrics.k8s.io API or None if that API is not available in the
+    cluster (e.g. metrics-server is not deployed).
+    """
+    namespace = juju_model
+
+    path = f'/apis/metrics.k8s.io/v1beta1/namespaces/{namespace}/' \
+           f'pods/{pod_name}'
+
+    api_server = APIServer()
+    response = api_server.get(path)
+    pod_metrics = None
+
+    if response.get('kind', '') == 'PodMetrics':
+        pod_metrics = PodMetrics(response)
+
+    return pod_metrics
+
+
+def apply_horizontal_pod_autoscaler(juju_model, autoscaler):
+    """
+    Replaces the HorizontalPodAutoscaler described by the autoscaler
+    manifest or creates it if it does not exist yet. Returns True if the
+    API server accepted it.
+    """
+    namespace = juju_model
+    name = autoscaler['metadata']['name']
+
+    path = f'/apis/autoscaling/v2beta2/namespaces/{namespace}/' \
+           f'horizontalpodautoscalers'
+
+    api_server = APIServer()
+    response = api_server.request('PUT', f'{path}/{name}', body=autoscaler)
+
+    if response.get('kind', '') == 'Status' and response.get('code') == 404:
+        response = api_server.request('POST', path, body=autoscaler)
+
+    return response.get('kind', '') == 'HorizontalPodAutoscaler'
+
+
+def delete_horizontal_pod_autoscaler(juju_model, juju_app):
+    namespace = juju_model
 
+    path = f'/apis/autoscaling/v2beta2/namespaces/{namespace}/' \
+           f'horizontalpodautoscalers/{juju_app}'
+
+    api_server = APIServer()
+    api_server.request('DELETE', path)
+
+
+def get_autoscaler_status(juju_model, juju_app):
+    namespace = juju_model
+
+    path = f'/apis/autoscaling/v2beta2/namespaces/{namespace}/' \
+           f'horizontalpodautoscalers/{juju_app}'
+
+    api_server = APIServer()
+    response = api_server.get(path)
+    autoscaler_status = None
+
+    if response.get('kind', '') == 'HorizontalPodAutoscaler':
+        autoscaler_status = AutoscalerStatus(response)
+
+    return autoscaler_status
+
+
+def patch_ingress_annotations(juju_model, juju_app, annotations):
+    """
+    Merges annotations into the ingress that juju creates for juju_app
+    when it is exposed. Returns False if there is no such ingress.
+    """
+    namespace = juju_model
+
+    path = f'/apis/networking.k8s.io/v1beta1/namespaces/{namespace}/' \
+           f'ingresses/{juju_app}'
+
+    api_server = APIServer()
+    response = api_server.request(
+        'PATCH', path,
+        headers={'Content-Type': 'application/merge-patch+json'},
+        body={'metadata': {'annotations': annotations}})
+
+    return response.get('kind', '') == 'Ingress'
+
+
+class APIServer:
+    """
+    Wraps the logic needed to access the k8s API server from inside a pod.
+    It does this by reading the service account token which is mounted onto
+    the pod. Requests that the API server throttles with a 429 are retried
+    once the Retry-After period it asks for has passed.
+    """
+    MAX_ATTEMPTS = 3
+    MAX_RETRY_AFTER = 5.0
+
+    def get(self, path, headers=None):
+        return self.request('GET', path, headers=headers)
+
+    def request(self, method, path, headers=None, body=None):
+        headers = dict(headers or {})
+        headers['Authorization'] = f'Bearer {self._read_token()}'
+        if body is not None:
+            body = json.dumps(body)
+            headers.setdefault('Content-Type', 'application/json')
+
+        conn = self._connect()
+        try:
+            for attempt in range(1, self.MAX_ATTEMPTS + 1):
+                conn.request(method=method, url=path, body=body,
+                             headers=headers)
+                response = conn.getresponse()
+                response_body = response.read()
+                if response.status != 429 or attempt == self.MAX_ATTEMPTS:
+                    break
+
+                time.sleep(self._get_retry_after(response))
+        finally:
+            conn.close()
+
+        return json.loads(response_body)
+
+    def _connect(self):
         ssl_context = ssl.SSLContext()
         ssl_context.load_verify_locations(
             '/var/run/secrets/kubernetes.io/serviceaccount/ca.crt')
 
-        headers = {
-            'Authorization': f'Bearer {kube_token}'
-        }
-
-        conn = http.client.HTTPSConnection('kubernetes.default.svc',
+        return http.client.HTTPSConnection('kubernetes.default.svc',
                                            context=ssl_context)
-        conn.request(method=method, url=path, headers=headers)
 
-        return json.loads(conn.getresponse().read())
+    def _get_retry_after(self, response):
+        try:
+            retry_after = float(response.getheader('Retry-After', 1))
+        except ValueError:
+            retry_after = 1
+
+        return min(max(retry_after, 0), self.MAX_RETRY_AFTER)
+
+    def _read_token(self):
+        with open("/var/run/secrets/kubernetes.io/serviceaccount/token") \
+                as token_file:
+            return token_file.read()
 
 
 # MODELS
 
 class PodStatus:
+    """
+    The parts of a k8s Pod object that the charm looks at. They are
+    extracted once when the object is created and the raw Pod object is
+    not kept around, so looking at a status is just an attribute read.
+    A status_dict of None stands for a pod that k8s does not know about.
+    """
+    __slots__ = (
+        '_is_ready',
+        '_last_termination_reason',
+        '_name',
+        '_phase',
+        '_pod_ip',
+        '_restart_count',
+        '_revision',
+        '_waiting_reason',
+    )
 
     def __init__(self, status_dict):
-        self._status = status_dict
-
-    @property
-    def is_ready(self):
-        if not self._status:
-            return False
-
-        return next(
+        self._is_ready = False
+        self._last_termination_reason = None
+        self._name = None
+        self._phase = None
+        self._pod_ip = None
+        self._restart_count = 0
+        self._revision = None
+        self._waiting_reason = None
+
+        if not status_dict:
+            return
+
+        try:
+            metadata = status_dict['metadata']
+            status = status_dict['status']
+            phase = status['phase']
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'Malformed Pod object, missing {e}')
+
+        container_statuses = status.get('containerStatuses', [])
+
+        self._is_ready = next(
             (
                 condition['status'] == "True" for condition
-                in self._status['status']['conditions']
+                in status.get('conditions', [])
                 if condition['type'] == 'ContainersReady'
             ),
             False
         )
+        self._last_termination_reason = next(
+            (
+                container_status['lastState']['terminated'].get('reason')
+                for container_status in container_statuses
+                if 'terminated' in container_status.get('lastState', {})
+            ),
+            None
+        )
+        self._name = metadata.get('name')
+        self._phase = phase
+        self._pod_ip = status.get('podIP')
+        self._restart_count = sum(
+            container_status.get('restartCount', 0)
+            for container_status in container_statuses
+        )
+        # The StatefulSet revision that the pod was created from. Pods
+        # with different revisions mean that a rollout is in progress.
+        self._revision = \
+            metadata.get('labels', {}).get('controller-revision-hash')
+        self._waiting_reason = next(
+            (
+                container_status['state']['waiting'].get('reason')
+                for container_status in container_statuses
+                if 'waiting' in container_status.get('state', {})
+            ),
+            None
+        )
 
     @property
-    def is_running(self):
-        if not self._status:
-            return False
+    def is_ready(self):
+        return self._is_ready
 
-        return self._status['status']['phase'] == 'Running'
+    @property
+    def is_running(self):
+        return self._phase == 'Running'
 
     @property
     def is_unknown(self):
-        return not self._status
+        return self._phase is None
+
+    @property
+    def is_crash_looping(self):
+        return self._waiting_reason == 'CrashLoopBackOff'
+
+    @property
+    def last_termination_reason(self):
+        return self._last_termination_reason
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def pod_ip(self):
+        return self._pod_ip
+
+    @property
+    def restart_count(self):
+        return self._restart_count
+
+    @property
+    def revision(self):
+        return self._revision
+
+    @property
+    def waiting_reason(self):
+        return self._waiting_reason
+
+
+class AutoscalerStatus:
+
+    def __init__(self, autoscaler):
+        self._autoscaler = autoscaler
+
+    @property
+    def current_replicas(self):
+        return self._autoscaler.get('status', {}).get('currentReplicas', 0)
+
+    @property
+    def desired_replicas(self):
+        return self._autoscaler.get('status', {}).get('desiredReplicas', 0)
+
+    @property
+    def min_replicas(self):
+        return self._autoscaler.get('spec', {}).get('minReplicas', 1)
+
+    @property
+    def max_replicas(self):
+        return self._autoscaler.get('spec', {}).get('maxReplicas', 0)
+
+
+class PodMetrics:
+
+    def __init__(self, metrics):
+        self._metrics = metrics
+
+    @property
+    def cpu_millicores(self):
+        return sum(
+            parse_quantity(container['usage']['cpu']) * 1000
+            for container in self._metrics['containers']
+        )
+
+    @property
+    def memory_bytes(self):
+        return sum(
+            parse_quantity(container['usage']['memory'])
+            for container in self._metrics['containers']
+        )
 
 
 class ServiceSpec:
+    """
+    The address of a k8s Service and the resourceVersion it was read at,
+    extracted once from the raw Service object which is then dropped.
+    """
+    __slots__ = (
+        '_host',
+        '_port',
+        '_resource_version',
+    )
 
     def __init__(self, spec):
-        self._spec = spec
+        try:
+            self._host = spec['spec']['clusterIP']
+            ports = spec['spec'].get('ports', [])
+            self._resource_version = spec['metadata'].get('resourceVersion')
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'Malformed Service object, missing {e}')
+
+        self._port = next(
+            (i['port'] for i in ports if i.get('protocol', 'TCP') == 'TCP'),
+            None
+        )
 
     @property
     def host(self):
-        return self._spec['spec']['clusterIP']
+        return self._host
+
+    @property
+    def resource_version(self):
+        return self._resource_version
 
     @property
     def port(self):
-        return next(
-            (
-                i['port'] for i in self._spec['spec']['ports']
-                if i['protocol'] == 'TCP'
-            ),
-            None
-        )
+        return self._port
+
+
+# HELPERS
+
+def parse_quantity(quantity):
+    """
+    Converts a k8s resource quantity such as '250m', '1.5' or '128Mi'
+    into a number of base units (cores or bytes).
+    """
+    suffixes = {
+        'n': 10 ** -9,
+        'u': 10 ** -6,
+        'm': 10 ** -3,
+        'k': 10 ** 3,
+        'M': 10 ** 6,
+        'G': 10 ** 9,
+        'T': 10 ** 12,
+        'Ki': 2 ** 10,
+        'Mi': 2 ** 20,
+        'Gi': 2 ** 30,
+        'Ti': 2 ** 40,
+    }
+
+    for suffix in sorted(suffixes, key=len, reverse=True):
+        if quantity.endswith(suffix):
+            return float(quantity[:-len(suffix)]) * suffixes[suffix]
+
+    return float(quantity)
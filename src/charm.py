@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
+import json
 import logging
 import sys
+import time
 sys.path.append('lib')
 
 from ops.charm import (
@@ -15,21 +17,56 @@ from ops.model import (
     MaintenanceStatus,
 )
 
+import interface_cache
 import interface_http
 import interface_mysql
 
 from adapters import (
+    database,
     framework,
+    grafana,
     k8s,
 )
 
 from domain import (
+    ConfigError,
+    build_horizontal_pod_autoscaler,
+    build_ingress_annotations,
+    build_juju_app_status,
+    build_juju_k8s_resources,
     build_juju_pod_spec,
     build_juju_unit_status,
+    build_juju_unit_status_from_summary,
+    build_pod_spec_hash,
+    build_load_test_summary,
+    build_migration_summary,
+    build_pod_status_summary,
+    build_replica_summary,
+    TLS_PROTOCOLS,
 )
 
 log = logging.getLogger(__name__)
 
+ALERTING_LEADER_KEY = 'alerting-leader'
+AUTOSCALER_APPLIED_KEY = 'autoscaler-applied'
+# Grafana takes a single remote cache. When both are related, Redis wins
+# since it also keeps sessions across restarts of the cache.
+CACHE_TYPE_PRECEDENCE = ('redis', 'memcached')
+CERTIFICATES_RELATION_NAME = 'certificates'
+DASHBOARD_RELATION_NAME = 'grafana-dashboard'
+DASHBOARDS_RESOURCE_NAME = 'dashboards'
+PEER_RELATION_NAME = 'grafana-peers'
+POD_SPEC_HASH_KEY = 'pod-spec-hash'
+POD_SPEC_SET_AT_KEY = 'pod-spec-set-at'
+POD_STATUS_PUBLISHED_AT_KEY = 'pod-status-published-at'
+POD_STATUS_SUMMARY_KEY = 'pod-status-summary'
+# Juju applies a new pod spec after the hook that set it ends. Until k8s
+# has started rolling the pods, they still report as ready.
+POD_SPEC_ROLLOUT_DELAY = 60
+REPLICA_SUMMARY_KEY = 'replica-summary'
+# Grafana's database on the sqlitedb storage
+SQLITE_DB_PATH = '/var/lib/grafana/grafana.db'
+
 
 # CHARM
 
@@ -49,20 +86,41 @@ class Charm(CharmBase):
         # adapter and not directly with the framework.
         self.fw_adapter = framework.FrameworkAdapter(self.framework)
 
-        self.prometheus_client = interface_http.Client(self, 'prometheus-api')
+        self.prometheus_client = interface_http.Client(
+            self, 'prometheus-api', peer_relation_name=PEER_RELATION_NAME)
         self.mysql = interface_mysql.MySQLInterface(self, 'mysql')
+        self.redis = interface_cache.CacheInterface(self, 'redis', 'redis')
+        self.memcached = \
+            interface_cache.CacheInterface(self, 'memcached', 'memcached')
 
         self.state.set_default(
             prometheus_server_details=None,
             mysql_server_details=None,
+            cache_servers={},
         )
 
         # Bind event handlers to events
+        certificates_events = self.on[CERTIFICATES_RELATION_NAME]
+        dashboard_events = self.on[DASHBOARD_RELATION_NAME]
         event_handler_bindings = {
+            certificates_events.relation_changed:
+                self.on_certificates_changed,
+            certificates_events.relation_joined: self.on_certificates_changed,
+            dashboard_events.relation_changed: self.on_dashboards_changed,
+            dashboard_events.relation_departed: self.on_dashboards_changed,
+            self.memcached.on.new_relation: self.on_cache_new_relation,
+            self.memcached.on.relation_broken: self.on_cache_relation_broken,
             self.mysql.on.new_relation: self.on_mysql_new_relation,
+            self.redis.on.new_relation: self.on_cache_new_relation,
+            self.redis.on.relation_broken: self.on_cache_relation_broken,
             self.on.config_changed: self.on_config_changed,
+            self.on.leader_elected: self.on_config_changed,
+            self.on.load_test_action: self.on_load_test_action,
+            self.on.migrate_sqlite_to_mysql_action:
+                self.on_migrate_sqlite_to_mysql_action,
             self.on.start: self.on_start,
             self.on.update_status: self.on_update_status,
+            self.framework.on.pre_commit: self.on_pre_commit,
             self.on.upgrade_charm: self.on_start,
             self.prometheus_client.on.server_available: self.on_prom_available,
         }
@@ -80,8 +138,38 @@ class Charm(CharmBase):
     # tests that contain unused mocks. These tests tend to be hard to follow
     # so to counter that, the logic is moved away from this class.
 
+    def on_cache_new_relation(self, event):
+        log.debug("Received event {}".format(event))
+
+        server_details = event.server_details
+        log.debug("Snapshotting to StoredState")
+        self.state.cache_servers[server_details.cache_type] = \
+            server_details.snapshot()
+
+        log.debug("Calling update_grafana_configuration")
+        on_server_new_relation_handler(event, self.state, self.fw_adapter)
+
+    def on_cache_relation_broken(self, event):
+        log.debug("Received event {}".format(event))
+        self.state.cache_servers.pop(event.cache_type, None)
+
+        log.debug("Calling update_grafana_configuration")
+        on_server_new_relation_handler(event, self.state, self.fw_adapter)
+
+    def on_certificates_changed(self, event):
+        on_certificates_changed_handler(event, self.state, self.fw_adapter)
+
     def on_config_changed(self, event):
-        on_config_changed_handler(event, self.fw_adapter)
+        on_config_changed_handler(event, self.state, self.fw_adapter)
+
+    def on_dashboards_changed(self, event):
+        on_server_new_relation_handler(event, self.state, self.fw_adapter)
+
+    def on_load_test_action(self, event):
+        on_load_test_action_handler(event, self.fw_adapter)
+
+    def on_migrate_sqlite_to_mysql_action(self, event):
+        on_migrate_sqlite_to_mysql_action_handler(event, self.fw_adapter)
 
     def on_mysql_new_relation(self, event):
         log.debug("Received event {}".format(event))
@@ -95,6 +183,11 @@ class Charm(CharmBase):
         log.debug("Calling update_grafana_configuration")
         on_server_new_relation_handler(event, self.state, self.fw_adapter)
 
+    def on_pre_commit(self, event):
+        # The framework commits once the hook's handlers are done. Make
+        # sure that the last unit status set during the hook is recorded.
+        self.fw_adapter.flush_unit_status()
+
     def on_prom_available(self, event):
         log.debug("Received event {}".format(event))
 
@@ -109,10 +202,10 @@ class Charm(CharmBase):
         on_server_new_relation_handler(event, self.state, self.fw_adapter)
 
     def on_start(self, event):
-        on_start_handler(event, self.fw_adapter)
+        on_start_handler(event, self.state, self.fw_adapter)
 
     def on_update_status(self, event):
-        on_update_status_handler(event, self.fw_adapter)
+        on_update_status_handler(event, self.state, self.fw_adapter)
 
 
 # EVENT HANDLERS
@@ -124,50 +217,244 @@ class Charm(CharmBase):
 # similar to controllers in an MVC app in that they are only concerned with
 # coordinating domain models and services.
 
-def on_config_changed_handler(event, fw_adapter):
+def on_certificates_changed_handler(event, state, fw_adapter):
+    request_certificate(fw_adapter)
+    on_server_new_relation_handler(event, state, fw_adapter)
+
+
+def on_config_changed_handler(event, state, fw_adapter):
     log.debug("config_changed event detected")
+    if not set_juju_pod_spec(state, fw_adapter):
+        return
+
+    if not set_autoscaler(fw_adapter):
+        return
+
+    if not set_ingress_annotations(fw_adapter, remove_unset=True):
+        return
+
     update_unit_status(fw_adapter)
 
 
 def on_server_new_relation_handler(event, state, fw_adapter):
     log.debug("Got event {}".format(event))
+    set_juju_pod_spec(state, fw_adapter)
+
+
+def set_juju_pod_spec(state, fw_adapter):
     if not fw_adapter.am_i_leader():
-        return
+        return True
 
+    cache_details = get_cache_server_details(state)
     mysql_details = \
         interface_mysql.MySQLServerDetails.restore(state.mysql_server_details)
     prometheus_details = \
         interface_http.ServerDetails.restore(state.prometheus_server_details)
-
-    juju_pod_spec = build_juju_pod_spec(
-        app_name=fw_adapter.get_app_name(),
-        charm_config=fw_adapter.get_config(),
-        image_meta=fw_adapter.get_image_meta('grafana-image'),
-        mysql_server_details=mysql_details,
-        prometheus_server_details=prometheus_details,
-    )
+    alerting_leader = get_alerting_leader(fw_adapter)
+    tls_certificate = get_tls_certificate(fw_adapter)
+
+    try:
+        juju_pod_spec = build_juju_pod_spec(
+            app_name=fw_adapter.get_app_name(),
+            charm_config=fw_adapter.get_config(),
+            image_meta=fw_adapter.get_image_meta('grafana-image'),
+            mysql_server_details=mysql_details,
+            prometheus_server_details=prometheus_details,
+            cache_server_details=cache_details,
+            dashboards=get_dashboards(fw_adapter),
+            alerting_leader=alerting_leader,
+            tls_certificate=tls_certificate,
+        )
+        juju_k8s_resources = build_juju_k8s_resources(
+            app_name=fw_adapter.get_app_name(),
+            charm_config=fw_adapter.get_config(),
+            tls_certificate=tls_certificate,
+        )
+    except (ConfigError, framework.ResourceError) as err:
+        log.error("Unable to build the podspec: {}".format(err.status.message))
+        fw_adapter.set_unit_status(err.status)
+        return False
+
+    peer_data = fw_adapter.get_app_relation_data(PEER_RELATION_NAME)
+    if peer_data is not None:
+        pod_spec_hash = json.dumps(
+            build_pod_spec_hash(juju_pod_spec, juju_k8s_resources))
+        # juju sets the replicas back to its own scale whenever the pod
+        # spec is set, which would undo what the HorizontalPodAutoscaler
+        # scaled to, so the same pod spec is not set again
+        if peer_data.get(POD_SPEC_HASH_KEY) == pod_spec_hash:
+            log.debug("The juju podspec is unchanged")
+            return True
 
     log.info("Updating juju podspec with new backend details")
-    fw_adapter.set_pod_spec(juju_pod_spec)
+    fw_adapter.set_pod_spec(juju_pod_spec, juju_k8s_resources)
     fw_adapter.set_unit_status(MaintenanceStatus("Configuring pod"))
 
+    if peer_data is not None:
+        published_alerting_leader = json.dumps(alerting_leader)
+        if peer_data.get(ALERTING_LEADER_KEY) != published_alerting_leader:
+            peer_data[ALERTING_LEADER_KEY] = published_alerting_leader
+
+        # Only a changed pod spec rolls the pods. Every write here wakes
+        # up the other units.
+        peer_data[POD_SPEC_HASH_KEY] = pod_spec_hash
+        peer_data[POD_SPEC_SET_AT_KEY] = json.dumps(time.time())
+    return True
+
+
+def get_alerting_leader(fw_adapter):
+    """
+    Returns the name of the leader's pod, which is the only one that
+    evaluates alert rules, or None if every pod evaluates them.
+    """
+    if not fw_adapter.am_i_leader() or \
+            fw_adapter.get_config('alerting-mode') != 'leader':
+        return None
 
-def on_start_handler(event, fw_adapter):
+    return k8s.get_pod_status(juju_model=fw_adapter.get_model_name(),
+                              juju_app=fw_adapter.get_app_name(),
+                              juju_unit=fw_adapter.get_unit_name()).name
+
+
+def is_alerting_leader_stale(fw_adapter):
+    # The leader's pod may only have appeared after the podspec was set
+    alerting_leader = get_alerting_leader(fw_adapter)
+    return alerting_leader is not None and alerting_leader != \
+        get_published_value(fw_adapter, ALERTING_LEADER_KEY, None)
+
+
+def set_autoscaler(fw_adapter):
+    if not fw_adapter.am_i_leader():
+        return True
+
+    juju_model = fw_adapter.get_model_name()
+    juju_app = fw_adapter.get_app_name()
+
+    try:
+        autoscaler = build_horizontal_pod_autoscaler(juju_app,
+                                                     fw_adapter.get_config())
+    except ConfigError as err:
+        log.error("Invalid charm configuration: {}".format(err.status.message))
+        fw_adapter.set_unit_status(err.status)
+        return False
+
+    peer_data = fw_adapter.get_app_relation_data(PEER_RELATION_NAME)
+    if autoscaler:
+        log.info("Applying HorizontalPodAutoscaler {}".format(juju_app))
+        if peer_data is not None:
+            peer_data[AUTOSCALER_APPLIED_KEY] = 'true'
+        if not k8s.apply_horizontal_pod_autoscaler(juju_model=juju_model,
+                                                   autoscaler=autoscaler):
+            log.error("The k8s API rejected the HorizontalPodAutoscaler")
+    elif peer_data is None or peer_data.get(AUTOSCALER_APPLIED_KEY):
+        # Without autoscaling, which is the default, there is nothing to
+        # delete unless it was enabled before
+        log.info("Deleting HorizontalPodAutoscaler {}".format(juju_app))
+        k8s.delete_horizontal_pod_autoscaler(juju_model=juju_model,
+                                             juju_app=juju_app)
+        if peer_data is not None:
+            del peer_data[AUTOSCALER_APPLIED_KEY]
+
+    return True
+
+
+def set_ingress_annotations(fw_adapter, remove_unset=False):
     if not fw_adapter.am_i_leader():
+        return True
+
+    try:
+        annotations = build_ingress_annotations(fw_adapter.get_config())
+    except ConfigError as err:
+        log.error("Invalid charm configuration: {}".format(err.status.message))
+        fw_adapter.set_unit_status(err.status)
+        return False
+
+    if not remove_unset:
+        annotations = {k: v for k, v in annotations.items() if v is not None}
+    if not annotations:
+        return True
+
+    # Only exists while the app is exposed via juju-external-hostname
+    if not k8s.patch_ingress_annotations(
+            juju_model=fw_adapter.get_model_name(),
+            juju_app=fw_adapter.get_app_name(),
+            annotations=annotations):
+        log.debug("No ingress to annotate")
+
+    return True
+
+
+def on_load_test_action_handler(event, fw_adapter):
+    pod_status = k8s.get_pod_status(juju_model=fw_adapter.get_model_name(),
+                                    juju_app=fw_adapter.get_app_name(),
+                                    juju_unit=fw_adapter.get_unit_name())
+    if not pod_status.pod_ip:
+        event.fail("This unit's pod does not have an IP address yet")
         return
 
-    juju_pod_spec = build_juju_pod_spec(
-        app_name=fw_adapter.get_app_name(),
-        charm_config=fw_adapter.get_config(),
-        image_meta=fw_adapter.get_image_meta('grafana-image'),
-    )
+    params = event.params
+    load_tester = grafana.LoadTester(
+        host=pod_status.pod_ip,
+        port=fw_adapter.get_config('advertised-port'),
+        timeout=params['timeout'],
+        username=params.get('username'),
+        password=params.get('password'),
+        use_tls=fw_adapter.get_config('protocol') in TLS_PROTOCOLS)
+    result = load_tester.run(requests=params['requests'],
+                             concurrency=params['concurrency'],
+                             query=params['query'])
+
+    event.set_results(build_load_test_summary(result))
+
+
+def on_migrate_sqlite_to_mysql_action_handler(event, fw_adapter):
+    mysql_server_details = get_mysql_server_details(fw_adapter)
+    if not mysql_server_details:
+        event.fail("There is no MySQL to migrate to. Relate to mysql first.")
+        return
 
-    fw_adapter.set_pod_spec(juju_pod_spec)
-    fw_adapter.set_unit_status(MaintenanceStatus("Configuring pod"))
+    params = event.params
+    try:
+        source = database.SQLiteSource(SQLITE_DB_PATH)
+        target = database.MySQLTarget.connect(mysql_server_details)
+    except database.MigrationError as err:
+        event.fail(str(err))
+        return
 
+    started = time.perf_counter()
+    try:
+        copied = database.migrate(
+            source, target,
+            batch_size=params['batch-size'],
+            batches_per_transaction=params['batches-per-transaction'],
+            restart=params['restart'],
+            log=event.log)
+    except database.MigrationError as err:
+        event.fail(f"{err}. Run the action again to resume.")
+        return
+    finally:
+        source.close()
+        target.close()
+
+    event.set_results(build_migration_summary(copied,
+                                              time.perf_counter() - started))
+
+
+def on_start_handler(event, state, fw_adapter):
+    log.debug("start event detected")
+    # Also runs on upgrade-charm so the pod spec has to carry every
+    # backend and the TLS certificate known so far
+    set_juju_pod_spec(state, fw_adapter)
 
-def on_update_status_handler(event, fw_adapter):
+
+def on_update_status_handler(event, state, fw_adapter):
     log.debug("update_status event detected")
+    if is_alerting_leader_stale(fw_adapter):
+        log.info("Pointing alert evaluation at the leader's pod")
+        set_juju_pod_spec(state, fw_adapter)
+
+    # The app may have been exposed since the last config-changed
+    set_ingress_annotations(fw_adapter)
     update_unit_status(fw_adapter)
 
 
@@ -176,17 +463,224 @@ def update_unit_status(fw_adapter):
     juju_model = fw_adapter.get_model_name()
     juju_app = fw_adapter.get_app_name()
     juju_unit = fw_adapter.get_unit_name()
-
+    is_leader = fw_adapter.am_i_leader()
+
+    # In steady state the leader has already seen this unit's pod in its
+    # own PodList call so there is no need to ask the k8s API again.
+    if not is_leader:
+        published_status = get_published_unit_status(fw_adapter, juju_unit)
+        if published_status:
+            log.debug("Leader reports that this unit's pod is ready")
+            fw_adapter.set_unit_status(published_status)
+            return
+
+    show_resource_usage = fw_adapter.get_config('show-resource-usage')
+    advertised_port = fw_adapter.get_config('advertised-port')
+    use_tls = fw_adapter.get_config('protocol') in TLS_PROTOCOLS
+    autoscaler_status = None
+    if is_leader and fw_adapter.get_config('autoscaling-max-replicas'):
+        autoscaler_status = k8s.get_autoscaler_status(juju_model=juju_model,
+                                                      juju_app=juju_app)
+    health_checker = None
+    k8s_pod_status = k8s.PodStatus(None)
     pod_is_ready = False
 
     while not pod_is_ready:
-        k8s_pod_status = k8s.get_pod_status(juju_model=juju_model,
-                                            juju_app=juju_app,
-                                            juju_unit=juju_unit)
-        juju_unit_status = build_juju_unit_status(k8s_pod_status)
+        # Ask Grafana directly first. This avoids waiting for the next
+        # readiness probe period and the k8s API round trip. The k8s API
+        # remains the fallback for as long as Grafana is not healthy.
+        grafana_health = None
+        if health_checker:
+            grafana_health = health_checker.get_health()
+
+        k8s_pod_metrics = None
+        if not (grafana_health and grafana_health.is_ready):
+            k8s_pod_statuses = k8s.get_pod_statuses(juju_model=juju_model,
+                                                    juju_app=juju_app)
+            if is_leader:
+                publish_pod_statuses(fw_adapter, k8s_pod_statuses,
+                                     autoscaler_status)
+
+            k8s_pod_status = k8s_pod_statuses.get(juju_unit,
+                                                  k8s.PodStatus(None))
+            if show_resource_usage and k8s_pod_status.is_running:
+                k8s_pod_metrics = k8s.get_pod_metrics(
+                    juju_model=juju_model,
+                    pod_name=k8s_pod_status.name)
+
+            if not health_checker and k8s_pod_status.pod_ip:
+                health_checker = grafana.HealthChecker(k8s_pod_status.pod_ip,
+                                                       advertised_port,
+                                                       use_tls=use_tls)
+
+        juju_unit_status = build_juju_unit_status(k8s_pod_status,
+                                                  k8s_pod_metrics,
+                                                  grafana_health)
         fw_adapter.set_unit_status(juju_unit_status)
         pod_is_ready = isinstance(juju_unit_status, ActiveStatus)
 
+    fw_adapter.flush_unit_status()
+
+    if health_checker:
+        grafana_health = grafana_health or health_checker.get_health()
+        if grafana_health and grafana_health.version:
+            fw_adapter.set_workload_version(grafana_health.version)
+        health_checker.close()
+
+
+def get_cache_server_details(state):
+    cache_types = [i for i in CACHE_TYPE_PRECEDENCE
+                   if state.cache_servers.get(i)]
+    if not cache_types:
+        return None
+
+    if len(cache_types) > 1:
+        log.info("Using {} as the remote cache instead of {}".format(
+            cache_types[0], ", ".join(cache_types[1:])))
+    return interface_cache.CacheServerDetails.restore(
+        state.cache_servers[cache_types[0]])
+
+
+def get_dashboards(fw_adapter):
+    dashboards = fw_adapter.get_dashboards(DASHBOARDS_RESOURCE_NAME)
+
+    # Related charms publish a JSON object of dashboard names to dashboards
+    for value in fw_adapter.get_remote_unit_values(DASHBOARD_RELATION_NAME,
+                                                   'dashboards'):
+        try:
+            dashboards.update(json.loads(value))
+        except (TypeError, ValueError):
+            log.warning("Ignoring invalid dashboards relation data")
+
+    return dashboards
+
+
+def get_mysql_server_details(fw_adapter):
+    for remote_data in fw_adapter.get_remote_unit_data('mysql'):
+        try:
+            return interface_mysql.MySQLServerDetails(remote_data)
+        except ValueError:
+            continue
+
+    return None
+
+
+def get_tls_certificate(fw_adapter):
+    """
+    Returns the certificate and key for Grafana to serve from the tls-cert
+    and tls-key config or else from the certificates relation, or None if
+    Grafana does not serve TLS or there is no certificate yet.
+    """
+    charm_config = fw_adapter.get_config()
+    if charm_config.get('protocol') not in TLS_PROTOCOLS:
+        return None
+
+    if charm_config.get('tls-cert') and charm_config.get('tls-key'):
+        return {'cert': charm_config['tls-cert'],
+                'key': charm_config['tls-key']}
+
+    # The CA publishes the certificate under the requesting unit's name
+    prefix = fw_adapter.get_unit_name().replace('/', '_')
+    certs = fw_adapter.get_remote_unit_values(CERTIFICATES_RELATION_NAME,
+                                              f'{prefix}.server.cert')
+    keys = fw_adapter.get_remote_unit_values(CERTIFICATES_RELATION_NAME,
+                                             f'{prefix}.server.key')
+    if not (certs and keys):
+        return None
+
+    return {'cert': certs[0], 'key': keys[0]}
+
+
+def request_certificate(fw_adapter):
+    """
+    Asks the CA on the certificates relation for a certificate that names
+    the app's k8s Service. Only the leader sets the pod spec and so only
+    its certificate is used.
+    """
+    if not fw_adapter.am_i_leader():
+        return
+
+    unit_data = fw_adapter.get_unit_relation_data(CERTIFICATES_RELATION_NAME)
+    if unit_data is None:
+        return
+
+    app_name = fw_adapter.get_app_name()
+    service_name = f'{app_name}.{fw_adapter.get_model_name()}.svc'
+    request = {
+        'common_name': service_name,
+        'sans': json.dumps([service_name, app_name]),
+        'certificate_name': app_name,
+    }
+    for key, value in request.items():
+        if unit_data.get(key) != value:
+            unit_data[key] = value
+
+
+def get_pod_status_summary(fw_adapter):
+    return get_published_value(fw_adapter, POD_STATUS_SUMMARY_KEY, {})
+
+
+def get_published_unit_status(fw_adapter, juju_unit):
+    """
+    Returns the status that the leader's pod status summary gives the
+    unit, or None if the summary may no longer describe the unit's pod.
+    That is the case when it was published before the pods were rolled
+    for the last pod spec, or while the pods come from different
+    revisions because a rollout is in progress.
+    """
+    if not is_pod_status_summary_current(fw_adapter):
+        return None
+
+    summary = get_pod_status_summary(fw_adapter)
+    if len({i.get('revision') for i in summary.values()}) > 1:
+        return None
+
+    return build_juju_unit_status_from_summary(summary.get(juju_unit, {}))
+
+
+def get_pod_spec_rolled_out_at(fw_adapter):
+    return get_published_value(fw_adapter, POD_SPEC_SET_AT_KEY, 0) + \
+        POD_SPEC_ROLLOUT_DELAY
+
+
+def is_pod_status_summary_current(fw_adapter):
+    published_at = get_published_value(fw_adapter,
+                                       POD_STATUS_PUBLISHED_AT_KEY, 0)
+    return published_at >= get_pod_spec_rolled_out_at(fw_adapter)
+
+
+def get_published_value(fw_adapter, key, default):
+    peer_data = fw_adapter.get_app_relation_data(PEER_RELATION_NAME)
+    if not peer_data or key not in peer_data:
+        return default
+
+    return json.loads(peer_data[key])
+
+
+def publish_pod_statuses(fw_adapter, pod_statuses, autoscaler_status=None):
+    summary = build_pod_status_summary(pod_statuses)
+    replica_summary = build_replica_summary(autoscaler_status)
+    # Every write wakes up the other units. An unchanged summary is only
+    # published again once the pods have been rolled for a new pod spec,
+    # so that non-leaders trust it again.
+    is_rolled_out = time.time() >= get_pod_spec_rolled_out_at(fw_adapter)
+    if summary == get_pod_status_summary(fw_adapter) and \
+            replica_summary == get_published_value(fw_adapter,
+                                                   REPLICA_SUMMARY_KEY,
+                                                   None) and \
+            (is_pod_status_summary_current(fw_adapter) or not is_rolled_out):
+        return
+
+    log.debug("Publishing pod status summary {}".format(summary))
+    fw_adapter.set_app_status(build_juju_app_status(summary, replica_summary))
+
+    peer_data = fw_adapter.get_app_relation_data(PEER_RELATION_NAME)
+    if peer_data is not None:
+        peer_data[POD_STATUS_SUMMARY_KEY] = json.dumps(summary, sort_keys=True)
+        peer_data[POD_STATUS_PUBLISHED_AT_KEY] = json.dumps(time.time())
+        peer_data[REPLICA_SUMMARY_KEY] = \
+            json.dumps(replica_summary, sort_keys=True)
+
 
 if __name__ == "__main__":
     main(Charm)
@@ -1,15 +1,103 @@
+import hashlib
+import json
 import logging
+import re
 import textwrap
 import sys
 sys.path.append('lib')
 
+import yaml
+
 from ops.model import (
     ActiveStatus,
+    BlockedStatus,
     MaintenanceStatus,
 )
 
 log = logging.getLogger(__name__)
 
+# grafana.ini section names such as auth.generic_oauth and key names
+INI_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.]+$')
+# Grafana/Prometheus style durations, e.g. 15s, 500ms, 1m30s
+DURATION_PATTERN = re.compile(r'^([0-9]+(ms|s|m|h|d|w|y))+$')
+
+DASHBOARDS_PATH = '/etc/grafana/dashboards'
+# Keeps a dashboard group without dashboards mounted. Grafana only
+# provisions *.json files.
+DASHBOARD_GROUP_PLACEHOLDER = '.keep'
+# ConfigMap keys may only contain these characters
+DASHBOARD_FILENAME_PATTERN = re.compile(r'[^-._a-zA-Z0-9]')
+
+IMAGE_DIGEST_PATTERN = re.compile(r'^sha256:[0-9a-f]{64}$')
+# Plugins live on the sqlitedb storage so that they survive pod restarts
+PLUGINS_PATH = '/var/lib/grafana/plugins'
+ENTRYPOINT_PATH = '/etc/grafana/entrypoint'
+INGRESS_SNIPPET_ANNOTATION = 'nginx.ingress.kubernetes.io/configuration-snippet'
+INGRESS_BACKEND_PROTOCOL_ANNOTATION = \
+    'nginx.ingress.kubernetes.io/backend-protocol'
+# Volumes from Secrets, such as the TLS key's, need a version 3 pod spec
+POD_SPEC_VERSION = 3
+TLS_PATH = '/etc/grafana/tls'
+TLS_PROTOCOLS = ('https', 'h2')
+RENDERER_PORT = 8081
+PLUGIN_PATTERN = re.compile(r'^([a-z0-9][-a-z0-9]*)(@[-+.0-9A-Za-z]+)?$')
+# Only the plugins whose manifest line is new are downloaded, so a
+# restart with unchanged plugins config never touches the network.
+PLUGIN_INSTALLER_SCRIPT = textwrap.dedent("""\
+    desired="$(dirname "$0")/plugins-manifest"
+    installed="$GF_PATHS_PLUGINS/.charm-manifest"
+
+    mkdir -p "$GF_PATHS_PLUGINS"
+    touch "$installed"
+
+    if ! cmp -s "$desired" "$installed"; then
+        while read -r id version; do
+            if ! grep -qxF "$id $version" "$desired"; then
+                grafana-cli --pluginsDir "$GF_PATHS_PLUGINS" \\
+                    plugins remove "$id"
+            fi
+        done < "$installed"
+
+        : > "$installed.new"
+        while read -r id version; do
+            if grep -qxF "$id $version" "$installed" && \\
+                    [ -d "$GF_PATHS_PLUGINS/$id" ]; then
+                echo "$id $version" >> "$installed.new"
+                continue
+            fi
+
+            if [ "$version" = latest ]; then
+                version=""
+            fi
+            # A failed install is retried on the next restart
+            if grafana-cli --pluginsDir "$GF_PATHS_PLUGINS" \\
+                    ${GF_PLUGIN_REPO:+--repo "$GF_PLUGIN_REPO"} \\
+                    plugins install "$id" $version; then
+                echo "$id ${version:-latest}" >> "$installed.new"
+            fi
+        done < "$desired"
+        mv "$installed.new" "$installed"
+    fi
+
+""")
+# k8s sets HOSTNAME to the name of the pod
+ALERTING_LEADER_SCRIPT = textwrap.dedent("""\
+    if [ "$HOSTNAME" != "{leader_pod_name}" ]; then
+        export GF_ALERTING_EXECUTE_ALERTS=false
+        export GF_UNIFIED_ALERTING_EXECUTE_ALERTS=false
+    fi
+
+""")
+
+
+# MODELS
+
+class ConfigError(ValueError):
+
+    def __init__(self, config_key, message):
+        super().__init__(config_key)
+        self.status = BlockedStatus(f'{config_key}: {message}')
+
 
 # DOMAIN SERVICES
 
@@ -20,14 +108,20 @@ def build_juju_pod_spec(app_name,
                         charm_config,
                         image_meta,
                         prometheus_server_details=None,
-                        mysql_server_details=None):
+                        mysql_server_details=None,
+                        cache_server_details=None,
+                        dashboards=None,
+                        alerting_leader=None,
+                        tls_certificate=None):
     advertised_port = charm_config['advertised-port']
 
     spec = {
+        'version': POD_SPEC_VERSION,
         'containers': [{
             'name': app_name,
             'imageDetails': {
-                'imagePath': image_meta.image_path,
+                'imagePath': build_image_path(
+                    image_meta.image_path, charm_config.get('image-digest')),
                 'username': image_meta.repo_username,
                 'password': image_meta.repo_password
             },
@@ -35,27 +129,33 @@ def build_juju_pod_spec(app_name,
                 'containerPort': advertised_port,
                 'protocol': 'TCP'
             }],
-            'readinessProbe': {
-                'httpGet': {
-                    'path': '/api/health',
-                    'port': advertised_port
-                },
-                'initialDelaySeconds': 10,
-                'timeoutSeconds': 30
+            'kubernetes': {
+                'readinessProbe': {
+                    'httpGet': {
+                        'path': '/api/health',
+                        'port': advertised_port
+                    },
+                    'initialDelaySeconds': 10,
+                    'timeoutSeconds': 30
+                }
             }
         }]
     }
 
+    image_pull_policy = charm_config.get('image-pull-policy')
+    if image_pull_policy:
+        if image_pull_policy not in ('Always', 'IfNotPresent', 'Never'):
+            raise ConfigError('image-pull-policy',
+                              'must be one of Always, IfNotPresent or Never')
+        spec['containers'][0]['imagePullPolicy'] = image_pull_policy
+
     if prometheus_server_details:
         ds_path = '/etc/grafana/provisioning/datasources'
         prom_host = prometheus_server_details.host
         prom_port = prometheus_server_details.port
 
-        spec['containers'][0]['files'] = [{
-            # Note: 'name' must comply with DNS-1123 standard
-            'name': 'prometheus-ds',
-            'mountPath': f'{ds_path}',
-            'files': {
+        spec['containers'][0]['volumeConfig'] = [_build_volume_config(
+            'prometheus-ds', f'{ds_path}', {
                 'prometheus.yaml': textwrap.dedent(f"""
                     apiVersion: 1
 
@@ -66,66 +166,931 @@ def build_juju_pod_spec(app_name,
                       url: http://{prom_host}:{prom_port}
                       isDefault: true
                       editable: false
-                """)
+                """) + _to_yaml_block(
+                    'jsonData',
+                    build_prometheus_json_data(charm_config,
+                                               prometheus_server_details),
+                    indent=2)
+            })]
+
+    grafana_ini = build_grafana_ini(charm_config,
+                                    mysql_server_details,
+                                    cache_server_details)
+
+    if charm_config.get('alerting-mode') != 'leader':
+        alerting_leader = None
+    elif not alerting_leader:
+        log.warning("The leader's pod is not known yet. All units "
+                    "evaluate alert rules until it is.")
+
+    if grafana_ini:
+        spec['containers'][0]['volumeConfig'] = \
+            spec['containers'][0].get('volumeConfig', []) + [
+                _build_volume_config('grafana-config', '/etc/grafana', {
+                    'grafana.ini': grafana_ini
+                })]
+
+    protocol = charm_config.get('protocol')
+    if protocol in TLS_PROTOCOLS:
+        if not tls_certificate:
+            raise ConfigError('protocol',
+                              f'{protocol} needs tls-cert and tls-key or a '
+                              f'certificates relation')
+        spec['containers'][0]['kubernetes']['readinessProbe']['httpGet'][
+            'scheme'] = 'HTTPS'
+        # The key lives in the Secret that build_juju_k8s_resources adds,
+        # never in a ConfigMap
+        spec['containers'][0]['volumeConfig'] = \
+            spec['containers'][0].get('volumeConfig', []) + [{
+                # Note: 'name' must comply with DNS-1123 standard
+                'name': 'grafana-tls',
+                'mountPath': TLS_PATH,
+                'secret': {
+                    'name': _tls_secret_name(app_name, tls_certificate),
+                }
+            }]
+
+    renderer_image = charm_config.get('renderer-image')
+    if renderer_image:
+        # Rendering happens in its own container and process so that a
+        # burst of renders is bounded by the renderer's own concurrency
+        # instead of competing with Grafana for CPU.
+        renderer_container = {
+            'name': f'{app_name}-renderer',
+            'imageDetails': {
+                'imagePath': renderer_image,
+            },
+            'ports': [{
+                'containerPort': RENDERER_PORT,
+                'protocol': 'TCP'
+            }],
+            'envConfig': {
+                'HTTP_PORT': RENDERER_PORT,
+                'RENDERING_MODE': 'clustered',
+                'RENDERING_CLUSTERING_MODE': 'browser',
+                'RENDERING_CLUSTERING_MAX_CONCURRENCY':
+                    charm_config['renderer-concurrency'],
             }
+        }
+        if protocol in TLS_PROTOCOLS:
+            # The renderer calls back to Grafana on localhost which the
+            # certificate does not name
+            renderer_container['envConfig']['IGNORE_HTTPS_ERRORS'] = True
+        if image_pull_policy:
+            renderer_container['imagePullPolicy'] = image_pull_policy
+        spec['containers'].append(renderer_container)
+
+    plugin_manifest = build_plugin_manifest(charm_config)
+    if plugin_manifest is not None or alerting_leader:
+        container = spec['containers'][0]
+        container['command'] = ['/bin/sh', f'{ENTRYPOINT_PATH}/entrypoint.sh']
+        entrypoint_files = {
+            'entrypoint.sh': build_entrypoint_script(plugin_manifest,
+                                                     alerting_leader),
+        }
+
+        if plugin_manifest is not None:
+            container['envConfig'] = {'GF_PATHS_PLUGINS': PLUGINS_PATH}
+            if charm_config.get('plugins-repo'):
+                container['envConfig']['GF_PLUGIN_REPO'] = \
+                    charm_config['plugins-repo']
+            entrypoint_files['plugins-manifest'] = plugin_manifest
+
+        container['volumeConfig'] = container.get('volumeConfig', []) + [
+            _build_volume_config('entrypoint', ENTRYPOINT_PATH,
+                                 entrypoint_files)]
+
+    if dashboards:
+        dashboard_groups = build_dashboard_groups(
+            dashboards,
+            group_count=charm_config['dashboards-groups'],
+            group_size_budget=charm_config['dashboards-group-size-budget'],
+            size_budget=charm_config['dashboards-size-budget'])
+
+        # Every group gets its own volume so that a changed dashboard only
+        # replaces the ConfigMap of the group that it belongs to.
+        spec['containers'][0]['volumeConfig'] = \
+            spec['containers'][0].get('volumeConfig', []) + [
+                _build_volume_config(
+                    'dashboards-provider',
+                    '/etc/grafana/provisioning/dashboards', {
+                        'dashboards.yaml': textwrap.dedent(f"""
+                            apiVersion: 1
+
+                            providers:
+                            - name: charm
+                              type: file
+                              disableDeletion: false
+                              allowUiUpdates: false
+                              options:
+                                path: {DASHBOARDS_PATH}
+                        """)
+                    })] + [
+                _build_volume_config(group_name,
+                                     f'{DASHBOARDS_PATH}/{group_name}',
+                                     group_files)
+                for group_name, group_files in dashboard_groups.items()]
+
+    return spec
+
+
+def build_dashboard_groups(dashboards, group_count, group_size_budget,
+                           size_budget):
+    """
+    Minifies and deduplicates the dashboards, which are keyed by an
+    arbitrary source name, and spreads them over group_count groups of
+    files that must each fit in group_size_budget bytes. Returns a dict
+    of group names to files.
+
+    A dashboard's group only depends on its file name, and every group
+    is returned even when it has no dashboards. The volumes in the pod
+    spec therefore stay the same as dashboards change, and only the
+    ConfigMap data of the changed groups is updated, which Grafana
+    reloads without the pods being rolled.
+    """
+    dashboard_files = {}
+
+    for source_name, dashboard in sorted(dashboards.items()):
+        try:
+            filename, content = _minify_dashboard(dashboard)
+        except ValueError:
+            log.warning("Skipping invalid dashboard {}".format(source_name))
+            continue
+
+        if dashboard_files.get(filename, content) != content:
+            log.warning("Dashboard {} replaces another dashboard with the "
+                        "same uid".format(source_name))
+        dashboard_files[filename] = content
+
+    total_size = sum(len(i.encode()) for i in dashboard_files.values())
+    if total_size > size_budget:
+        raise ConfigError('dashboards-size-budget',
+                          f'dashboards need {total_size} bytes')
+
+    if group_count < 1:
+        raise ConfigError('dashboards-groups', 'must be at least 1')
+
+    groups = {f'dashboards-{i}': {} for i in range(group_count)}
+    for filename, content in sorted(dashboard_files.items()):
+        size = len(content.encode())
+        if size > group_size_budget:
+            raise ConfigError('dashboards-group-size-budget',
+                              f'{filename} alone needs {size} bytes')
+
+        group_name = \
+            f'dashboards-{_content_hash(filename, 8) % group_count}'
+        groups[group_name][filename] = content
+
+    for group_name, group_files in groups.items():
+        group_size = sum(len(i.encode()) for i in group_files.values())
+        if group_size > group_size_budget:
+            raise ConfigError('dashboards-groups',
+                              f'{group_name} needs {group_size} bytes, '
+                              f'more groups are needed')
+        if not group_files:
+            group_files[DASHBOARD_GROUP_PLACEHOLDER] = ''
+
+    return groups
+
+
+def build_pod_spec_hash(juju_pod_spec, juju_k8s_resources):
+    """
+    Returns a hash that changes whenever the pod spec or its k8s_resources
+    do, and with them the pods.
+    """
+    return hashlib.sha256(json.dumps([juju_pod_spec, juju_k8s_resources],
+                                     sort_keys=True).encode()).hexdigest()
+
+
+def build_juju_k8s_resources(app_name, charm_config, tls_certificate=None):
+    """
+    Returns the k8s_resources that go along with the juju podspec, or
+    None if there are none. These hold the certificate and key that
+    Grafana serves TLS with.
+    """
+    k8s_resources = {}
+
+    if charm_config.get('protocol') in TLS_PROTOCOLS and tls_certificate:
+        k8s_resources['secrets'] = [{
+            'name': _tls_secret_name(app_name, tls_certificate),
+            'type': 'kubernetes.io/tls',
+            'stringData': {
+                'tls.crt': tls_certificate['cert'],
+                'tls.key': tls_certificate['key'],
+            },
         }]
 
+    if not k8s_resources:
+        return None
+
+    return {
+        'kubernetesResources': k8s_resources,
+    }
+
+
+def build_horizontal_pod_autoscaler(app_name, charm_config):
+    """
+    Returns the HorizontalPodAutoscaler manifest that scales the app's
+    pods on CPU utilization, or None if autoscaling is disabled.
+    """
+    max_replicas = charm_config.get('autoscaling-max-replicas')
+    if not max_replicas:
+        return None
+
+    min_replicas = charm_config['autoscaling-min-replicas']
+    if min_replicas < 1:
+        raise ConfigError('autoscaling-min-replicas', 'must be at least 1')
+    if max_replicas < min_replicas:
+        raise ConfigError('autoscaling-max-replicas',
+                          'must not be lower than autoscaling-min-replicas')
+
+    cpu_target = charm_config['autoscaling-cpu-target']
+    if cpu_target < 1:
+        raise ConfigError('autoscaling-cpu-target', 'must be at least 1')
+
+    return {
+        'apiVersion': 'autoscaling/v2beta2',
+        'kind': 'HorizontalPodAutoscaler',
+        'metadata': {
+            'name': app_name,
+            'labels': {
+                'juju-app': app_name,
+            },
+        },
+        'spec': {
+            # Juju runs the pods of apps with storage as a StatefulSet
+            'scaleTargetRef': {
+                'apiVersion': 'apps/v1',
+                'kind': 'StatefulSet',
+                'name': app_name,
+            },
+            'minReplicas': min_replicas,
+            'maxReplicas': max_replicas,
+            'metrics': [{
+                'type': 'Resource',
+                'resource': {
+                    'name': 'cpu',
+                    'target': {
+                        'type': 'Utilization',
+                        'averageUtilization': cpu_target,
+                    },
+                },
+            }],
+        },
+    }
+
+
+def build_image_path(image_path, image_digest):
+    if not image_digest:
+        return image_path
+
+    if not IMAGE_DIGEST_PATTERN.match(image_digest):
+        raise ConfigError('image-digest', 'must be of the form sha256:<hex>')
+
+    # Pinning by digest replaces any tag or digest in the resource's path
+    image_name = image_path.split('@')[0]
+    if image_name.rfind(':') > image_name.rfind('/'):
+        image_name = image_name[:image_name.rfind(':')]
+
+    return f'{image_name}@{image_digest}'
+
+
+def build_entrypoint_script(plugin_manifest, alerting_leader):
+    """
+    Returns the script that wraps the grafana/grafana image's /run.sh
+    entrypoint to prepare the pod before Grafana starts.
+    """
+    script = "#!/bin/sh\n"
+
+    if plugin_manifest is not None:
+        script += PLUGIN_INSTALLER_SCRIPT
+    if alerting_leader:
+        script += ALERTING_LEADER_SCRIPT.format(leader_pod_name=alerting_leader)
+
+    return script + 'exec /run.sh "$@"\n'
+
+
+def build_plugin_manifest(charm_config):
+    """
+    Returns the manifest of plugins to install, one "<id> <version>" line
+    per plugin, or None if no plugins are listed and the image's own
+    entrypoint should be left alone.
+    """
+    plugins = (charm_config.get('plugins') or '').replace(',', ' ').split()
+    if not plugins:
+        return None
+
+    manifest = {}
+    for plugin in plugins:
+        match = PLUGIN_PATTERN.match(plugin)
+        if not match:
+            raise ConfigError('plugins',
+                              f'{plugin} is not of the form id[@version]')
+        plugin_id, version = match.groups()
+        manifest[plugin_id] = version[1:] if version else 'latest'
+
+    return "".join(f"{k} {v}\n" for k, v in sorted(manifest.items()))
+
+
+def build_grafana_ini(charm_config,
+                      mysql_server_details=None,
+                      cache_server_details=None):
+    """
+    Merges the sections that the charm generates from its config and
+    relations with the grafana-ini-overrides config. Sections and keys
+    are sorted so that the same input always renders the same bytes.
+    """
     if mysql_server_details:
-        mysql_db_config = {
-            # Note: 'name' must comply with DNS-1123 standard
-            'name': 'mysql-db-config',
-            'mountPath': '/etc/grafana',
-            'files': {
-                'grafana.ini': textwrap.dedent(f"""
-                    [database]
-                    type = mysql
-                    host = {mysql_server_details.address}
-                    name = {mysql_server_details.database}
-                    user = {mysql_server_details.username}
-                    password = {mysql_server_details.password}
-
-                    ;ca_cert_path =
-                    ;client_key_path =
-                    ;client_cert_path =
-                    ;server_cert_name =
-                    # Max idle conn setting default is 2
-                    ;max_idle_conn = 2
-
-                    # Max conn setting default is 0 (mean not set)
-                    ;max_open_conn =
-
-                    # Connection Max Lifetime default is 14400
-                    # (means 14400 seconds or 4 hours)
-                    ;conn_max_lifetime = 14400
-
-                    # Set to true to log the sql calls and execution times.
-                    ;log_queries =
-                    """)
-            }
+        database_config = {
+            'type': 'mysql',
+            'host': mysql_server_details.address,
+            'name': mysql_server_details.database,
+            'user': mysql_server_details.username,
+            'password': mysql_server_details.password,
+        }
+    else:
+        # Only the sqlitedb storage backs this unit
+        database_config = build_sqlite_database_config(charm_config)
+
+    remote_cache_config = build_remote_cache_config(cache_server_details,
+                                                    mysql_server_details)
+
+    sections = {
+        'alerting': build_alerting_config(charm_config),
+        'database': database_config,
+        'dataproxy': build_dataproxy_config(charm_config),
+        'remote_cache': remote_cache_config,
+        'rendering': build_rendering_config(charm_config),
+        'server': build_server_config(charm_config),
+    }
+
+    # Overriding these would point Grafana away from its related backends
+    relation_keys = {
+        'database': set(database_config) if mysql_server_details else set(),
+        'remote_cache': set(remote_cache_config),
+    }
+
+    overrides = _parse_grafana_ini_overrides(
+        charm_config.get('grafana-ini-overrides'))
+    for section, settings in overrides.items():
+        conflicts = relation_keys.get(section, set()) & set(settings)
+        if conflicts:
+            raise ConfigError('grafana-ini-overrides',
+                              f'{section}.{min(conflicts)} is provided '
+                              f'by a relation')
+        sections[section] = dict(sections.get(section, {}), **settings)
+
+    return "".join(_to_ini_section(name, sections[name])
+                   for name in sorted(sections))
+
+
+def build_alerting_config(charm_config):
+    alerting_mode = charm_config.get('alerting-mode')
+    if alerting_mode and alerting_mode not in ('all', 'leader'):
+        raise ConfigError('alerting-mode', 'must be either all or leader')
+
+    config_keys = {
+        'alerting-concurrent-render-limit': 'concurrent_render_limit',
+        'alerting-evaluation-timeout': 'evaluation_timeout_seconds',
+    }
+    alerting_config = {}
+
+    for config_key, ini_key in config_keys.items():
+        value = charm_config.get(config_key)
+        if value is None:
+            continue
+        if value < 1:
+            raise ConfigError(config_key, 'must be at least 1')
+        alerting_config[ini_key] = value
+
+    return alerting_config
+
+
+def build_remote_cache_config(cache_server_details, mysql_server_details):
+    # Sessions and cached data must be shared by all units or else load
+    # balanced users keep missing the cache of the unit they land on.
+    if cache_server_details and cache_server_details.cache_type == 'redis':
+        connstr = f'addr={cache_server_details.address},pool_size=100,' \
+                  f'db=0,ssl=false'
+        if cache_server_details.password:
+            connstr += f',password={cache_server_details.password}'
+        remote_cache_config = {
+            'type': 'redis',
+            'connstr': connstr,
+        }
+    elif cache_server_details:
+        remote_cache_config = {
+            'type': 'memcached',
+            'connstr': cache_server_details.address,
         }
+    elif mysql_server_details:
+        # An empty connstr makes Grafana use its own [database] settings
+        remote_cache_config = {
+            'type': 'database',
+        }
+    else:
+        remote_cache_config = {}
+
+    return remote_cache_config
+
+
+def build_dataproxy_config(charm_config):
+    config_keys = {
+        'dataproxy-timeout': 'timeout',
+        'dataproxy-dial-timeout': 'dialTimeout',
+        'dataproxy-keep-alive-seconds': 'keep_alive_seconds',
+        'dataproxy-max-idle-connections': 'max_idle_connections',
+        'dataproxy-max-conns-per-host': 'max_conns_per_host',
+    }
+    dataproxy_config = {}
+
+    for config_key, ini_key in config_keys.items():
+        value = charm_config.get(config_key)
+        if value is None:
+            continue
+        if value < 0:
+            raise ConfigError(config_key, 'must not be negative')
+        dataproxy_config[ini_key] = value
 
-        spec['containers'][0]['files'] = spec['containers'][0].get('files', [])
+    return dataproxy_config
 
-        if spec['containers'][0]['files']:
-            spec['containers'][0]['files'].append(mysql_db_config)
+
+def build_rendering_config(charm_config):
+    if not charm_config.get('renderer-image'):
+        return {}
+
+    concurrency = charm_config['renderer-concurrency']
+    if concurrency < 1:
+        raise ConfigError('renderer-concurrency', 'must be at least 1')
+
+    # Both containers share the pod's network namespace
+    advertised_port = charm_config['advertised-port']
+    scheme = 'https' if charm_config.get('protocol') in TLS_PROTOCOLS \
+        else 'http'
+    return {
+        'server_url': f'http://localhost:{RENDERER_PORT}/render',
+        'callback_url': f'{scheme}://localhost:{advertised_port}/',
+        'concurrent_render_request_limit': concurrency,
+    }
+
+
+def build_server_config(charm_config):
+    server_config = {}
+
+    for config_key, ini_key in (('enable-gzip', 'enable_gzip'),
+                                ('router-logging', 'router_logging')):
+        value = charm_config.get(config_key)
+        if value is not None:
+            server_config[ini_key] = value
+
+    cdn_url = charm_config.get('cdn-url')
+    if cdn_url:
+        if not cdn_url.startswith(('http://', 'https://')):
+            raise ConfigError('cdn-url', 'must be an http or https URL')
+        server_config['cdn_url'] = cdn_url
+
+    protocol = charm_config.get('protocol')
+    if protocol:
+        if protocol not in ('http',) + TLS_PROTOCOLS:
+            raise ConfigError('protocol', 'must be one of http, https or h2')
+        if protocol in TLS_PROTOCOLS:
+            # h2 is HTTP/2 over TLS. Browsers multiplex every panel query
+            # of a dashboard over a single connection instead of queueing
+            # them behind six HTTP/1.1 connections.
+            server_config['protocol'] = protocol
+            server_config['cert_file'] = f'{TLS_PATH}/tls.crt'
+            server_config['cert_key'] = f'{TLS_PATH}/tls.key'
+
+    return server_config
+
+
+def build_ingress_annotations(charm_config):
+    """
+    Returns the annotations to merge into the ingress that juju creates
+    when the app is exposed. A None value removes that annotation.
+    """
+    snippet = []
+
+    if charm_config.get('ingress-gzip'):
+        snippet += [
+            'gzip on;',
+            'gzip_types text/css application/javascript application/json '
+            'image/svg+xml;',
+        ]
+
+    static_max_age = charm_config.get('ingress-static-max-age')
+    if static_max_age:
+        if static_max_age < 0:
+            raise ConfigError('ingress-static-max-age',
+                              'must not be negative')
+        # Grafana serves its JS, CSS, fonts and images under /public/
+        snippet += [
+            'if ($request_uri ~* "^/public/") {',
+            f'  expires {static_max_age}s;',
+            '}',
+        ]
+
+    # Grafana no longer accepts plain HTTP once it serves TLS
+    backend_protocol = 'HTTPS' \
+        if charm_config.get('protocol') in TLS_PROTOCOLS else None
+
+    return {
+        INGRESS_SNIPPET_ANNOTATION:
+            "".join(f"{i}\n" for i in snippet) if snippet else None,
+        INGRESS_BACKEND_PROTOCOL_ANNOTATION: backend_protocol,
+    }
+
+
+def build_sqlite_database_config(charm_config):
+    database_config = {}
+
+    wal = charm_config.get('sqlite-wal')
+    if wal is not None:
+        database_config['wal'] = wal
+
+    cache_mode = charm_config.get('sqlite-cache-mode')
+    if cache_mode:
+        if cache_mode not in ('private', 'shared'):
+            raise ConfigError('sqlite-cache-mode',
+                              'must be either private or shared')
+        database_config['cache_mode'] = cache_mode
+
+    for config_key, ini_key in (('sqlite-query-retries', 'query_retries'),
+                                ('sqlite-transaction-retries',
+                                 'transaction_retries')):
+        value = charm_config.get(config_key)
+        if value is None:
+            continue
+        if value < 0:
+            raise ConfigError(config_key, 'must not be negative')
+        database_config[ini_key] = value
+
+    if database_config:
+        database_config['type'] = 'sqlite3'
+
+    return database_config
+
+
+def build_prometheus_json_data(charm_config, prometheus_server_details):
+    json_data = {}
+
+    http_method = charm_config.get('prometheus-http-method')
+    if http_method:
+        if http_method not in ('GET', 'POST'):
+            raise ConfigError('prometheus-http-method',
+                              'must be either GET or POST')
+        json_data['httpMethod'] = http_method
+
+    # Default to the scrape interval that the Prometheus side advertises
+    # so that range queries are not resolved finer than the data itself.
+    time_interval = charm_config.get('prometheus-time-interval')
+    if time_interval:
+        _validate_duration('prometheus-time-interval', time_interval)
+        json_data['timeInterval'] = time_interval
+    elif prometheus_server_details.scrape_interval:
+        scrape_interval = prometheus_server_details.scrape_interval
+        if DURATION_PATTERN.match(scrape_interval):
+            json_data['timeInterval'] = scrape_interval
         else:
-            spec['containers'][0]['files'] = [mysql_db_config]
+            # Not the operator's doing so Grafana's default is used
+            log.warning("Ignoring the invalid scrape interval {} "
+                        "advertised by Prometheus".format(scrape_interval))
 
-    return spec
+    query_timeout = charm_config.get('prometheus-query-timeout')
+    if query_timeout:
+        _validate_duration('prometheus-query-timeout', query_timeout)
+        json_data['queryTimeout'] = query_timeout
+
+    if charm_config.get('prometheus-incremental-querying'):
+        json_data['incrementalQuerying'] = True
+
+    cache_level = charm_config.get('prometheus-cache-level')
+    if cache_level:
+        if cache_level not in ('None', 'Low', 'Medium', 'High'):
+            raise ConfigError('prometheus-cache-level',
+                              'must be one of None, Low, Medium or High')
+        json_data['cacheLevel'] = cache_level
+
+    custom_query_parameters = \
+        charm_config.get('prometheus-custom-query-parameters')
+    if custom_query_parameters:
+        if not all('=' in i for i in custom_query_parameters.split('&')):
+            raise ConfigError('prometheus-custom-query-parameters',
+                              'must be of the form key1=value1&key2=value2')
+        json_data['customQueryParameters'] = custom_query_parameters
 
+    return json_data
 
-def build_juju_unit_status(pod_status):
-    if pod_status.is_unknown:
+
+def build_juju_unit_status(pod_status, pod_metrics=None, grafana_health=None):
+    if grafana_health and grafana_health.is_ready:
+        log.debug("grafana reports that it is healthy")
+        unit_status = ActiveStatus(_with_pod_details(
+            "", pod_status, pod_metrics))
+    elif grafana_health:
+        log.debug("grafana reports that its database is not ok")
+        unit_status = MaintenanceStatus(_with_pod_details(
+            f"Grafana database is {grafana_health.database}",
+            pod_status, pod_metrics))
+    elif pod_status.is_unknown:
         log.debug("k8s pod status is unknown")
         unit_status = MaintenanceStatus("Waiting for pod to appear")
     elif not pod_status.is_running:
         log.debug("k8s pod status is running")
-        unit_status = MaintenanceStatus("Pod is starting")
+        unit_status = MaintenanceStatus(_with_pod_details(
+            "Pod is starting", pod_status, pod_metrics))
     elif pod_status.is_running and not pod_status.is_ready:
         log.debug("k8s pod status is running but not ready")
-        unit_status = MaintenanceStatus("Pod is getting ready")
+        unit_status = MaintenanceStatus(_with_pod_details(
+            "Pod is getting ready", pod_status, pod_metrics))
     elif pod_status.is_running and pod_status.is_ready:
         log.debug("k8s pod status is running and ready")
-        unit_status = ActiveStatus()
+        unit_status = ActiveStatus(_with_pod_details(
+            "", pod_status, pod_metrics))
 
     return unit_status
+
+
+def build_juju_unit_status_from_summary(unit_summary):
+    """
+    Returns the status of a unit from the entry that the leader published
+    for it in the pod status summary, or None if the leader does not
+    report its pod as ready.
+    """
+    if unit_summary.get('state') != 'ready':
+        return None
+
+    return ActiveStatus("; ".join(_pod_details(
+        None, unit_summary.get('last-terminated'),
+        unit_summary.get('restarts', 0))))
+
+
+def _pod_details(waiting_reason, last_termination_reason, restart_count):
+    details = []
+
+    if waiting_reason:
+        details.append(waiting_reason)
+    if last_termination_reason:
+        details.append(f"last terminated: {last_termination_reason}")
+    if restart_count:
+        details.append(f"{restart_count} restarts")
+
+    return details
+
+
+def _with_pod_details(message, pod_status, pod_metrics):
+    details = _pod_details(pod_status.waiting_reason,
+                           pod_status.last_termination_reason,
+                           pod_status.restart_count)
+    if pod_metrics:
+        details.append(f"cpu {pod_metrics.cpu_millicores:.0f}m, "
+                       f"mem {pod_metrics.memory_bytes / 2 ** 20:.0f}Mi")
+
+    if not details:
+        return message
+    elif not message:
+        return "; ".join(details)
+    else:
+        return "{} ({})".format(message, "; ".join(details))
+
+
+def build_pod_status_summary(pod_statuses):
+    summary = {}
+
+    for juju_unit, pod_status in pod_statuses.items():
+        if pod_status.is_crash_looping:
+            state = 'crash-looping'
+        elif pod_status.is_running and pod_status.is_ready:
+            state = 'ready'
+        else:
+            state = 'starting'
+
+        summary[juju_unit] = {
+            'state': state,
+            'restarts': pod_status.restart_count,
+            'last-terminated': pod_status.last_termination_reason,
+            'revision': pod_status.revision,
+        }
+
+    return summary
+
+
+def build_replica_summary(autoscaler_status):
+    if not autoscaler_status:
+        return None
+
+    return {
+        'current': autoscaler_status.current_replicas,
+        'desired': autoscaler_status.desired_replicas,
+        'min': autoscaler_status.min_replicas,
+        'max': autoscaler_status.max_replicas,
+    }
+
+
+def build_juju_app_status(pod_status_summary, replica_summary=None):
+    states = [i['state'] for i in pod_status_summary.values()]
+
+    ready = states.count('ready')
+    starting = states.count('starting')
+    crash_looping = states.count('crash-looping')
+    restarts = sum(i['restarts'] for i in pod_status_summary.values())
+
+    message = f"{ready}/{len(states)} units ready, {starting} starting, " \
+              f"{crash_looping} crash-looping, {restarts} restarts"
+
+    # The autoscaler and juju agree once every desired pod became a unit
+    is_scaling = False
+    if replica_summary:
+        message += f", {replica_summary['current']}/" \
+                   f"{replica_summary['desired']} replicas"
+        is_scaling = \
+            len(states) != replica_summary['desired'] or \
+            replica_summary['current'] != replica_summary['desired']
+
+        # juju sets the replicas back to its own scale whenever it applies
+        # the pod spec, so a scale outside the autoscaler's bounds makes the
+        # two scale the pods back and forth
+        min_replicas = replica_summary.get('min')
+        max_replicas = replica_summary.get('max')
+        if min_replicas and max_replicas and \
+                not min_replicas <= len(states) <= max_replicas:
+            log.debug("The juju scale is outside the autoscaler's bounds")
+            return BlockedStatus(
+                f"{len(states)} units is outside autoscaling-min-replicas "
+                f"{min_replicas} and autoscaling-max-replicas "
+                f"{max_replicas}; run juju scale-application within them")
+
+    if states and ready == len(states) and not is_scaling:
+        log.debug("All k8s pods are ready")
+        app_status = ActiveStatus(message)
+    else:
+        log.debug("Some k8s pods are not ready")
+        app_status = MaintenanceStatus(message)
+
+    return app_status
+
+
+def build_load_test_summary(load_test_result):
+    """
+    Turns a grafana.LoadTestResult into the results of the load-test
+    action: overall throughput and, for each scenario, how many requests
+    were made, how many failed and their latency percentiles. The
+    scenario's results are flattened into dotted keys like search.p50
+    since action results only take strings.
+    """
+    samples_by_scenario = load_test_result.samples_by_scenario
+    total = sum(len(i) for i in samples_by_scenario.values())
+    errors = sum(not ok for samples in samples_by_scenario.values()
+                 for _, ok in samples)
+    elapsed = load_test_result.elapsed
+
+    summary = {
+        'requests': str(total),
+        'errors': str(errors),
+        'elapsed': f'{elapsed:.2f}s',
+        'throughput': f'{total / elapsed if elapsed else 0:.1f}/s',
+    }
+    for scenario, samples in sorted(samples_by_scenario.items()):
+        latencies = sorted(seconds for seconds, _ in samples)
+        summary.update({
+            f'{scenario}.requests': str(len(samples)),
+            f'{scenario}.errors': str(sum(not ok for _, ok in samples)),
+            f'{scenario}.p50': f'{_percentile(latencies, 50) * 1000:.1f}ms',
+            f'{scenario}.p90': f'{_percentile(latencies, 90) * 1000:.1f}ms',
+            f'{scenario}.p99': f'{_percentile(latencies, 99) * 1000:.1f}ms',
+            f'{scenario}.max': f'{latencies[-1] * 1000:.1f}ms',
+        })
+
+    return summary
+
+
+def build_migration_summary(copied, elapsed):
+    """
+    Turns the rows copied per table by a SQLite to MySQL migration into
+    the results of the migrate-sqlite-to-mysql action. The rows copied
+    per table are flattened into dotted keys like copied.dashboard.
+    """
+    rows = sum(copied.values())
+    summary = {
+        'tables': str(len(copied)),
+        'rows': str(rows),
+        'elapsed': f'{elapsed:.2f}s',
+        'throughput': f'{rows / elapsed if elapsed else 0:.1f} rows/s',
+    }
+    for table, count in copied.items():
+        # Action result keys may not contain underscores
+        summary[f"copied.{table.replace('_', '-')}"] = str(count)
+
+    return summary
+
+
+# HELPERS
+
+def _percentile(sorted_values, percent):
+    # Nearest-rank percentile
+    rank = -(-len(sorted_values) * percent // 100)
+    return sorted_values[max(rank, 1) - 1]
+
+
+def _to_yaml_block(key, mapping, indent=0):
+    if not mapping:
+        return ""
+
+    padding = " " * indent
+    # JSON scalars are valid YAML scalars and come already quoted/escaped
+    return f"{padding}{key}:\n" + "".join(
+        f"{padding}  {k}: {json.dumps(v)}\n" for k, v in sorted(mapping.items())
+    )
+
+
+def _to_ini_section(name, mapping):
+    if not mapping:
+        return ""
+
+    def to_ini_value(value):
+        if isinstance(value, bool):
+            return str(value).lower()
+        return value
+
+    return f"\n[{name}]\n" + "".join(
+        f"{k} = {to_ini_value(v)}\n" for k, v in sorted(mapping.items())
+    )
+
+
+def _build_volume_config(name, mount_path, files):
+    return {
+        # Note: 'name' must comply with DNS-1123 standard
+        'name': name,
+        'mountPath': mount_path,
+        'files': [{'path': path, 'content': content}
+                  for path, content in files.items()],
+    }
+
+
+def _tls_secret_name(app_name, tls_certificate):
+    # Grafana only reads the certificate when it starts. A new name for a
+    # new certificate changes the pod spec which restarts the pods.
+    digest = _content_hash(tls_certificate['cert'] + tls_certificate['key'],
+                           4)
+    return f'{app_name}-tls-{digest:08x}'
+
+
+def _content_hash(content, size):
+    return int.from_bytes(
+        hashlib.sha256(content.encode()).digest()[:size], 'big')
+
+
+def _minify_dashboard(dashboard):
+    if isinstance(dashboard, str):
+        dashboard = json.loads(dashboard)
+    if not isinstance(dashboard, dict):
+        raise ValueError('A dashboard must be a JSON object')
+
+    # Grafana assigns its own database ids to provisioned dashboards
+    dashboard = {k: v for k, v in dashboard.items() if k != 'id'}
+    content = json.dumps(dashboard, separators=(',', ':'), sort_keys=True)
+
+    uid = dashboard.get('uid')
+    if uid:
+        name = DASHBOARD_FILENAME_PATTERN.sub('-', str(uid))
+    else:
+        name = '{:016x}'.format(_content_hash(content, 8))
+
+    return f'{name}.json', content
+
+
+def _parse_grafana_ini_overrides(overrides_yaml):
+    if not overrides_yaml:
+        return {}
+
+    def invalid(message):
+        return ConfigError('grafana-ini-overrides', message)
+
+    try:
+        overrides = yaml.safe_load(overrides_yaml)
+    except yaml.error.YAMLError:
+        raise invalid('must be valid YAML')
+
+    if not isinstance(overrides, dict):
+        raise invalid('must map section names to settings')
+
+    for section, settings in overrides.items():
+        if not isinstance(section, str) or not INI_NAME_PATTERN.match(section):
+            raise invalid(f'{section} is not a valid section name')
+        if not isinstance(settings, dict):
+            raise invalid(f'{section} must map keys to values')
+
+        for key, value in settings.items():
+            if not isinstance(key, str) or not INI_NAME_PATTERN.match(key):
+                raise invalid(f'{section}.{key} is not a valid key')
+            if not isinstance(value, (bool, int, float, str)) or \
+                    '\n' in str(value):
+                raise invalid(f'{section}.{key} must be a single-line '
+                              f'string, number or boolean')
+
+    return overrides
+
+
+def _validate_duration(config_key, value):
+    if not DURATION_PATTERN.match(value):
+        raise ConfigError(config_key, f'{value} is not a valid duration')
@@ -0,0 +1,140 @@
+# Ideally, this interface and its tests should be located in its own
+# repository. However, to keep the initial development process simple,
+# this file is colocated with its first dependent charm. It should
+# be moved out eventually though.
+import logging
+
+log = logging.getLogger()
+
+from ops.framework import (
+    EventSource,
+    Object,
+    ObjectEvents,
+)
+from ops.framework import EventBase
+
+
+class CacheServerDetails:
+
+    def __init__(self, data_dict):
+        log.debug("Initializing with data {}".format(data_dict))
+        self._data_dict = data_dict
+
+    @property
+    def cache_type(self):
+        return self._data_dict['cache_type']
+
+    @property
+    def address(self):
+        host = self._data_dict.get('hostname',
+                                   self._data_dict.get('host'))
+        host = self._data_dict.get('ingress-address', host)
+        port = self._data_dict['port']
+        return "{}:{}".format(host, port)
+
+    @property
+    def password(self):
+        return self._data_dict.get('password')
+
+    # Serialization and de-serialization methods
+
+    def snapshot(self):
+        return self._data_dict
+
+    @classmethod
+    def restore(cls, snapshot):
+        if snapshot:
+            return cls(snapshot)
+        else:
+            return None
+
+
+class NewCacheRelationEvent(EventBase):
+
+    # server_details here is explicitly provided to the `emit()` call inside
+    # `CacheInterface.on_relation_changed` below. `handle` on the other hand
+    # is automatically provided by `emit()`
+    def __init__(self, handle, server_details):
+        super().__init__(handle)
+        self._server_details = server_details
+
+    @property
+    def server_details(self):
+        return self._server_details
+
+    def snapshot(self):
+        return self.server_details.snapshot()
+
+    def restore(self, snapshot):
+        self._server_details = CacheServerDetails.restore(snapshot)
+
+
+class CacheRelationBrokenEvent(EventBase):
+
+    def __init__(self, handle, cache_type):
+        super().__init__(handle)
+        self._cache_type = cache_type
+
+    @property
+    def cache_type(self):
+        return self._cache_type
+
+    def snapshot(self):
+        return self.cache_type
+
+    def restore(self, snapshot):
+        self._cache_type = snapshot
+
+
+class CacheRelationEvents(ObjectEvents):
+    new_relation = EventSource(NewCacheRelationEvent)
+    relation_broken = EventSource(CacheRelationBrokenEvent)
+
+
+class CacheInterface(Object):
+    """
+    Requirer side of a Redis- or memcached-compatible cache relation.
+    The same class serves both since they only differ in the type of
+    cache that the remote end provides.
+    """
+    on = CacheRelationEvents()
+
+    def __init__(self, charm, relation_name, cache_type):
+        super().__init__(charm, relation_name)
+
+        self._relation_name = relation_name
+        self._cache_type = cache_type
+
+        self.framework.observe(charm.on[relation_name].relation_changed,
+                               self.on_relation_changed)
+        self.framework.observe(charm.on[relation_name].relation_broken,
+                               self.on_relation_broken)
+
+    @property
+    def cache_type(self):
+        return self._cache_type
+
+    @property
+    def relation_name(self):
+        return self._relation_name
+
+    def on_relation_changed(self, event):
+        if not event.unit:
+            return
+
+        remote_data = dict(event.relation.data[event.unit])
+        log.debug("Received remote_data: {}".format(remote_data))
+
+        if 'port' not in remote_data:
+            log.debug("Remote unit has not published its address yet")
+            return
+
+        remote_data['cache_type'] = self.cache_type
+        server_details = CacheServerDetails(remote_data)
+
+        log.debug("Emitting event {}".format(self.on.new_relation))
+        self.on.new_relation.emit(server_details)
+
+    def on_relation_broken(self, event):
+        log.debug("Emitting event {}".format(self.on.relation_broken))
+        self.on.relation_broken.emit(self.cache_type)
@@ -1,3 +1,5 @@
+import json
+import logging
 import sys
 sys.path.append('lib')
 
@@ -6,6 +8,7 @@ from ops.framework import (
     EventSource,
     Object,
     ObjectEvents,
+    StoredState,
 )
 
 from adapters import (
@@ -18,6 +21,13 @@ from adapters import (
 # this file is colocated with its first dependent charm. It should
 # be moved out eventually though.
 
+log = logging.getLogger(__name__)
+
+# Where Client found the server's address
+RESOLVED_FROM_RELATION = 'relation'
+RESOLVED_FROM_DNS = 'dns'
+RESOLVED_FROM_SERVICE = 'service'
+
 
 #
 # Client/Requiring Charm Classes
@@ -26,8 +36,9 @@ from adapters import (
 
 class ServerDetails:
 
-    def __init__(self, host=None, port=None):
+    def __init__(self, host=None, port=None, scrape_interval=None):
         self.set_address(host, port)
+        self._scrape_interval = scrape_interval
 
     def set_address(self, host, port):
         self._host = host
@@ -41,11 +52,17 @@ class ServerDetails:
     def port(self):
         return self._port
 
+    @property
+    def scrape_interval(self):
+        return self._scrape_interval
+
     @classmethod
     def restore(cls, snapshot):
         if snapshot:
             return cls(host=snapshot['server_details.host'],
-                       port=snapshot['server_details.port'])
+                       port=snapshot['server_details.port'],
+                       scrape_interval=snapshot.get(
+                           'server_details.scrape_interval'))
         else:
             return None
 
@@ -53,6 +70,7 @@ class ServerDetails:
         return {
             'server_details.host': self.host,
             'server_details.port': self.port,
+            'server_details.scrape_interval': self.scrape_interval,
         }
 
 
@@ -81,11 +99,31 @@ class ClientEvents(ObjectEvents):
 
 
 class Client(Object):
+    """
+    Requirer side of the http relation. When given a peer relation, only
+    the leader resolves the server's details. It publishes
+    them in the peer relation's app data where the other units pick them
+    up, so the number of k8s API calls does not grow with the number of
+    units.
+    """
     on = ClientEvents()
+    state = StoredState()
 
-    def __init__(self, charm, relation_name):
+    def __init__(self, charm, relation_name, peer_relation_name=None):
         super().__init__(charm, relation_name)
         self._relation_name = relation_name
+        self._peer_relation_name = peer_relation_name
+
+        # The last known server details, the app and source they were
+        # resolved from and the resourceVersion of the app's k8s Service.
+        # These survive across hooks so that we only go back to the k8s
+        # API when nothing cheaper is available.
+        self.state.set_default(
+            server_details=None,
+            resolution=None,
+            resolved_app=None,
+            resource_version=None,
+        )
 
         # Abstract out framework and friends so that this object is not
         # too tightly coupled with the underlying framework's implementation.
@@ -95,23 +133,163 @@ class Client(Object):
 
         self.adapter.observe(charm.on[relation_name].relation_changed,
                              self.on_relation_changed)
+        if peer_relation_name:
+            self.adapter.observe(
+                charm.on[peer_relation_name].relation_changed,
+                self.on_peer_relation_changed)
+
+    @property
+    def peer_relation_name(self):
+        return self._peer_relation_name
+
+    @property
+    def published_details_key(self):
+        return f'{self.relation_name}-server-details'
 
     @property
     def relation_name(self):
         return self._relation_name
 
+    def on_peer_relation_changed(self, event):
+        if self.adapter.am_i_leader():
+            return
+
+        self._adopt_published_details()
+
     def on_relation_changed(self, event):
+        if self.peer_relation_name and not self.adapter.am_i_leader():
+            log.debug("Using the server details published by the leader")
+            self._adopt_published_details()
+            return
+
         # TODO: Add some logic here to pick up the right relation in case
         # the client charm is related to more than one unit. E.g. when the
         # server is in HA mode.
         relation = self.adapter.get_relations(self.relation_name)[0]
+
+        address = self._resolve_address(relation)
+        if not address:
+            return
+
+        host, port = address
+        server_details = ServerDetails(
+            host=host,
+            port=port,
+            scrape_interval=get_remote_value(relation, 'scrape-interval'))
+
+        if self.peer_relation_name:
+            self._publish_details(server_details)
+        self._update_details(server_details)
+
+    def _resolve_address(self, relation):
+        """
+        Returns the (host, port) that the server is reachable at, trying
+        the cheapest source first:
+
+        1. the address the server publishes in the relation data;
+        2. the in-cluster DNS name of the k8s Service fronting the server,
+           which stays valid when the Service's cluster IP changes;
+        3. the k8s Service resource itself, fetched from the k8s API.
+
+        The source that worked is remembered so that later hooks go
+        straight to it instead of walking the pipeline again. What was
+        resolved for one server app is never used for another.
+        """
         juju_app = relation.app.name
         juju_model = self.adapter.get_model_name()
 
+        if self.state.resolved_app != juju_app:
+            log.debug("Resolving the address of {}".format(juju_app))
+            self.state.resolution = None
+            self.state.resource_version = None
+            self.state.resolved_app = juju_app
+            cached_details = None
+        else:
+            cached_details = ServerDetails.restore(self.state.server_details)
+
+        host = get_remote_value(relation, 'hostname') or \
+            get_remote_value(relation, 'host')
+        port = get_remote_value(relation, 'port')
+        if host and port:
+            log.debug("Using the address published by {}".format(juju_app))
+            self.state.resolution = RESOLVED_FROM_RELATION
+            return host, port
+
+        dns_name = None
+        if self.state.resolution == RESOLVED_FROM_DNS and cached_details:
+            # The DNS name only depends on the app and the model
+            dns_name = cached_details.host
+        elif self.state.resolution != RESOLVED_FROM_SERVICE:
+            dns_name = k8s.get_service_dns_name(juju_model=juju_model,
+                                                juju_app=juju_app)
+        if dns_name and port:
+            self.state.resolution = RESOLVED_FROM_DNS
+            return dns_name, port
+
+        # Cheaply re-validate the port, and the cluster IP unless the DNS
+        # name is used, before re-downloading the k8s Service resource
+        # fronting the server pods
+        resource_version = None
+        if cached_details and self.state.resource_version is not None:
+            resource_version = \
+                k8s.get_service_resource_version(juju_model=juju_model,
+                                                 juju_app=juju_app)
+
+        if resource_version and \
+                resource_version == self.state.resource_version:
+            log.debug("Service {} is still at resourceVersion {}".format(
+                juju_app, resource_version))
+            return cached_details.host, cached_details.port
+
         # Fetch the k8s Service resource fronting the server pods
         service_spec = k8s.get_service_spec(juju_model=juju_model,
                                             juju_app=juju_app)
+        if not service_spec:
+            log.debug("Service {} not found".format(juju_app))
+            return None
+
+        self.state.resource_version = service_spec.resource_version
+        if dns_name:
+            self.state.resolution = RESOLVED_FROM_DNS
+            return dns_name, service_spec.port
 
-        server_details = ServerDetails(host=service_spec.host,
-                                       port=service_spec.port)
+        self.state.resolution = RESOLVED_FROM_SERVICE
+        return service_spec.host, service_spec.port
+
+    def _adopt_published_details(self):
+        peer_data = self.adapter.get_app_relation_data(self.peer_relation_name)
+        if not peer_data or not peer_data.get(self.published_details_key):
+            log.debug("The leader has not published server details yet")
+            return
+
+        self._update_details(ServerDetails.restore(
+            json.loads(peer_data[self.published_details_key])))
+
+    def _publish_details(self, server_details):
+        peer_data = self.adapter.get_app_relation_data(self.peer_relation_name)
+        published_details = json.dumps(server_details.snapshot(),
+                                       sort_keys=True)
+        if peer_data is not None and \
+                peer_data.get(self.published_details_key) != published_details:
+            peer_data[self.published_details_key] = published_details
+
+    def _update_details(self, server_details):
+        if server_details.snapshot() == self.state.server_details:
+            log.debug("Server details unchanged. Not emitting event.")
+            return
+
+        self.state.server_details = server_details.snapshot()
         self.on.server_available.emit(server_details)
+
+
+def get_remote_value(relation, key):
+    """
+    Returns the first value for key published by any of the remote
+    units or, failing that, by the remote application.
+    """
+    for unit in relation.units:
+        value = relation.data[unit].get(key)
+        if value:
+            return value
+
+    return relation.data[relation.app].get(key)
@@ -2,6 +2,8 @@
 # repository. However, to keep the initial development process simple,
 # this file is colocated with its first dependent charm. It should
 # be moved out eventually though.
+import hashlib
+import json
 import logging
 
 log = logging.getLogger()
@@ -10,39 +12,89 @@ from ops.framework import (
     EventSource,
     Object,
     ObjectEvents,
+    StoredState,
 )
 from ops.framework import EventBase
 
+# These are the only keys in the remote unit's relation data that
+# MySQLServerDetails consumes. Changes to any other key are irrelevant
+# to this charm.
+CONSUMED_KEYS = (
+    'host',
+    'ingress-address',
+    'port',
+    'database',
+    'user',
+    'password',
+)
+
+
+def fingerprint(data_dict):
+    consumed = {key: data_dict.get(key) for key in CONSUMED_KEYS}
+    serialized = json.dumps(consumed, sort_keys=True)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
 
 class MySQLServerDetails:
+    """
+    Connection details of the MySQL server, extracted from the remote
+    unit's relation data. Only the consumed values are kept, so that the
+    snapshot stored in StoredState does not carry the rest of the remote
+    unit's relation data around. Raises ValueError if a required value is
+    missing.
+    """
+    __slots__ = (
+        '_database',
+        '_host',
+        '_password',
+        '_port',
+        '_username',
+    )
 
     def __init__(self, data_dict):
-        log.debug("Initializing with data {}".format(data_dict))
-        self._data_dict = data_dict
+        try:
+            self._host = data_dict.get('ingress-address', data_dict['host'])
+            self._port = data_dict.get('port', 3306)
+            self._database = data_dict['database']
+            self._username = data_dict['user']
+            self._password = data_dict['password']
+        except KeyError as e:
+            raise ValueError(f'MySQL relation data is missing {e}')
 
     @property
     def address(self):
-        host = self._data_dict.get('ingress-address', self._data_dict['host'])
-        port = self._data_dict.get('port', 3306)
-        return "{}:{}".format(host, port)
+        return "{}:{}".format(self._host, self._port)
 
     @property
     def database(self):
-        return self._data_dict['database']
+        return self._database
+
+    @property
+    def host(self):
+        return self._host
+
+    @property
+    def port(self):
+        return self._port
 
     @property
     def username(self):
-        return self._data_dict['user']
+        return self._username
 
     @property
     def password(self):
-        return self._data_dict['password']
+        return self._password
 
     # Serialization and de-serialization methods
 
     def snapshot(self):
-        log.debug("Returning snapshot {}".format(self._data_dict))
-        return self._data_dict
+        return {
+            'host': self._host,
+            'port': self._port,
+            'database': self._database,
+            'user': self._username,
+            'password': self._password,
+        }
 
     @classmethod
     def restore(cls, snapshot):
@@ -85,20 +137,31 @@ class MySQLRelationEvents(ObjectEvents):
 
 class MySQLInterface(Object):
     on = MySQLRelationEvents()
+    state = StoredState()
 
     def __init__(self, charm, relation_name):
         super().__init__(charm, relation_name)
 
         self._relation_name = relation_name
 
+        # Fingerprints of the consumed remote data keyed by
+        # <relation id>/<remote unit name>
+        self.state.set_default(fingerprints={})
+
         self.framework.observe(charm.on[relation_name].relation_changed,
                                self.on_relation_changed)
+        self.framework.observe(charm.on[relation_name].relation_departed,
+                               self.on_relation_departed)
 
     @property
     def relation_name(self):
         return self._relation_name
 
     def on_relation_changed(self, event):
+        if not event.unit:
+            log.debug("Ignoring application-level relation change")
+            return
+
         log.debug(
             "Receiving relation data from remote unit {}".format(event.unit))
         remote_data = event.relation.data[event.unit]
@@ -106,9 +169,30 @@ class MySQLInterface(Object):
             "Received remote_data: {}".format(dict(remote_data))
         )
 
+        fingerprint_key = _fingerprint_key(event.relation, event.unit)
+        new_fingerprint = fingerprint(remote_data)
+        if self.state.fingerprints.get(fingerprint_key) == new_fingerprint:
+            log.debug("Consumed remote data unchanged. Not emitting event.")
+            return
+
         log.debug("Initializing MySQLServerDetails object "
                   "from remote data")
-        server_details = MySQLServerDetails(dict(remote_data))
+        try:
+            server_details = MySQLServerDetails(dict(remote_data))
+        except ValueError as e:
+            log.debug("Remote unit has not published its details yet: "
+                      "{}".format(e))
+            return
+        self.state.fingerprints[fingerprint_key] = new_fingerprint
 
         log.debug("Emitting event {}".format(self.on.new_relation))
         self.on.new_relation.emit(server_details)
+
+    def on_relation_departed(self, event):
+        fingerprint_key = _fingerprint_key(event.relation, event.unit)
+        log.debug("Forgetting fingerprint of {}".format(fingerprint_key))
+        self.state.fingerprints.pop(fingerprint_key, None)
+
+
+def _fingerprint_key(relation, unit):
+    return "{}/{}".format(relation.id, unit.name)
@@ -0,0 +1,274 @@
+from pathlib import Path
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest.mock import (
+    patch,
+)
+from uuid import uuid4
+
+sys.path.append('lib')
+try:
+    import pymysql
+except ImportError:
+    # Only there once the mod/PyMySQL submodule is checked out
+    pymysql = None
+
+sys.path.append('src')
+from adapters.database import (
+    migrate,
+    MigrationError,
+    MySQLTarget,
+    PROGRESS_TABLE,
+    SQLiteSource,
+)
+from interface_mysql import (
+    MySQLServerDetails,
+)
+
+
+class SQLiteStandInTarget(MySQLTarget):
+    """
+    MySQLTarget talking to an SQLite database instead. Only the bits of
+    SQL that SQLite does not understand are swapped out.
+    """
+    errors = (sqlite3.Error,)
+    placeholder = '?'
+
+    def __init__(self, conn, fail_after_writes=None):
+        super().__init__(conn)
+        self.writes = 0
+        self._fail_after_writes = fail_after_writes
+
+    def get_tables(self):
+        return [i[0] for i in self._execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")]
+
+    def write(self, table, columns, rows):
+        if self.writes == self._fail_after_writes:
+            raise sqlite3.OperationalError("Connection lost")
+        self.writes += 1
+        super().write(table, columns, rows)
+
+
+if pymysql:
+    class RecordingCursor(pymysql.cursors.Cursor):
+        """
+        PyMySQL's own cursor, escaping and multi-row statements included,
+        except that it records the statements instead of sending them.
+        """
+
+        def _query(self, q):
+            self.connection.statements.append(q)
+            self.rowcount = 0
+            return self.rowcount
+
+
+class MigrateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        # Ensure that we clean up the tmp directory even when the test
+        # fails or errors out for whatever reason.
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        self.dashboards = [(i, str(uuid4()), str(uuid4()))
+                           for i in range(1, random.randint(50, 100))]
+        self.source_path = str(self.tmpdir / 'grafana.db')
+        with sqlite3.connect(self.source_path) as conn:
+            conn.execute('CREATE TABLE dashboard '
+                         '(id INTEGER PRIMARY KEY, uid TEXT, data TEXT, '
+                         'legacy TEXT)')
+            conn.executemany('INSERT INTO dashboard (id, uid, data) '
+                             'VALUES (?, ?, ?)', self.dashboards)
+            conn.execute('CREATE TABLE org (id INTEGER PRIMARY KEY, '
+                         'name TEXT)')
+            conn.execute("INSERT INTO org VALUES (1, 'Main Org.')")
+            conn.execute('CREATE TABLE migration_log (id INTEGER, '
+                         'migration_id TEXT)')
+            conn.execute("INSERT INTO migration_log VALUES (1, 'create')")
+            conn.execute('CREATE TABLE only_in_sqlite (id INTEGER)')
+            conn.execute('INSERT INTO only_in_sqlite VALUES (1)')
+
+        # What Grafana creates on MySQL when it starts with it
+        self.target_conn = sqlite3.connect(':memory:')
+        self.addCleanup(self.target_conn.close)
+        self.target_conn.execute('CREATE TABLE dashboard '
+                                 '(id INTEGER PRIMARY KEY, uid TEXT, '
+                                 'data TEXT)')
+        self.target_conn.execute('CREATE TABLE org '
+                                 '(id INTEGER PRIMARY KEY, name TEXT)')
+        self.target_conn.execute("INSERT INTO org VALUES (1, 'Seeded')")
+        self.target_conn.execute('CREATE TABLE migration_log '
+                                 '(id INTEGER, migration_id TEXT)')
+        self.target_conn.commit()
+
+        self.source = SQLiteSource(self.source_path)
+        self.addCleanup(self.source.close)
+
+    def query_target(self, query):
+        return self.target_conn.execute(query).fetchall()
+
+    def test__it_copies_the_tables_both_databases_have(self):
+        # Setup
+        target = SQLiteStandInTarget(self.target_conn)
+        messages = []
+
+        # Exercise
+        copied = migrate(self.source, target, batch_size=7,
+                         batches_per_transaction=3, log=messages.append)
+
+        # Assert
+        assert copied == {'dashboard': len(self.dashboards), 'org': 1}
+        assert self.query_target('SELECT id, uid, data FROM dashboard '
+                                 'ORDER BY id') == self.dashboards
+        assert self.query_target('SELECT * FROM org') == [(1, 'Main Org.')]
+        assert self.query_target('SELECT * FROM migration_log') == []
+        assert target.writes == -(-len(self.dashboards) // 7) + 1
+        assert any('only_in_sqlite' in i for i in messages)
+
+    def test__it_resumes_from_the_last_commit(self):
+        # Setup
+        batch_size = 5
+        batches_per_transaction = 2
+        interrupted_target = SQLiteStandInTarget(self.target_conn,
+                                                 fail_after_writes=3)
+        with self.assertRaises(MigrationError):
+            migrate(self.source, interrupted_target, batch_size=batch_size,
+                    batches_per_transaction=batches_per_transaction)
+        self.target_conn.rollback()
+        committed = batch_size * batches_per_transaction
+
+        target = SQLiteStandInTarget(self.target_conn)
+
+        # Exercise
+        copied = migrate(self.source, target, batch_size=batch_size,
+                         batches_per_transaction=batches_per_transaction)
+
+        # Assert
+        assert copied['dashboard'] == len(self.dashboards) - committed
+        assert self.query_target('SELECT id, uid, data FROM dashboard '
+                                 'ORDER BY id') == self.dashboards
+        assert dict(self.query_target(
+            f'SELECT * FROM {PROGRESS_TABLE}'))['dashboard'] == \
+            self.dashboards[-1][0]
+
+    def test__driver_errors_tell_how_far_the_migration_got(self):
+        # Setup
+        target = SQLiteStandInTarget(self.target_conn, fail_after_writes=3)
+
+        # Exercise
+        with self.assertRaises(MigrationError) as ctx:
+            migrate(self.source, target, batch_size=5,
+                    batches_per_transaction=2)
+
+        # Assert
+        assert str(ctx.exception) == "Migration failed at dashboard after " \
+            "committing 10 of its 15 copied rows: Connection lost"
+
+    def test__it_copies_everything_again_when_restarted(self):
+        # Setup
+        migrate(self.source, SQLiteStandInTarget(self.target_conn))
+
+        # Exercise
+        copied = migrate(self.source, SQLiteStandInTarget(self.target_conn),
+                         restart=True)
+        copied_again = migrate(self.source,
+                               SQLiteStandInTarget(self.target_conn))
+
+        # Assert
+        assert copied['dashboard'] == len(self.dashboards)
+        assert copied_again['dashboard'] == 0
+
+
+class SQLiteSourceTest(unittest.TestCase):
+
+    def test__raises_migration_error_if_database_does_not_exist(self):
+        # Exercise and Assert
+        with self.assertRaises(MigrationError):
+            SQLiteSource(f'/{uuid4()}/grafana.db')
+
+
+class MySQLTargetTest(unittest.TestCase):
+
+    def test__connect__raises_migration_error_without_pymysql(self):
+        # Setup
+        mysql_server_details = MySQLServerDetails({
+            'host': str(uuid4()),
+            'database': str(uuid4()),
+            'user': str(uuid4()),
+            'password': str(uuid4()),
+        })
+
+        # Exercise and Assert
+        with patch.dict(sys.modules, {'pymysql': None}):
+            with self.assertRaises(MigrationError):
+                MySQLTarget.connect(mysql_server_details)
+
+    def create_target(self):
+        conn = pymysql.connect(charset='utf8mb4', defer_connect=True,
+                               cursorclass=RecordingCursor)
+        # Set by the server's handshake. No flags means the default
+        # sql_mode where strings are escaped with backslashes.
+        conn.server_status = 0
+        conn.statements = []
+
+        return MySQLTarget(conn), conn.statements
+
+    @unittest.skipIf(pymysql is None, "PyMySQL is not checked out")
+    def test__write__sends_one_multi_row_replace(self):
+        # Setup
+        target, statements = self.create_target()
+        uid = str(uuid4())
+        rows = [(1, uid, "it's"), (2, uid, None)] + \
+            [(i, str(uuid4()), str(uuid4())) for i in range(3, 100)]
+
+        # Exercise
+        target.write('dashboard', ['id', 'uid', 'data'], rows)
+
+        # Assert
+        assert len(statements) == 1
+        assert statements[0].startswith(
+            b'REPLACE INTO `dashboard` (`id`, `uid`, `data`) VALUES (1,')
+        assert f"(1, '{uid}', 'it\\'s'),(2, '{uid}', NULL),(3,".encode() \
+            in statements[0]
+        assert statements[0].count(b'),(') == len(rows) - 1
+
+    @unittest.skipIf(pymysql is None, "PyMySQL is not checked out")
+    def test__write__splits_rows_over_max_stmt_length(self):
+        # Setup
+        target, statements = self.create_target()
+        data = 'x' * 1000
+        rows = [(i, data) for i in range(3000)]
+
+        # Exercise
+        target.write('dashboard_version', ['id', 'data'], rows)
+
+        # Assert
+        assert len(statements) > 1
+        for statement in statements:
+            assert statement.startswith(
+                b'REPLACE INTO `dashboard_version` (`id`, `data`) VALUES (')
+            assert len(statement) <= RecordingCursor.max_stmt_length
+        assert sum(i.count(b'),(') + 1 for i in statements) == len(rows)
+
+    @unittest.skipIf(pymysql is None, "PyMySQL is not checked out")
+    def test__commit__records_progress_with_replace(self):
+        # Setup
+        target, statements = self.create_target()
+        last_rowid = random.randint(1, 1000)
+
+        # Exercise
+        with patch.object(pymysql.connections.Connection, 'commit') \
+                as mock_commit_method:
+            target.commit('dashboard', last_rowid)
+
+        # Assert
+        assert statements == [
+            f"REPLACE INTO `{PROGRESS_TABLE}` (table_name, last_rowid) "
+            f"VALUES ('dashboard', {last_rowid})"
+        ]
+        assert mock_commit_method.call_count == 1
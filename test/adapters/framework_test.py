@@ -1,7 +1,9 @@
+import io
 from pathlib import Path
 import pytest
 import shutil
 import sys
+import tarfile
 import tempfile
 import unittest
 from uuid import uuid4
@@ -9,6 +11,7 @@ from unittest.mock import (
     call,
     create_autospec,
     patch,
+    PropertyMock,
 )
 sys.path.append('lib')
 from ops.charm import (
@@ -18,12 +21,16 @@ from ops.framework import (
     Framework,
 )
 from ops.model import (
+    ActiveStatus,
     BlockedStatus,
+    MaintenanceStatus,
+    ModelError,
     Resources,
 )
 
 sys.path.append('src')
 from adapters.framework import (
+    _fetch_dashboards,
     _fetch_image_meta,
     FrameworkAdapter,
     ResourceError,
@@ -133,6 +140,59 @@ class FetchImageMetaTest(unittest.TestCase):
                 f'{str(mock_path_obj)}'
 
 
+class FetchDashboardsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        self.resource_name = str(uuid4())
+        self.mock_resources_repo = create_autospec(Resources, set_spec=True)
+        self.mock_resources_repo.fetch.return_value = \
+            self.tmpdir / 'dashboards.tar.gz'
+
+    def test__successful(self):
+        # Setup
+        dashboards = {
+            f'{uuid4()}/{uuid4()}.json': str(uuid4()),
+            f'{uuid4()}.json': str(uuid4()),
+        }
+        with tarfile.open(str(self.tmpdir / 'dashboards.tar.gz'),
+                          'w:gz') as tar:
+            for name, content in dict(dashboards, README=str(uuid4())).items():
+                tarinfo = tarfile.TarInfo(name)
+                tarinfo.size = len(content.encode())
+                tar.addfile(tarinfo, io.BytesIO(content.encode()))
+
+        # Exercise
+        fetched_dashboards = _fetch_dashboards(self.resource_name,
+                                               self.mock_resources_repo)
+
+        # Assert
+        assert fetched_dashboards == dashboards
+
+    def test__resource_is_not_attached(self):
+        # Setup
+        self.mock_resources_repo.fetch.side_effect = \
+            ModelError(str(uuid4()))
+
+        # Exercise and Assert
+        assert _fetch_dashboards(self.resource_name,
+                                 self.mock_resources_repo) == {}
+
+    def test__resource_is_not_a_tarball(self):
+        # Setup
+        (self.tmpdir / 'dashboards.tar.gz').write_text(str(uuid4()))
+
+        # Exercise
+        with pytest.raises(ResourceError) as err:
+            _fetch_dashboards(self.resource_name, self.mock_resources_repo)
+
+        # Assert
+        assert type(err.value.status) == BlockedStatus
+        assert err.value.status.message.startswith(self.resource_name)
+
+
 class FrameworkAdapterTest(unittest.TestCase):
 
     def setUp(self):
@@ -233,3 +293,79 @@ class FrameworkAdapterTest(unittest.TestCase):
             call(image_name, mock_framework.model.resources)
 
         assert image_meta == mock_fetch_image_meta_func.return_value
+
+
+class SetUnitStatusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_framework = create_autospec(Framework, instance=True)
+        self.mock_status = PropertyMock()
+        type(self.mock_framework.model.unit).status = self.mock_status
+
+        self.now = 0.0
+        patcher = patch('adapters.framework.time.monotonic',
+                        side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.adapter = FrameworkAdapter(self.mock_framework)
+
+    def test__it_skips_writing_an_unchanged_status(self):
+        # Setup
+        status = MaintenanceStatus(str(uuid4()))
+
+        # Exercise
+        for _ in range(3):
+            self.now += FrameworkAdapter.UNIT_STATUS_INTERVAL
+            self.adapter.set_unit_status(MaintenanceStatus(status.message))
+        self.adapter.flush_unit_status()
+
+        # Assert
+        assert self.mock_status.call_args_list == [call(status)]
+
+    def test__it_only_writes_the_latest_of_quick_changes(self):
+        # Setup
+        statuses = [MaintenanceStatus(str(uuid4())) for _ in range(4)]
+
+        # Exercise
+        for status in statuses[:3]:
+            self.adapter.set_unit_status(status)
+            self.now += FrameworkAdapter.UNIT_STATUS_INTERVAL / 4
+        self.now += FrameworkAdapter.UNIT_STATUS_INTERVAL
+        self.adapter.set_unit_status(statuses[3])
+
+        # Assert
+        assert self.mock_status.call_args_list == [
+            call(statuses[0]),
+            call(statuses[3]),
+        ]
+
+    def test__flush_writes_the_status_that_was_held_back(self):
+        # Setup
+        maintenance_status = MaintenanceStatus(str(uuid4()))
+        active_status = ActiveStatus()
+
+        # Exercise
+        self.adapter.set_unit_status(maintenance_status)
+        self.adapter.set_unit_status(active_status)
+        self.adapter.flush_unit_status()
+        self.adapter.flush_unit_status()
+
+        # Assert
+        assert self.mock_status.call_args_list == [
+            call(maintenance_status),
+            call(active_status),
+        ]
+
+    def test__flush_skips_a_change_that_was_reverted(self):
+        # Setup
+        active_status = ActiveStatus()
+
+        # Exercise
+        self.adapter.set_unit_status(active_status)
+        self.adapter.set_unit_status(MaintenanceStatus(str(uuid4())))
+        self.adapter.set_unit_status(ActiveStatus())
+        self.adapter.flush_unit_status()
+
+        # Assert
+        assert self.mock_status.call_args_list == [call(active_status)]
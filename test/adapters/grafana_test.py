@@ -0,0 +1,265 @@
+import base64
+import http.client
+from http.server import (
+    BaseHTTPRequestHandler,
+    HTTPServer,
+)
+import json
+import random
+import socketserver
+import ssl
+import sys
+import threading
+import unittest
+from unittest.mock import (
+    patch,
+)
+from uuid import uuid4
+
+sys.path.append('src')
+from adapters.grafana import (
+    connect,
+    GrafanaHealth,
+    HealthChecker,
+    LoadTester,
+)
+
+
+class StubGrafanaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        body = json.dumps(self.server.health).encode('utf-8')
+        self.send_response(self.server.status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubGrafanaAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/api/datasources/name/Prometheus':
+            if self.server.datasource_id is None:
+                self._respond(404, {'message': 'Data source not found'})
+            else:
+                self._respond(200, {'id': self.server.datasource_id})
+        elif self.path.startswith('/api/search'):
+            self._respond(200, [])
+        else:
+            self._respond(200, {'database': 'ok'})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(
+            int(self.headers['Content-Length'])))
+        self.server.queries.append(body['queries'][0])
+        self._respond(200, {'results': {}})
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status_code, payload):
+        self.server.requests.append(
+            (self.path, self.headers.get('Authorization')))
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    # http.server only has this from Python 3.7 onwards
+    daemon_threads = True
+
+
+class LoadTesterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                          StubGrafanaAPIHandler)
+        self.server.datasource_id = random.randint(1, 100)
+        self.server.queries = []
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test__run__spreads_requests_over_all_scenarios(self):
+        # Setup
+        requests = random.randint(30, 60)
+        mock_query = str(uuid4())
+        load_tester = LoadTester(*self.server.server_address)
+
+        # Exercise
+        result = load_tester.run(requests=requests,
+                                 concurrency=random.randint(2, 8),
+                                 query=mock_query)
+
+        # Assert
+        samples_by_scenario = result.samples_by_scenario
+        assert sorted(samples_by_scenario) == ['health', 'query', 'search']
+        assert sum(len(i) for i in samples_by_scenario.values()) == requests
+        assert all(ok for samples in samples_by_scenario.values()
+                   for _, ok in samples)
+        assert result.elapsed > 0
+
+        assert len(self.server.queries) == len(samples_by_scenario['query'])
+        assert self.server.queries[0]['expr'] == mock_query
+        assert self.server.queries[0]['datasourceId'] == \
+            self.server.datasource_id
+
+    def test__run__skips_queries_without_a_prometheus_datasource(self):
+        # Setup
+        self.server.datasource_id = None
+        load_tester = LoadTester(*self.server.server_address)
+
+        # Exercise
+        result = load_tester.run(requests=10, concurrency=2)
+
+        # Assert
+        assert sorted(result.samples_by_scenario) == ['health', 'search']
+        assert self.server.queries == []
+
+    def test__run__authenticates_with_basic_auth(self):
+        # Setup
+        username = str(uuid4())
+        password = str(uuid4())
+        load_tester = LoadTester(*self.server.server_address,
+                                 username=username,
+                                 password=password)
+
+        # Exercise
+        load_tester.run(requests=3, concurrency=1)
+
+        # Assert
+        credentials = base64.b64encode(
+            f'{username}:{password}'.encode('utf-8')).decode('ascii')
+        assert {i[1] for i in self.server.requests} == \
+            {f'Basic {credentials}'}
+
+    def test__run__counts_failed_requests(self):
+        # Setup
+        host, port = self.server.server_address
+        self.server.shutdown()
+        self.server.server_close()
+        load_tester = LoadTester(host, port)
+
+        # Exercise
+        result = load_tester.run(requests=4, concurrency=2)
+
+        # Assert
+        samples = [sample for samples in result.samples_by_scenario.values()
+                   for sample in samples]
+        assert len(samples) == 4
+        assert not any(ok for _, ok in samples)
+
+
+class HealthCheckerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), StubGrafanaHandler)
+        self.server.requests = []
+        self.server.status_code = 200
+        self.server.health = {}
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test__get_health__returns_grafana_health(self):
+        # Setup
+        mock_version = str(uuid4())
+        self.server.health = {
+            'commit': str(uuid4()),
+            'database': 'ok',
+            'version': mock_version,
+        }
+        health_checker = HealthChecker(*self.server.server_address)
+        self.addCleanup(health_checker.close)
+
+        # Exercise
+        health = health_checker.get_health()
+        health_checker.get_health()
+
+        # Assert
+        assert health.is_ready
+        assert health.version == mock_version
+        assert self.server.requests == ['/api/health', '/api/health']
+
+    def test__get_health__reports_failing_database(self):
+        # Setup
+        self.server.status_code = 503
+        self.server.health = {
+            'database': 'failing',
+        }
+        health_checker = HealthChecker(*self.server.server_address)
+        self.addCleanup(health_checker.close)
+
+        # Exercise
+        health = health_checker.get_health()
+
+        # Assert
+        assert not health.is_ready
+        assert health.database == 'failing'
+
+    def test__get_health__returns_none_if_grafana_is_not_listening(self):
+        # Setup
+        host, port = self.server.server_address
+        self.server.shutdown()
+        self.server.server_close()
+        health_checker = HealthChecker(host, port)
+
+        # Exercise
+        health = health_checker.get_health()
+
+        # Assert
+        assert health is None
+
+
+class ConnectTest(unittest.TestCase):
+
+    def test__it_talks_plain_http_by_default(self):
+        # Exercise
+        conn = connect('127.0.0.1', random.randint(1, 65535), timeout=1.0)
+
+        # Assert
+        assert type(conn) == http.client.HTTPConnection
+
+    @patch('adapters.grafana.http.client.HTTPSConnection', autospec=True)
+    def test__it_does_not_verify_the_pod_certificate(self,
+                                                     mock_https_conn_cls):
+        # Setup
+        port = random.randint(1, 65535)
+
+        # Exercise
+        conn = connect('127.0.0.1', port, timeout=1.0, use_tls=True)
+
+        # Assert
+        assert conn == mock_https_conn_cls.return_value
+        args, kwargs = mock_https_conn_cls.call_args
+        assert args == ('127.0.0.1', port)
+        assert kwargs['timeout'] == 1.0
+        assert not kwargs['context'].check_hostname
+        assert kwargs['context'].verify_mode == ssl.CERT_NONE
+
+
+class GrafanaHealthTest(unittest.TestCase):
+
+    def test__is_not_ready_without_database_status(self):
+        # Exercise
+        health = GrafanaHealth({})
+
+        # Assert
+        assert not health.is_ready
+        assert health.version is None
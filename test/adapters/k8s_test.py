@@ -1,10 +1,13 @@
+import http.client
 import io
 import json
 import random
+import socket
 import sys
 import unittest
 from unittest.mock import (
     call,
+    create_autospec,
     patch,
 )
 from uuid import (
@@ -15,6 +18,8 @@ sys.path.append('src')
 from adapters import k8s
 from adapters.k8s import (
     APIServer,
+    parse_quantity,
+    PodMetrics,
     PodStatus,
     ServiceSpec,
 )
@@ -37,6 +42,9 @@ class GetPodStatusTest(unittest.TestCase):
                     'annotations': {
                         'juju.io/unit': juju_unit
                     }
+                },
+                'status': {
+                    'phase': 'Pending'
                 }
             }]
         }
@@ -69,6 +77,62 @@ class GetPodStatusTest(unittest.TestCase):
         assert type(pod_status) == PodStatus
 
 
+class GetPodStatusesTest(unittest.TestCase):
+
+    @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
+    def test__returns_PodStatus_objs_keyed_by_unit_from_one_call(
+            self,
+            mock_api_server_cls):
+        # Setup
+        juju_model = str(uuid4())
+        juju_app = str(uuid4())
+        juju_units = [str(uuid4()) for _ in range(3)]
+
+        mock_api_server = mock_api_server_cls.return_value
+        mock_api_server.get.return_value = {
+            'kind': 'PodList',
+            'items': [{
+                'metadata': {
+                    'annotations': {
+                        'juju.io/unit': juju_unit
+                    }
+                },
+                'status': {
+                    'phase': 'Pending'
+                }
+            } for juju_unit in juju_units]
+        }
+
+        # Exercise
+        pod_statuses = k8s.get_pod_statuses(juju_model=juju_model,
+                                            juju_app=juju_app)
+
+        # Assert
+        assert mock_api_server.get.call_count == 1
+        assert mock_api_server.get.call_args == call(
+            f'/api/v1/namespaces/{juju_model}/pods?'
+            f'labelSelector=juju-app={juju_app}'
+        )
+
+        assert sorted(pod_statuses.keys()) == sorted(juju_units)
+        assert all(type(i) == PodStatus for i in pod_statuses.values())
+
+    @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
+    def test__returns_empty_dict_if_response_is_not_a_pod_list(
+            self,
+            mock_api_server_cls):
+        # Setup
+        mock_api_server = mock_api_server_cls.return_value
+        mock_api_server.get.return_value = {}
+
+        # Exercise
+        pod_statuses = k8s.get_pod_statuses(juju_model=str(uuid4()),
+                                            juju_app=str(uuid4()))
+
+        # Assert
+        assert pod_statuses == {}
+
+
 class GetServiceSpec(unittest.TestCase):
 
     @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
@@ -84,7 +148,9 @@ class GetServiceSpec(unittest.TestCase):
             "kind": "Service",
             "apiVersion": "v1",
             "metadata": {},
-            "spec": {},
+            "spec": {
+                "clusterIP": str(uuid4())
+            },
             "status": {}
         }
 
@@ -116,6 +182,254 @@ class GetServiceSpec(unittest.TestCase):
         assert service_spec is None
 
 
+class GetServiceDnsNameTest(unittest.TestCase):
+
+    @patch('adapters.k8s.socket.getaddrinfo', autospec=True, spec_set=True)
+    def test__returns_the_dns_name_if_it_resolves(
+            self,
+            mock_getaddrinfo):
+        # Setup
+        juju_model = str(uuid4())
+        juju_app = str(uuid4())
+
+        # Exercise
+        dns_name = k8s.get_service_dns_name(juju_model=juju_model,
+                                            juju_app=juju_app)
+
+        # Assert
+        assert dns_name == f'{juju_app}.{juju_model}.svc'
+        assert mock_getaddrinfo.call_args == call(dns_name, None)
+
+    @patch('adapters.k8s.socket.getaddrinfo', autospec=True, spec_set=True)
+    def test__returns_none_if_the_dns_name_does_not_resolve(
+            self,
+            mock_getaddrinfo):
+        # Setup
+        mock_getaddrinfo.side_effect = socket.gaierror()
+
+        # Exercise
+        dns_name = k8s.get_service_dns_name(juju_model=str(uuid4()),
+                                            juju_app=str(uuid4()))
+
+        # Assert
+        assert dns_name is None
+
+
+class GetServiceResourceVersionTest(unittest.TestCase):
+
+    @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
+    def test__returns_the_resource_version_from_partial_metadata(
+            self,
+            mock_api_server_cls):
+        # Setup
+        juju_model = str(uuid4())
+        juju_app = str(uuid4())
+        mock_resource_version = str(uuid4())
+
+        mock_api_server = mock_api_server_cls.return_value
+        mock_api_server.get.return_value = {
+            "kind": "PartialObjectMetadata",
+            "apiVersion": "meta.k8s.io/v1",
+            "metadata": {
+                "name": juju_app,
+                "resourceVersion": mock_resource_version,
+            },
+        }
+
+        # Exercise
+        resource_version = k8s.get_service_resource_version(
+            juju_model=juju_model,
+            juju_app=juju_app)
+
+        # Assert
+        assert mock_api_server.get.call_count == 1
+        args, kwargs = mock_api_server.get.call_args
+        assert args[0] == f'/api/v1/namespaces/{juju_model}/services/{juju_app}'
+        assert 'as=PartialObjectMetadata' in kwargs['headers']['Accept']
+
+        assert resource_version == mock_resource_version
+
+    @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
+    def test__returns_none_if_resource_not_found(
+            self,
+            mock_api_server_cls):
+        # Setup
+        mock_api_server = mock_api_server_cls.return_value
+        mock_api_server.get.return_value = {
+            "kind": "Status",
+            "status": "Failure",
+            "code": 404,
+        }
+
+        # Exercise
+        resource_version = k8s.get_service_resource_version(
+            juju_model=str(uuid4()),
+            juju_app=str(uuid4()))
+
+        # Assert
+        assert resource_version is None
+
+
+class GetPodMetricsTest(unittest.TestCase):
+
+    @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
+    def test__returns_a_PodMetrics_obj_if_resource_found(
+            self,
+            mock_api_server_cls):
+        # Setup
+        juju_model = str(uuid4())
+        pod_name = str(uuid4())
+
+        mock_api_server = mock_api_server_cls.return_value
+        mock_api_server.get.return_value = {
+            'kind': 'PodMetrics',
+            'containers': []
+        }
+
+        # Exercise
+        pod_metrics = k8s.get_pod_metrics(juju_model=juju_model,
+                                          pod_name=pod_name)
+
+        # Assert
+        assert mock_api_server.get.call_args == call(
+            f'/apis/metrics.k8s.io/v1beta1/namespaces/{juju_model}/'
+            f'pods/{pod_name}'
+        )
+        assert type(pod_metrics) == PodMetrics
+
+    @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
+    def test__returns_none_if_metrics_api_is_unavailable(
+            self,
+            mock_api_server_cls):
+        # Setup
+        mock_api_server = mock_api_server_cls.return_value
+        mock_api_server.get.return_value = {
+            'kind': 'Status',
+            'code': 404
+        }
+
+        # Exercise
+        pod_metrics = k8s.get_pod_metrics(juju_model=str(uuid4()),
+                                          pod_name=str(uuid4()))
+
+        # Assert
+        assert pod_metrics is None
+
+
+class ApplyHorizontalPodAutoscalerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.juju_model = str(uuid4())
+        self.autoscaler = {
+            'kind': 'HorizontalPodAutoscaler',
+            'metadata': {'name': str(uuid4())},
+        }
+        self.path = f'/apis/autoscaling/v2beta2/namespaces/' \
+                    f'{self.juju_model}/horizontalpodautoscalers'
+
+    @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
+    def test__replaces_an_existing_autoscaler(self, mock_api_server_cls):
+        # Setup
+        mock_api_server = mock_api_server_cls.return_value
+        mock_api_server.request.return_value = self.autoscaler
+
+        # Exercise
+        applied = k8s.apply_horizontal_pod_autoscaler(
+            juju_model=self.juju_model, autoscaler=self.autoscaler)
+
+        # Assert
+        assert applied
+        assert mock_api_server.request.call_args_list == [
+            call('PUT', f"{self.path}/{self.autoscaler['metadata']['name']}",
+                 body=self.autoscaler),
+        ]
+
+    @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
+    def test__creates_a_missing_autoscaler(self, mock_api_server_cls):
+        # Setup
+        mock_api_server = mock_api_server_cls.return_value
+        mock_api_server.request.side_effect = [
+            {'kind': 'Status', 'code': 404},
+            self.autoscaler,
+        ]
+
+        # Exercise
+        applied = k8s.apply_horizontal_pod_autoscaler(
+            juju_model=self.juju_model, autoscaler=self.autoscaler)
+
+        # Assert
+        assert applied
+        assert mock_api_server.request.call_args_list[1] == \
+            call('POST', self.path, body=self.autoscaler)
+
+
+class GetAutoscalerStatusTest(unittest.TestCase):
+
+    @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
+    def test__returns_the_current_and_desired_replicas(
+            self,
+            mock_api_server_cls):
+        # Setup
+        mock_api_server = mock_api_server_cls.return_value
+        mock_api_server.get.return_value = {
+            'kind': 'HorizontalPodAutoscaler',
+            'spec': {
+                'minReplicas': 2,
+                'maxReplicas': 5,
+            },
+            'status': {
+                'currentReplicas': 2,
+                'desiredReplicas': 3,
+            }
+        }
+
+        # Exercise
+        autoscaler_status = k8s.get_autoscaler_status(juju_model=uuid4(),
+                                                      juju_app=uuid4())
+
+        # Assert
+        assert autoscaler_status.current_replicas == 2
+        assert autoscaler_status.desired_replicas == 3
+        assert autoscaler_status.min_replicas == 2
+        assert autoscaler_status.max_replicas == 5
+
+    @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
+    def test__returns_none_if_resource_not_found(self, mock_api_server_cls):
+        # Setup
+        mock_api_server = mock_api_server_cls.return_value
+        mock_api_server.get.return_value = {'kind': 'Status', 'code': 404}
+
+        # Exercise and Assert
+        assert k8s.get_autoscaler_status(juju_model=uuid4(),
+                                         juju_app=uuid4()) is None
+
+
+class PatchIngressAnnotationsTest(unittest.TestCase):
+
+    @patch('adapters.k8s.APIServer', autospec=True, spec_set=True)
+    def test__merges_the_annotations(self, mock_api_server_cls):
+        # Setup
+        juju_model = str(uuid4())
+        juju_app = str(uuid4())
+        annotations = {str(uuid4()): str(uuid4())}
+        mock_api_server = mock_api_server_cls.return_value
+        mock_api_server.request.return_value = {'kind': 'Ingress'}
+
+        # Exercise
+        patched = k8s.patch_ingress_annotations(juju_model=juju_model,
+                                                juju_app=juju_app,
+                                                annotations=annotations)
+
+        # Assert
+        assert patched
+        assert mock_api_server.request.call_args == call(
+            'PATCH',
+            f'/apis/networking.k8s.io/v1beta1/namespaces/{juju_model}/'
+            f'ingresses/{juju_app}',
+            headers={'Content-Type': 'application/merge-patch+json'},
+            body={'metadata': {'annotations': annotations}})
+
+
 class APIServerTest(unittest.TestCase):
 
     @patch('adapters.k8s.open', create=True)
@@ -132,10 +446,13 @@ class APIServerTest(unittest.TestCase):
         mock_token_file = io.StringIO(mock_token)
         mock_open.return_value = mock_token_file
         mock_response_dict = {}
-        mock_response_json = io.StringIO(json.dumps(mock_response_dict))
+        mock_response = create_autospec(http.client.HTTPResponse,
+                                        instance=True)
+        mock_response.status = 200
+        mock_response.read.return_value = json.dumps(mock_response_dict)
 
         mock_conn = mock_https_connection_cls.return_value
-        mock_conn.getresponse.return_value = mock_response_json
+        mock_conn.getresponse.return_value = mock_response
 
         # Exercise
         api_server = APIServer()
@@ -144,6 +461,80 @@ class APIServerTest(unittest.TestCase):
         # Assert
         assert response == mock_response_dict
 
+    @patch('adapters.k8s.time.sleep', autospec=True, spec_set=True)
+    @patch('adapters.k8s.open', create=True)
+    @patch('adapters.k8s.ssl.SSLContext', autospec=True, spec_set=True)
+    @patch('adapters.k8s.http.client.HTTPSConnection',
+           autospec=True, spec_set=True)
+    def test__request__retries_after_being_throttled(
+            self,
+            mock_https_connection_cls,
+            mock_ssl_context_cls,
+            mock_open,
+            mock_sleep):
+        # Setup
+        mock_open.return_value = io.StringIO(f'{uuid4()}')
+        mock_response_dict = {'kind': str(uuid4())}
+
+        mock_throttled_response = create_autospec(http.client.HTTPResponse,
+                                                  instance=True)
+        mock_throttled_response.status = 429
+        mock_throttled_response.read.return_value = json.dumps({
+            'kind': 'Status',
+            'code': 429,
+        })
+        mock_throttled_response.getheader.return_value = '2'
+
+        mock_response = create_autospec(http.client.HTTPResponse,
+                                        instance=True)
+        mock_response.status = 200
+        mock_response.read.return_value = json.dumps(mock_response_dict)
+
+        mock_conn = mock_https_connection_cls.return_value
+        mock_conn.getresponse.side_effect = [mock_throttled_response,
+                                             mock_response]
+
+        # Exercise
+        response = APIServer().get('/some/path')
+
+        # Assert
+        assert response == mock_response_dict
+        assert mock_conn.request.call_count == 2
+        assert mock_sleep.call_args == call(2.0)
+
+    @patch('adapters.k8s.time.sleep', autospec=True, spec_set=True)
+    @patch('adapters.k8s.open', create=True)
+    @patch('adapters.k8s.ssl.SSLContext', autospec=True, spec_set=True)
+    @patch('adapters.k8s.http.client.HTTPSConnection',
+           autospec=True, spec_set=True)
+    def test__request__gives_up_after_max_attempts(
+            self,
+            mock_https_connection_cls,
+            mock_ssl_context_cls,
+            mock_open,
+            mock_sleep):
+        # Setup
+        mock_open.return_value = io.StringIO(f'{uuid4()}')
+        mock_throttled_response = create_autospec(http.client.HTTPResponse,
+                                                  instance=True)
+        mock_throttled_response.status = 429
+        mock_throttled_response.read.return_value = json.dumps({
+            'kind': 'Status',
+            'code': 429,
+        })
+        mock_throttled_response.getheader.return_value = str(uuid4())
+
+        mock_conn = mock_https_connection_cls.return_value
+        mock_conn.getresponse.return_value = mock_throttled_response
+
+        # Exercise
+        response = APIServer().get('/some/path')
+
+        # Assert
+        assert response['code'] == 429
+        assert mock_conn.request.call_count == APIServer.MAX_ATTEMPTS
+        assert mock_sleep.call_args == call(1)
+
 
 class PodStatusTest(unittest.TestCase):
 
@@ -230,6 +621,132 @@ class PodStatusTest(unittest.TestCase):
         assert pod_status.is_unknown
         assert not pod_status.is_running
         assert not pod_status.is_ready
+        assert not pod_status.is_crash_looping
+        assert pod_status.restart_count == 0
+
+    def test__pod_is_crash_looping(self):
+        # Setup
+        restart_counts = [random.randint(0, 100) for _ in range(2)]
+        status_dict = {
+            'metadata': {
+                'annotations': {
+                    'juju.io/unit': uuid4()
+                }
+            },
+            'status': {
+                'phase': 'Running',
+                'conditions': [{
+                    'type': 'ContainersReady',
+                    'status': 'False'
+                }],
+                'containerStatuses': [{
+                    'restartCount': restart_counts[0],
+                    'state': {
+                        'waiting': {
+                            'reason': 'CrashLoopBackOff'
+                        }
+                    }
+                }, {
+                    'restartCount': restart_counts[1],
+                    'state': {
+                        'running': {}
+                    }
+                }]
+            }
+        }
+
+        # Exercise
+        pod_status = PodStatus(status_dict=status_dict)
+
+        # Assert
+        assert pod_status.is_crash_looping
+        assert pod_status.waiting_reason == 'CrashLoopBackOff'
+        assert pod_status.restart_count == sum(restart_counts)
+
+    def test__pod_was_oom_killed(self):
+        # Setup
+        status_dict = {
+            'metadata': {
+                'name': 'grafana-0',
+                'annotations': {
+                    'juju.io/unit': uuid4()
+                }
+            },
+            'status': {
+                'phase': 'Running',
+                'conditions': [],
+                'containerStatuses': [{
+                    'restartCount': 1,
+                    'state': {
+                        'running': {}
+                    },
+                    'lastState': {
+                        'terminated': {
+                            'exitCode': 137,
+                            'reason': 'OOMKilled'
+                        }
+                    }
+                }]
+            }
+        }
+
+        # Exercise
+        pod_status = PodStatus(status_dict=status_dict)
+
+        # Assert
+        assert pod_status.name == 'grafana-0'
+        assert pod_status.last_termination_reason == 'OOMKilled'
+        assert pod_status.waiting_reason is None
+        assert not pod_status.is_crash_looping
+
+    def test__raises_value_error_if_pod_object_is_malformed(self):
+        # Setup
+        status_dict = {
+            'metadata': {
+                'name': str(uuid4())
+            }
+        }
+
+        # Exercise and Assert
+        with self.assertRaises(ValueError):
+            PodStatus(status_dict=status_dict)
+
+    def test__is_immutable(self):
+        # Setup
+        pod_status = PodStatus(status_dict=None)
+
+        # Exercise and Assert
+        with self.assertRaises(AttributeError):
+            pod_status.is_ready = True
+        with self.assertRaises(AttributeError):
+            pod_status.raw = {}
+
+
+class PodMetricsTest(unittest.TestCase):
+
+    def test__sums_usage_across_containers(self):
+        # Setup
+        pod_metrics = PodMetrics({
+            'kind': 'PodMetrics',
+            'containers': [{
+                'usage': {'cpu': '100m', 'memory': '64Mi'}
+            }, {
+                'usage': {'cpu': '50000000n', 'memory': '65536Ki'}
+            }]
+        })
+
+        # Assert
+        assert round(pod_metrics.cpu_millicores) == 150
+        assert pod_metrics.memory_bytes == 128 * 2 ** 20
+
+
+class ParseQuantityTest(unittest.TestCase):
+
+    def test__parses_suffixes(self):
+        assert parse_quantity('2') == 2
+        assert parse_quantity('250m') == 0.25
+        assert parse_quantity('1Gi') == 2 ** 30
+        assert parse_quantity('1G') == 10 ** 9
 
 
 class ServiceSpecTest(unittest.TestCase):
@@ -287,3 +804,28 @@ class ServiceSpecTest(unittest.TestCase):
 
         # Assert
         assert service_spec.port == self.mock_port
+
+    def test_resource_version(self):
+        # Exercise
+        service_spec = ServiceSpec(self.service_spec)
+
+        # Assert
+        assert service_spec.resource_version == "257015"
+
+    def test_port_is_none_without_a_tcp_port(self):
+        # Setup
+        self.service_spec['spec']['ports'][0]['protocol'] = 'UDP'
+
+        # Exercise
+        service_spec = ServiceSpec(self.service_spec)
+
+        # Assert
+        assert service_spec.port is None
+
+    def test_raises_value_error_if_service_object_is_malformed(self):
+        # Setup
+        del self.service_spec['spec']['clusterIP']
+
+        # Exercise and Assert
+        with self.assertRaises(ValueError):
+            ServiceSpec(self.service_spec)
@@ -1,5 +1,7 @@
+import json
 import random
 import sys
+import time
 import unittest
 from unittest.mock import (
     call,
@@ -11,6 +13,7 @@ from uuid import uuid4
 sys.path.append('lib')
 
 from ops.charm import (
+    ActionEvent,
     ConfigChangedEvent,
 )
 from ops.framework import (
@@ -20,6 +23,7 @@ from ops.framework import (
 )
 from ops.model import (
     ActiveStatus,
+    BlockedStatus,
     MaintenanceStatus,
 )
 from ops.testing import (
@@ -29,10 +33,18 @@ from ops.testing import (
 sys.path.append('src')
 import adapters
 import charm
+from domain import (
+    INGRESS_BACKEND_PROTOCOL_ANNOTATION,
+    INGRESS_SNIPPET_ANNOTATION,
+)
 from interface_http import (
     ServerAvailableEvent,
     ServerDetails as PostgresServerDetails,
 )
+from interface_cache import (
+    CacheServerDetails,
+    NewCacheRelationEvent,
+)
 from interface_mysql import (
     MySQLServerDetails,
     NewMySQLRelationEvent,
@@ -81,6 +93,28 @@ class CharmTest(unittest.TestCase):
             assert isinstance(args[1], BoundStoredState)
             assert isinstance(args[2], adapters.framework.FrameworkAdapter)
 
+    def test__redis_on_new_relation_calls_handler(self):
+        with patch.object(charm, 'on_server_new_relation_handler',
+                          spect_set=True) as mocked_on_new_server_relation_handler:
+            # Setup
+            server_details = CacheServerDetails(dict(
+                cache_type='redis',
+                hostname=str(uuid4()),
+                port=str(random.randint(1, 65535)),
+            ))
+
+            # Exercise
+            self.harness.charm.redis.on.new_relation.emit(server_details)
+
+            # Assert
+            assert mocked_on_new_server_relation_handler.call_count == 1
+
+            args, kwargs = mocked_on_new_server_relation_handler.call_args
+            assert isinstance(args[0], NewCacheRelationEvent)
+            assert args[0].server_details.address == server_details.address
+            assert args[1].cache_servers['redis'] == \
+                server_details.snapshot()
+
     def test__on_config_changed_calls_handler(self):
         with patch.object(charm, 'on_config_changed_handler',
                           spect_set=True) as mocked_on_config_changed_handler:
@@ -92,7 +126,8 @@ class CharmTest(unittest.TestCase):
 
             args, kwargs = mocked_on_config_changed_handler.call_args
             assert isinstance(args[0], ConfigChangedEvent)
-            assert isinstance(args[1], adapters.framework.FrameworkAdapter)
+            assert isinstance(args[1], BoundStoredState)
+            assert isinstance(args[2], adapters.framework.FrameworkAdapter)
 
     def test__prometheus_client_on_new_server_available_calls_handler(self):
         with patch.object(charm, 'on_server_new_relation_handler',
@@ -121,16 +156,20 @@ class CharmTest(unittest.TestCase):
 
 class OnConfigChangedHandlerTest(unittest.TestCase):
 
+    @patch('charm.grafana', spec_set=True, autospec=True)
     @patch('charm.k8s', spec_set=True, autospec=True)
     @patch('charm.build_juju_unit_status', spec_set=True, autospec=True)
     def test__it_blocks_until_pod_is_ready(self,
                                            mock_build_juju_unit_status_func,
-                                           mock_k8s_mod):
+                                           mock_k8s_mod,
+                                           mock_grafana_mod):
         # Setup
         mock_fw_adapter_cls = \
             create_autospec(adapters.framework.FrameworkAdapter,
                             spec_set=True)
         mock_fw = mock_fw_adapter_cls.return_value
+        mock_fw.am_i_leader.return_value = False
+        mock_fw.get_app_relation_data.return_value = {}
 
         mock_juju_unit_states = [
             MaintenanceStatus(str(uuid4())),
@@ -141,19 +180,261 @@ class OnConfigChangedHandlerTest(unittest.TestCase):
 
         mock_event_cls = create_autospec(EventBase, spec_set=True)
         mock_event = mock_event_cls.return_value
+        mock_state = create_autospec(StoredState).return_value
 
         # Exercise
-        charm.on_config_changed_handler(mock_event, mock_fw)
+        charm.on_config_changed_handler(mock_event, mock_state, mock_fw)
 
         # Assert
         assert mock_fw.set_unit_status.call_count == len(mock_juju_unit_states)
         assert mock_fw.set_unit_status.call_args_list == [
             call(status) for status in mock_juju_unit_states
         ]
+        assert mock_fw.flush_unit_status.call_count == 1
+
+
+class UpdateUnitStatusTest(unittest.TestCase):
+
+    def build_non_leader_fw(self, summary, published_at, pod_spec_set_at=0):
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        mock_fw = mock_fw_adapter_cls.return_value
+        mock_fw.am_i_leader.return_value = False
+        mock_fw.get_unit_name.return_value = 'grafana/1'
+        mock_fw.get_config.return_value = False
+        mock_fw.get_app_relation_data.return_value = {
+            charm.POD_STATUS_SUMMARY_KEY: json.dumps(summary),
+            charm.POD_STATUS_PUBLISHED_AT_KEY: json.dumps(published_at),
+            charm.POD_SPEC_SET_AT_KEY: json.dumps(pod_spec_set_at),
+        }
+        return mock_fw
+
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__non_leader_uses_published_summary_when_ready(self,
+                                                           mock_k8s_mod):
+        # Setup
+        revision = str(uuid4())
+        # An unchanged summary is not republished so its age is no reason
+        # to distrust it
+        mock_fw = self.build_non_leader_fw({
+            'grafana/0': {'state': 'ready', 'restarts': 0,
+                          'revision': revision},
+            'grafana/1': {'state': 'ready', 'restarts': 3,
+                          'last-terminated': 'OOMKilled',
+                          'revision': revision},
+        }, published_at=time.time() - random.randint(3600, 86400))
+
+        # Exercise
+        charm.update_unit_status(mock_fw)
+
+        # Assert
+        assert mock_k8s_mod.get_pod_statuses.call_count == 0
+        assert mock_fw.set_unit_status.call_args == \
+            call(ActiveStatus("last terminated: OOMKilled; 3 restarts"))
+
+    @patch('charm.grafana', spec_set=True, autospec=True)
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    @patch('charm.build_juju_unit_status', spec_set=True, autospec=True)
+    def test__non_leader_asks_k8s_when_the_summary_may_be_outdated(
+            self,
+            mock_build_juju_unit_status_func,
+            mock_k8s_mod,
+            mock_grafana_mod):
+        # Setup
+        now = time.time()
+        revision = str(uuid4())
+        summary = {'grafana/1': {'state': 'ready', 'restarts': 0,
+                                 'revision': revision}}
+        stale_fws = [
+            # Published before the pods were rolled for a new pod spec
+            self.build_non_leader_fw(summary, published_at=now,
+                                     pod_spec_set_at=now - 1),
+            # Rollout in progress
+            self.build_non_leader_fw(
+                dict(summary, **{'grafana/0': {'state': 'ready',
+                                               'restarts': 0,
+                                               'revision': str(uuid4())}}),
+                published_at=now),
+        ]
+        mock_k8s_mod.get_pod_statuses.return_value = {}
+        mock_build_juju_unit_status_func.return_value = ActiveStatus()
+
+        for mock_fw in stale_fws:
+            # Exercise
+            charm.update_unit_status(mock_fw)
+
+            # Assert
+            assert mock_fw.set_unit_status.call_args == call(ActiveStatus())
+
+        assert mock_k8s_mod.get_pod_statuses.call_count == len(stale_fws)
+
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    @patch('charm.build_juju_unit_status', spec_set=True, autospec=True)
+    def test__leader_publishes_app_status_and_summary(
+            self,
+            mock_build_juju_unit_status_func,
+            mock_k8s_mod):
+        # Setup
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        mock_fw = mock_fw_adapter_cls.return_value
+        mock_fw.am_i_leader.return_value = True
+        mock_fw.get_unit_name.return_value = 'grafana/0'
+        peer_data = {}
+        mock_fw.get_app_relation_data.return_value = peer_data
+
+        mock_pod_status = create_autospec(adapters.k8s.PodStatus,
+                                          spec_set=True).return_value
+        mock_pod_status.is_crash_looping = False
+        mock_pod_status.is_running = True
+        mock_pod_status.is_ready = True
+        mock_pod_status.restart_count = 0
+        mock_pod_status.last_termination_reason = None
+        mock_pod_status.revision = None
+        mock_pod_status.pod_ip = None
+        mock_k8s_mod.get_pod_statuses.return_value = {
+            'grafana/0': mock_pod_status,
+        }
+        mock_k8s_mod.get_autoscaler_status.return_value = None
+        mock_build_juju_unit_status_func.return_value = ActiveStatus()
+
+        # Exercise
+        charm.update_unit_status(mock_fw)
+
+        # Assert
+        assert mock_k8s_mod.get_pod_statuses.call_count == 1
+        assert mock_fw.set_app_status.call_count == 1
+        args, kwargs = mock_fw.set_app_status.call_args
+        assert type(args[0]) == ActiveStatus
+        assert json.loads(peer_data[charm.POD_STATUS_SUMMARY_KEY]) == {
+            'grafana/0': {'state': 'ready', 'restarts': 0,
+                          'last-terminated': None, 'revision': None}
+        }
+        assert charm.POD_STATUS_PUBLISHED_AT_KEY in peer_data
+
+    def test__leader_does_not_republish_an_unchanged_summary(self):
+        # Setup
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        mock_fw = mock_fw_adapter_cls.return_value
+        summary = {'grafana/0': {'state': 'ready', 'restarts': 0,
+                                 'last-terminated': None, 'revision': None}}
+        now = time.time()
+        peer_data = {
+            charm.POD_STATUS_SUMMARY_KEY: json.dumps(summary),
+            charm.POD_STATUS_PUBLISHED_AT_KEY: json.dumps(now - 3600),
+            charm.POD_SPEC_SET_AT_KEY: json.dumps(now - 7200),
+            charm.REPLICA_SUMMARY_KEY: json.dumps(None),
+        }
+        mock_fw.get_app_relation_data.return_value = peer_data
+        published_peer_data = dict(peer_data)
+
+        mock_pod_status = create_autospec(adapters.k8s.PodStatus,
+                                          spec_set=True).return_value
+        mock_pod_status.is_crash_looping = False
+        mock_pod_status.is_running = True
+        mock_pod_status.is_ready = True
+        mock_pod_status.restart_count = 0
+        mock_pod_status.last_termination_reason = None
+        mock_pod_status.revision = None
+
+        # Exercise
+        charm.publish_pod_statuses(mock_fw, {'grafana/0': mock_pod_status})
+
+        # Assert
+        assert peer_data == published_peer_data
+        assert mock_fw.set_app_status.call_count == 0
+
+    def test__leader_republishes_an_unchanged_summary_after_a_rollout(self):
+        # Setup
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        mock_fw = mock_fw_adapter_cls.return_value
+        summary = {'grafana/0': {'state': 'ready', 'restarts': 0,
+                                 'last-terminated': None, 'revision': None}}
+        now = time.time()
+        pod_spec_set_at = now - charm.POD_SPEC_ROLLOUT_DELAY - 1
+        peer_data = {
+            charm.POD_STATUS_SUMMARY_KEY: json.dumps(summary),
+            charm.POD_STATUS_PUBLISHED_AT_KEY: json.dumps(pod_spec_set_at),
+            charm.POD_SPEC_SET_AT_KEY: json.dumps(pod_spec_set_at),
+            charm.REPLICA_SUMMARY_KEY: json.dumps(None),
+        }
+        mock_fw.get_app_relation_data.return_value = peer_data
+
+        mock_pod_status = create_autospec(adapters.k8s.PodStatus,
+                                          spec_set=True).return_value
+        mock_pod_status.is_crash_looping = False
+        mock_pod_status.is_running = True
+        mock_pod_status.is_ready = True
+        mock_pod_status.restart_count = 0
+        mock_pod_status.last_termination_reason = None
+        mock_pod_status.revision = None
+
+        # Exercise
+        charm.publish_pod_statuses(mock_fw, {'grafana/0': mock_pod_status})
+
+        # Assert
+        assert json.loads(peer_data[charm.POD_STATUS_PUBLISHED_AT_KEY]) >= now
+        assert charm.is_pod_status_summary_current(mock_fw)
+
+    @patch('charm.grafana', spec_set=True, autospec=True)
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__grafana_health_makes_the_unit_active_and_sets_version(
+            self,
+            mock_k8s_mod,
+            mock_grafana_mod):
+        # Setup
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        mock_fw = mock_fw_adapter_cls.return_value
+        mock_fw.am_i_leader.return_value = False
+        mock_fw.get_unit_name.return_value = 'grafana/0'
+        mock_fw.get_app_relation_data.return_value = {}
+        mock_fw.get_config.return_value = False
+
+        mock_pod_status = create_autospec(adapters.k8s.PodStatus,
+                                          spec_set=True).return_value
+        mock_pod_status.is_unknown = False
+        mock_pod_status.is_running = True
+        mock_pod_status.is_ready = False
+        mock_pod_status.pod_ip = str(uuid4())
+        mock_pod_status.waiting_reason = None
+        mock_pod_status.last_termination_reason = None
+        mock_pod_status.restart_count = 0
+        mock_k8s_mod.get_pod_statuses.return_value = {
+            'grafana/0': mock_pod_status,
+        }
+
+        mock_version = str(uuid4())
+        mock_health_checker = mock_grafana_mod.HealthChecker.return_value
+        mock_health_checker.get_health.return_value = \
+            adapters.grafana.GrafanaHealth({
+                'database': 'ok',
+                'version': mock_version,
+            })
+
+        # Exercise
+        charm.update_unit_status(mock_fw)
+
+        # Assert
+        assert mock_k8s_mod.get_pod_statuses.call_count == 1
+        assert mock_fw.set_unit_status.call_args_list == [
+            call(MaintenanceStatus("Pod is getting ready")),
+            call(ActiveStatus()),
+        ]
+        assert mock_fw.set_workload_version.call_args == call(mock_version)
+        assert mock_health_checker.close.call_count == 1
 
 
 class OnServerNewRelationHandlerTest(unittest.TestCase):
 
+    @patch('charm.build_juju_k8s_resources', spec_set=True, autospec=True)
     @patch('charm.build_juju_pod_spec', spec_set=True, autospec=True)
     @patch('charm.interface_mysql.MySQLServerDetails',
            spec_set=True, autospec=True)
@@ -162,13 +443,15 @@ class OnServerNewRelationHandlerTest(unittest.TestCase):
     def test__it_updates_the_juju_pod_spec(self,
                                            mock_prometheus_server_details_cls,
                                            mock_mysql_server_details_cls,
-                                           mock_build_juju_pod_spec_func):
+                                           mock_build_juju_pod_spec_func,
+                                           mock_build_k8s_resources_func):
         # Setup
         mock_fw_adapter_cls = \
             create_autospec(adapters.framework.FrameworkAdapter,
                             spec_set=True)
         mock_fw = mock_fw_adapter_cls.return_value
         mock_fw.am_i_leader.return_value = True
+        mock_fw.get_app_relation_data.return_value = None
 
         mock_event_cls = create_autospec(ServerAvailableEvent, spec_set=True)
         mock_event = mock_event_cls.return_value
@@ -184,6 +467,14 @@ class OnServerNewRelationHandlerTest(unittest.TestCase):
         }
         mock_mysql_server_details = \
             mock_mysql_server_details_cls.restore.return_value
+        mock_state.cache_servers = {}
+
+        resource_dashboards = {str(uuid4()): str(uuid4())}
+        related_dashboards = {str(uuid4()): str(uuid4())}
+        mock_fw.get_dashboards.return_value = dict(resource_dashboards)
+        mock_fw.get_remote_unit_values.return_value = [
+            json.dumps(related_dashboards)
+        ]
 
         # Exercise
         charm.on_server_new_relation_handler(mock_event, mock_state, mock_fw)
@@ -195,46 +486,544 @@ class OnServerNewRelationHandlerTest(unittest.TestCase):
                  charm_config=mock_fw.get_config.return_value,
                  image_meta=mock_fw.get_image_meta.return_value,
                  prometheus_server_details=mock_prometheus_server_details,
-                 mysql_server_details=mock_mysql_server_details)
+                 mysql_server_details=mock_mysql_server_details,
+                 cache_server_details=None,
+                 dashboards={**resource_dashboards, **related_dashboards},
+                 alerting_leader=None,
+                 tls_certificate=None)
+        assert mock_fw.get_dashboards.call_args == call('dashboards')
+        assert mock_fw.get_remote_unit_values.call_args == \
+            call('grafana-dashboard', 'dashboards')
+
+        assert mock_build_k8s_resources_func.call_args == \
+            call(app_name=mock_fw.get_app_name.return_value,
+                 charm_config=mock_fw.get_config.return_value,
+                 tls_certificate=None)
 
         assert mock_fw.set_pod_spec.call_count == 1
         assert mock_fw.set_pod_spec.call_args == \
-            call(mock_build_juju_pod_spec_func.return_value)
+            call(mock_build_juju_pod_spec_func.return_value,
+                 mock_build_k8s_resources_func.return_value)
 
         assert mock_fw.set_unit_status.call_count == 1
         args, kwargs = mock_fw.set_unit_status.call_args_list[0]
         assert type(args[0]) == MaintenanceStatus
 
+    @patch('charm.build_juju_pod_spec', spec_set=True, autospec=True)
+    @patch('charm.interface_mysql.MySQLServerDetails',
+           spec_set=True, autospec=True)
+    @patch('charm.interface_http.ServerDetails',
+           spec_set=True, autospec=True)
+    def test__it_blocks_the_unit_on_invalid_config(
+            self,
+            mock_prometheus_server_details_cls,
+            mock_mysql_server_details_cls,
+            mock_build_juju_pod_spec_func):
+        # Setup
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        mock_fw = mock_fw_adapter_cls.return_value
+        mock_fw.am_i_leader.return_value = True
+
+        mock_event = create_autospec(EventBase, spec_set=True).return_value
+        mock_state = create_autospec(StoredState).return_value
+        mock_state.mysql_server_details = None
+        mock_state.cache_servers = {}
+        mock_state.prometheus_server_details = None
+
+        config_error = charm.ConfigError(str(uuid4()), str(uuid4()))
+        mock_build_juju_pod_spec_func.side_effect = config_error
 
-class OnStartHandlerTest(unittest.TestCase):
+        # Exercise
+        charm.on_server_new_relation_handler(mock_event, mock_state, mock_fw)
 
+        # Assert
+        assert mock_fw.set_pod_spec.call_count == 0
+        assert mock_fw.set_unit_status.call_args == call(config_error.status)
+        assert type(config_error.status) == BlockedStatus
+
+
+class SetJujuPodSpecTest(unittest.TestCase):
+
+    def setUp(self):
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        self.mock_fw = mock_fw_adapter_cls.return_value
+        self.mock_fw.am_i_leader.return_value = True
+        self.mock_fw.get_dashboards.return_value = {}
+        self.mock_fw.get_remote_unit_values.return_value = []
+        self.peer_data = {}
+        self.mock_fw.get_app_relation_data.return_value = self.peer_data
+
+        self.mock_state = create_autospec(StoredState).return_value
+        self.mock_state.mysql_server_details = None
+        self.mock_state.cache_servers = {}
+        self.mock_state.prometheus_server_details = None
+
+    @patch('charm.build_juju_k8s_resources', spec_set=True, autospec=True)
     @patch('charm.build_juju_pod_spec', spec_set=True, autospec=True)
+    def test__only_a_changed_pod_spec_is_stamped(
+            self,
+            mock_build_juju_pod_spec_func,
+            mock_build_k8s_resources_func):
+        # Setup
+        mock_build_k8s_resources_func.return_value = None
+        pod_specs = [{'containers': [{'name': str(uuid4())}]}
+                     for _ in range(2)]
+        set_at = []
+
+        for pod_spec in [pod_specs[0], pod_specs[0], pod_specs[1]]:
+            mock_build_juju_pod_spec_func.return_value = pod_spec
+
+            # Exercise
+            assert charm.set_juju_pod_spec(self.mock_state, self.mock_fw)
+            set_at.append(self.peer_data[charm.POD_SPEC_SET_AT_KEY])
+
+            # The stamps would otherwise share the same time.time()
+            time.sleep(0.01)
+
+        # Assert
+        assert self.mock_fw.set_pod_spec.call_count == 2
+        assert set_at[0] == set_at[1]
+        assert set_at[1] != set_at[2]
+
+
+class GetCacheServerDetailsTest(unittest.TestCase):
+
+    def test__redis_takes_precedence_over_memcached(self):
+        # Setup
+        mock_state = create_autospec(StoredState).return_value
+        mock_state.cache_servers = {
+            'memcached': {'cache_type': 'memcached', 'host': str(uuid4()),
+                          'port': str(random.randint(1, 65535))},
+            'redis': {'cache_type': 'redis', 'host': str(uuid4()),
+                      'port': str(random.randint(1, 65535))},
+        }
+
+        # Exercise
+        cache_server_details = charm.get_cache_server_details(mock_state)
+
+        # Assert
+        assert cache_server_details.cache_type == 'redis'
+
+        del mock_state.cache_servers['redis']
+        assert charm.get_cache_server_details(mock_state).cache_type == \
+            'memcached'
+
+
+class SetAutoscalerTest(unittest.TestCase):
+
+    def setUp(self):
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        self.mock_fw = mock_fw_adapter_cls.return_value
+        self.mock_fw.am_i_leader.return_value = True
+        self.mock_fw.get_app_name.return_value = str(uuid4())
+        self.mock_fw.get_model_name.return_value = str(uuid4())
+        self.mock_config = {
+            'autoscaling-max-replicas': 5,
+            'autoscaling-min-replicas': 2,
+            'autoscaling-cpu-target': 80,
+        }
+        self.mock_fw.get_config.return_value = self.mock_config
+        self.peer_data = {}
+        self.mock_fw.get_app_relation_data.return_value = self.peer_data
+
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__it_applies_the_autoscaler(self, mock_k8s_mod):
+        # Exercise
+        assert charm.set_autoscaler(self.mock_fw)
+
+        # Assert
+        assert mock_k8s_mod.apply_horizontal_pod_autoscaler.call_count == 1
+        args, kwargs = mock_k8s_mod.apply_horizontal_pod_autoscaler.call_args
+        assert kwargs['juju_model'] == self.mock_fw.get_model_name.return_value
+        assert kwargs['autoscaler']['spec']['maxReplicas'] == 5
+        assert self.peer_data[charm.AUTOSCALER_APPLIED_KEY]
+
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__it_deletes_the_autoscaler_when_disabled(self, mock_k8s_mod):
+        # Setup
+        charm.set_autoscaler(self.mock_fw)
+        self.mock_config['autoscaling-max-replicas'] = 0
+
+        # Exercise
+        assert charm.set_autoscaler(self.mock_fw)
+        assert charm.set_autoscaler(self.mock_fw)
+
+        # Assert
+        assert mock_k8s_mod.apply_horizontal_pod_autoscaler.call_count == 1
+        assert mock_k8s_mod.delete_horizontal_pod_autoscaler.call_args_list == [
+            call(juju_model=self.mock_fw.get_model_name.return_value,
+                 juju_app=self.mock_fw.get_app_name.return_value)
+        ]
+
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__it_leaves_k8s_alone_when_autoscaling_was_never_enabled(
+            self,
+            mock_k8s_mod):
+        # Setup
+        self.mock_config['autoscaling-max-replicas'] = 0
+
+        # Exercise
+        assert charm.set_autoscaler(self.mock_fw)
+
+        # Assert
+        assert mock_k8s_mod.delete_horizontal_pod_autoscaler.call_count == 0
+
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__it_blocks_the_unit_on_invalid_config(self, mock_k8s_mod):
+        # Setup
+        self.mock_config['autoscaling-max-replicas'] = 1
+
+        # Exercise
+        assert not charm.set_autoscaler(self.mock_fw)
+
+        # Assert
+        assert mock_k8s_mod.apply_horizontal_pod_autoscaler.call_count == 0
+        args, kwargs = self.mock_fw.set_unit_status.call_args
+        assert type(args[0]) == BlockedStatus
+
+
+class SetIngressAnnotationsTest(unittest.TestCase):
+
+    def setUp(self):
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        self.mock_fw = mock_fw_adapter_cls.return_value
+        self.mock_fw.am_i_leader.return_value = True
+        self.mock_config = {
+            'ingress-gzip': False,
+            'ingress-static-max-age': 0,
+        }
+        self.mock_fw.get_config.return_value = self.mock_config
+
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__it_patches_the_ingress(self, mock_k8s_mod):
+        # Setup
+        self.mock_config['ingress-gzip'] = True
+
+        # Exercise
+        assert charm.set_ingress_annotations(self.mock_fw)
+
+        # Assert
+        assert mock_k8s_mod.patch_ingress_annotations.call_count == 1
+        args, kwargs = mock_k8s_mod.patch_ingress_annotations.call_args
+        assert 'gzip on;' in kwargs['annotations'][INGRESS_SNIPPET_ANNOTATION]
+
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__it_only_removes_annotations_when_asked_to(self, mock_k8s_mod):
+        # Exercise
+        charm.set_ingress_annotations(self.mock_fw)
+        charm.set_ingress_annotations(self.mock_fw, remove_unset=True)
+
+        # Assert
+        assert mock_k8s_mod.patch_ingress_annotations.call_count == 1
+        args, kwargs = mock_k8s_mod.patch_ingress_annotations.call_args
+        assert kwargs['annotations'] == {
+            INGRESS_SNIPPET_ANNOTATION: None,
+            INGRESS_BACKEND_PROTOCOL_ANNOTATION: None,
+        }
+
+
+class AlertingLeaderTest(unittest.TestCase):
+
+    def setUp(self):
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        self.mock_fw = mock_fw_adapter_cls.return_value
+        self.mock_fw.am_i_leader.return_value = True
+        self.mock_fw.get_config.side_effect = {
+            'alerting-mode': 'leader',
+        }.get
+        self.peer_data = {}
+        self.mock_fw.get_app_relation_data.return_value = self.peer_data
+
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__only_the_leader_pod_evaluates_alerts(self, mock_k8s_mod):
+        # Setup
+        leader_pod_name = str(uuid4())
+        mock_k8s_mod.get_pod_status.return_value.name = leader_pod_name
+
+        # Exercise and Assert
+        assert charm.get_alerting_leader(self.mock_fw) == leader_pod_name
+
+        self.mock_fw.am_i_leader.return_value = False
+        assert charm.get_alerting_leader(self.mock_fw) is None
+
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__a_new_leader_pod_makes_the_podspec_stale(self, mock_k8s_mod):
+        # Setup
+        self.peer_data[charm.ALERTING_LEADER_KEY] = json.dumps(str(uuid4()))
+        mock_k8s_mod.get_pod_status.return_value.name = str(uuid4())
+
+        # Exercise and Assert
+        assert charm.is_alerting_leader_stale(self.mock_fw)
+
+        self.peer_data[charm.ALERTING_LEADER_KEY] = \
+            json.dumps(mock_k8s_mod.get_pod_status.return_value.name)
+        assert not charm.is_alerting_leader_stale(self.mock_fw)
+
+
+class TLSCertificateTest(unittest.TestCase):
+
+    def setUp(self):
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        self.mock_fw = mock_fw_adapter_cls.return_value
+        self.mock_fw.am_i_leader.return_value = True
+        self.mock_fw.get_app_name.return_value = 'grafana'
+        self.mock_fw.get_model_name.return_value = 'lma'
+        self.mock_fw.get_unit_name.return_value = 'grafana/0'
+        self.charm_config = {'protocol': 'h2', 'tls-cert': '', 'tls-key': ''}
+        self.mock_fw.get_config.return_value = self.charm_config
+        self.remote_data = {}
+        self.mock_fw.get_remote_unit_values.side_effect = \
+            lambda relation_name, key: [self.remote_data[key]] \
+            if key in self.remote_data else []
+
+    def test__config_takes_precedence_over_the_relation(self):
+        # Setup
+        self.charm_config.update({'tls-cert': str(uuid4()),
+                                  'tls-key': str(uuid4())})
+        self.remote_data = {'grafana_0.server.cert': str(uuid4()),
+                            'grafana_0.server.key': str(uuid4())}
+
+        # Exercise and Assert
+        assert charm.get_tls_certificate(self.mock_fw) == {
+            'cert': self.charm_config['tls-cert'],
+            'key': self.charm_config['tls-key'],
+        }
+
+    def test__certificate_comes_from_the_relation(self):
+        # Setup
+        self.remote_data = {'grafana_0.server.cert': str(uuid4()),
+                            'grafana_0.server.key': str(uuid4())}
+
+        # Exercise and Assert
+        assert charm.get_tls_certificate(self.mock_fw) == {
+            'cert': self.remote_data['grafana_0.server.cert'],
+            'key': self.remote_data['grafana_0.server.key'],
+        }
+
+    def test__there_is_no_certificate_without_tls(self):
+        # Setup
+        self.charm_config.update({'protocol': 'http',
+                                  'tls-cert': str(uuid4()),
+                                  'tls-key': str(uuid4())})
+
+        # Exercise and Assert
+        assert charm.get_tls_certificate(self.mock_fw) is None
+
+        self.charm_config['protocol'] = 'https'
+        self.charm_config['tls-key'] = ''
+        assert charm.get_tls_certificate(self.mock_fw) is None
+
+    def test__the_leader_requests_a_certificate_for_the_service(self):
+        # Setup
+        unit_data = {}
+        self.mock_fw.get_unit_relation_data.return_value = unit_data
+
+        # Exercise
+        charm.request_certificate(self.mock_fw)
+
+        # Assert
+        assert self.mock_fw.get_unit_relation_data.call_args == \
+            call('certificates')
+        assert unit_data == {
+            'common_name': 'grafana.lma.svc',
+            'sans': json.dumps(['grafana.lma.svc', 'grafana']),
+            'certificate_name': 'grafana',
+        }
+
+    def test__only_the_leader_requests_a_certificate(self):
+        # Setup
+        self.mock_fw.am_i_leader.return_value = False
+
+        # Exercise
+        charm.request_certificate(self.mock_fw)
+
+        # Assert
+        assert self.mock_fw.get_unit_relation_data.call_count == 0
+
+
+class OnLoadTestActionHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        self.mock_fw = mock_fw_adapter_cls.return_value
+        self.mock_port = random.randint(1, 65535)
+        self.mock_fw.get_config.return_value = self.mock_port
+        self.mock_event = create_autospec(ActionEvent, instance=True)
+        self.mock_event.params = {
+            'requests': random.randint(1, 1000),
+            'concurrency': random.randint(1, 50),
+            'query': str(uuid4()),
+            'timeout': 5,
+            'username': '',
+            'password': '',
+        }
+
+    @patch('charm.build_load_test_summary', spec_set=True, autospec=True)
+    @patch('charm.grafana', spec_set=True, autospec=True)
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__it_reports_the_summary_of_the_load_test(
+            self,
+            mock_k8s_mod,
+            mock_grafana_mod,
+            mock_build_load_test_summary_func):
+        # Setup
+        pod_ip = str(uuid4())
+        mock_k8s_mod.get_pod_status.return_value.pod_ip = pod_ip
+        mock_load_tester = mock_grafana_mod.LoadTester.return_value
+
+        # Exercise
+        charm.on_load_test_action_handler(self.mock_event, self.mock_fw)
+
+        # Assert
+        args, kwargs = mock_grafana_mod.LoadTester.call_args
+        assert kwargs['host'] == pod_ip
+        assert kwargs['port'] == self.mock_port
+        assert mock_load_tester.run.call_args == call(
+            requests=self.mock_event.params['requests'],
+            concurrency=self.mock_event.params['concurrency'],
+            query=self.mock_event.params['query'])
+        assert mock_build_load_test_summary_func.call_args == \
+            call(mock_load_tester.run.return_value)
+        assert self.mock_event.set_results.call_args == \
+            call(mock_build_load_test_summary_func.return_value)
+
+    @patch('charm.grafana', spec_set=True, autospec=True)
+    @patch('charm.k8s', spec_set=True, autospec=True)
+    def test__it_fails_while_the_pod_has_no_ip(
+            self,
+            mock_k8s_mod,
+            mock_grafana_mod):
+        # Setup
+        mock_k8s_mod.get_pod_status.return_value.pod_ip = None
+
+        # Exercise
+        charm.on_load_test_action_handler(self.mock_event, self.mock_fw)
+
+        # Assert
+        assert self.mock_event.fail.call_count == 1
+        assert mock_grafana_mod.LoadTester.call_count == 0
+
+
+class OnMigrateSqliteToMysqlActionHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        mock_fw_adapter_cls = \
+            create_autospec(adapters.framework.FrameworkAdapter,
+                            spec_set=True)
+        self.mock_fw = mock_fw_adapter_cls.return_value
+        self.mock_event = create_autospec(ActionEvent, instance=True)
+        self.mock_event.params = {
+            'batch-size': random.randint(1, 1000),
+            'batches-per-transaction': random.randint(1, 10),
+            'restart': False,
+        }
+        self.mysql_data = {
+            'host': str(uuid4()),
+            'port': str(random.randint(1, 65535)),
+            'database': str(uuid4()),
+            'user': str(uuid4()),
+            'password': str(uuid4()),
+        }
+
+    @patch('charm.database', spec_set=True, autospec=True)
+    def test__it_migrates_into_the_related_mysql(self, mock_database_mod):
+        # Setup
+        self.mock_fw.get_remote_unit_data.return_value = [
+            {'host': str(uuid4())},
+            self.mysql_data,
+        ]
+        mock_database_mod.migrate.return_value = {
+            'dashboard_version': random.randint(1, 1000),
+        }
+
+        # Exercise
+        charm.on_migrate_sqlite_to_mysql_action_handler(self.mock_event,
+                                                        self.mock_fw)
+
+        # Assert
+        assert mock_database_mod.SQLiteSource.call_args == \
+            call(charm.SQLITE_DB_PATH)
+        args, kwargs = mock_database_mod.MySQLTarget.connect.call_args
+        assert args[0].snapshot() == \
+            MySQLServerDetails(self.mysql_data).snapshot()
+
+        args, kwargs = mock_database_mod.migrate.call_args
+        assert kwargs['batch_size'] == self.mock_event.params['batch-size']
+        assert kwargs['log'] == self.mock_event.log
+        assert mock_database_mod.SQLiteSource.return_value.close.call_count \
+            == 1
+
+        args, kwargs = self.mock_event.set_results.call_args
+        assert args[0]['copied.dashboard-version'] == \
+            str(mock_database_mod.migrate.return_value['dashboard_version'])
+
+    @patch('charm.database', spec_set=True, autospec=True)
+    def test__it_fails_when_the_migration_fails(self, mock_database_mod):
+        # Setup
+        self.mock_fw.get_remote_unit_data.return_value = [self.mysql_data]
+        message = str(uuid4())
+        mock_database_mod.MigrationError = adapters.database.MigrationError
+        mock_database_mod.migrate.side_effect = \
+            adapters.database.MigrationError(message)
+
+        # Exercise
+        charm.on_migrate_sqlite_to_mysql_action_handler(self.mock_event,
+                                                        self.mock_fw)
+
+        # Assert
+        assert self.mock_event.fail.call_args == \
+            call(f"{message}. Run the action again to resume.")
+        assert self.mock_event.set_results.call_count == 0
+        assert mock_database_mod.MySQLTarget.connect.return_value.close \
+            .call_count == 1
+
+    @patch('charm.database', spec_set=True, autospec=True)
+    def test__it_fails_without_a_mysql_relation(self, mock_database_mod):
+        # Setup
+        self.mock_fw.get_remote_unit_data.return_value = []
+
+        # Exercise
+        charm.on_migrate_sqlite_to_mysql_action_handler(self.mock_event,
+                                                        self.mock_fw)
+
+        # Assert
+        assert self.mock_event.fail.call_count == 1
+        assert mock_database_mod.migrate.call_count == 0
+
+
+class OnStartHandlerTest(unittest.TestCase):
+
+    @patch('charm.set_juju_pod_spec', spec_set=True, autospec=True)
     def test__it_updates_the_juju_pod_spec(self,
-                                           mock_build_juju_pod_spec_func):
+                                           mock_set_juju_pod_spec_func):
         # Setup
         mock_fw_adapter_cls = \
             create_autospec(adapters.framework.FrameworkAdapter,
                             spec_set=True)
         mock_fw = mock_fw_adapter_cls.return_value
-        mock_fw.am_i_leader.return_value = True
 
         mock_event_cls = create_autospec(EventBase, spec_set=True)
         mock_event = mock_event_cls.return_value
+        mock_state = create_autospec(StoredState).return_value
 
         # Exercise
-        charm.on_start_handler(mock_event, mock_fw)
+        charm.on_start_handler(mock_event, mock_state, mock_fw)
 
         # Assert
-        assert mock_build_juju_pod_spec_func.call_count == 1
-        assert mock_build_juju_pod_spec_func.call_args == \
-            call(app_name=mock_fw.get_app_name.return_value,
-                 charm_config=mock_fw.get_config.return_value,
-                 image_meta=mock_fw.get_image_meta.return_value)
-
-        assert mock_fw.set_pod_spec.call_count == 1
-        assert mock_fw.set_pod_spec.call_args == \
-            call(mock_build_juju_pod_spec_func.return_value)
-
-        assert mock_fw.set_unit_status.call_count == 1
-        args, kwargs = mock_fw.set_unit_status.call_args_list[0]
-        assert type(args[0]) == MaintenanceStatus
+        assert mock_set_juju_pod_spec_func.call_count == 1
+        assert mock_set_juju_pod_spec_func.call_args == \
+            call(mock_state, mock_fw)
@@ -1,17 +1,39 @@
+import json
 import random
 import sys
 import textwrap
 import unittest
 from uuid import uuid4
+sys.path.append('lib')
+from ops.model import (
+    ActiveStatus,
+    BlockedStatus,
+    MaintenanceStatus,
+)
+import pytest
+import yaml
+
 sys.path.append('src')
 import domain
 from adapters.framework import (
     ImageMeta,
 )
+from adapters.grafana import (
+    LoadTestResult,
+)
+import interface_cache
+from adapters.k8s import (
+    PodMetrics,
+    PodStatus,
+)
 import interface_http
 import interface_mysql
 
 
+def volume_files(volume):
+    return {i['path']: i['content'] for i in volume['files']}
+
+
 class BuildJujuPodSpecTest(unittest.TestCase):
 
     def setUp(self):
@@ -47,7 +69,7 @@ class BuildJujuPodSpecTest(unittest.TestCase):
 
         # Assertions
         assert type(spec) == dict
-        assert spec == {'containers': [{
+        assert spec == {'version': 3, 'containers': [{
             'name': self.mock_app_name,
             'imageDetails': {
                 'imagePath': self.mock_image_meta.image_path,
@@ -58,13 +80,15 @@ class BuildJujuPodSpecTest(unittest.TestCase):
                 'containerPort': self.mock_advertised_port,
                 'protocol': 'TCP'
             }],
-            'readinessProbe': {
-                'httpGet': {
-                    'path': '/api/health',
-                    'port': self.mock_advertised_port
-                },
-                'initialDelaySeconds': 10,
-                'timeoutSeconds': 30
+            'kubernetes': {
+                'readinessProbe': {
+                    'httpGet': {
+                        'path': '/api/health',
+                        'port': self.mock_advertised_port
+                    },
+                    'initialDelaySeconds': 10,
+                    'timeoutSeconds': 30
+                }
             }
         }]}
 
@@ -80,7 +104,7 @@ class BuildJujuPodSpecTest(unittest.TestCase):
         assert type(spec) == dict
         prom_host = self.mock_prometheus_server_details.host
         prom_port = self.mock_prometheus_server_details.port
-        assert spec == {'containers': [{
+        assert spec == {'version': 3, 'containers': [{
             'name': self.mock_app_name,
             'imageDetails': {
                 'imagePath': self.mock_image_meta.image_path,
@@ -91,19 +115,22 @@ class BuildJujuPodSpecTest(unittest.TestCase):
                 'containerPort': self.mock_advertised_port,
                 'protocol': 'TCP'
             }],
-            'readinessProbe': {
-                'httpGet': {
-                    'path': '/api/health',
-                    'port': self.mock_advertised_port
-                },
-                'initialDelaySeconds': 10,
-                'timeoutSeconds': 30
+            'kubernetes': {
+                'readinessProbe': {
+                    'httpGet': {
+                        'path': '/api/health',
+                        'port': self.mock_advertised_port
+                    },
+                    'initialDelaySeconds': 10,
+                    'timeoutSeconds': 30
+                }
             },
-            'files': [{
+            'volumeConfig': [{
                 'name': 'prometheus-ds',
                 'mountPath': '/etc/grafana/provisioning/datasources',
-                'files': {
-                    'prometheus.yaml': textwrap.dedent(f"""
+                'files': [{
+                    'path': 'prometheus.yaml',
+                    'content': textwrap.dedent(f"""
                          apiVersion: 1
 
                          datasources:
@@ -114,7 +141,7 @@ class BuildJujuPodSpecTest(unittest.TestCase):
                            isDefault: true
                            editable: false
                     """)
-                }
+                }]
             }]
         }]}
 
@@ -128,7 +155,7 @@ class BuildJujuPodSpecTest(unittest.TestCase):
 
         # Assertions
         assert type(spec) == dict
-        assert spec == {'containers': [{
+        assert spec == {'version': 3, 'containers': [{
             'name': self.mock_app_name,
             'imageDetails': {
                 'imagePath': self.mock_image_meta.image_path,
@@ -139,44 +166,33 @@ class BuildJujuPodSpecTest(unittest.TestCase):
                 'containerPort': self.mock_advertised_port,
                 'protocol': 'TCP'
             }],
-            'readinessProbe': {
-                'httpGet': {
-                    'path': '/api/health',
-                    'port': self.mock_advertised_port
-                },
-                'initialDelaySeconds': 10,
-                'timeoutSeconds': 30
+            'kubernetes': {
+                'readinessProbe': {
+                    'httpGet': {
+                        'path': '/api/health',
+                        'port': self.mock_advertised_port
+                    },
+                    'initialDelaySeconds': 10,
+                    'timeoutSeconds': 30
+                }
             },
-            'files': [{
-                'name': 'mysql-db-config',
+            'volumeConfig': [{
+                'name': 'grafana-config',
                 'mountPath': '/etc/grafana',
-                'files': {
-                    'grafana.ini': textwrap.dedent(f"""
+                'files': [{
+                    'path': 'grafana.ini',
+                    'content': textwrap.dedent(f"""
                         [database]
-                        type = mysql
                         host = {self.mock_mysql_server_details.address}
                         name = {self.mock_mysql_server_details.database}
-                        user = {self.mock_mysql_server_details.username}
                         password = {self.mock_mysql_server_details.password}
+                        type = mysql
+                        user = {self.mock_mysql_server_details.username}
 
-                        ;ca_cert_path =
-                        ;client_key_path =
-                        ;client_cert_path =
-                        ;server_cert_name =
-                        # Max idle conn setting default is 2
-                        ;max_idle_conn = 2
-
-                        # Max conn setting default is 0 (mean not set)
-                        ;max_open_conn =
-
-                        # Connection Max Lifetime default is 14400
-                        # (means 14400 seconds or 4 hours)
-                        ;conn_max_lifetime = 14400
-
-                        # Set to true to log the sql calls and execution times.
-                        ;log_queries =
+                        [remote_cache]
+                        type = database
                         """)
-                }
+                }]
             }]
         }]}
 
@@ -193,7 +209,7 @@ class BuildJujuPodSpecTest(unittest.TestCase):
         assert type(spec) == dict
         prom_host = self.mock_prometheus_server_details.host
         prom_port = self.mock_prometheus_server_details.port
-        assert spec == {'containers': [{
+        assert spec == {'version': 3, 'containers': [{
             'name': self.mock_app_name,
             'imageDetails': {
                 'imagePath': self.mock_image_meta.image_path,
@@ -204,19 +220,22 @@ class BuildJujuPodSpecTest(unittest.TestCase):
                 'containerPort': self.mock_advertised_port,
                 'protocol': 'TCP'
             }],
-            'readinessProbe': {
-                'httpGet': {
-                    'path': '/api/health',
-                    'port': self.mock_advertised_port
-                },
-                'initialDelaySeconds': 10,
-                'timeoutSeconds': 30
+            'kubernetes': {
+                'readinessProbe': {
+                    'httpGet': {
+                        'path': '/api/health',
+                        'port': self.mock_advertised_port
+                    },
+                    'initialDelaySeconds': 10,
+                    'timeoutSeconds': 30
+                }
             },
-            'files': [{
+            'volumeConfig': [{
                 'name': 'prometheus-ds',
                 'mountPath': '/etc/grafana/provisioning/datasources',
-                'files': {
-                    'prometheus.yaml': textwrap.dedent(f"""
+                'files': [{
+                    'path': 'prometheus.yaml',
+                    'content': textwrap.dedent(f"""
                          apiVersion: 1
 
                          datasources:
@@ -227,36 +246,1377 @@ class BuildJujuPodSpecTest(unittest.TestCase):
                            isDefault: true
                            editable: false
                     """)
-                }
+                }]
             }, {
-                'name': 'mysql-db-config',
+                'name': 'grafana-config',
                 'mountPath': '/etc/grafana',
-                'files': {
-                    'grafana.ini': textwrap.dedent(f"""
+                'files': [{
+                    'path': 'grafana.ini',
+                    'content': textwrap.dedent(f"""
                         [database]
-                        type = mysql
                         host = {self.mock_mysql_server_details.address}
                         name = {self.mock_mysql_server_details.database}
-                        user = {self.mock_mysql_server_details.username}
                         password = {self.mock_mysql_server_details.password}
+                        type = mysql
+                        user = {self.mock_mysql_server_details.username}
+
+                        [remote_cache]
+                        type = database
+                        """)
+                }]
+            }]
+        }]}
 
-                        ;ca_cert_path =
-                        ;client_key_path =
-                        ;client_cert_path =
-                        ;server_cert_name =
-                        # Max idle conn setting default is 2
-                        ;max_idle_conn = 2
+    def test_pod_spec_with_prometheus_json_data_is_generated(self):
+        # Setup
+        self.mock_config.update({
+            'prometheus-http-method': 'POST',
+            'prometheus-query-timeout': '60s',
+            'prometheus-incremental-querying': True,
+            'prometheus-custom-query-parameters': 'max_source_resolution=5m',
+        })
+        prometheus_server_details = interface_http.ServerDetails(
+            host=str(uuid4()),
+            port=random.randint(1, 65535),
+            scrape_interval='30s',
+        )
 
-                        # Max conn setting default is 0 (mean not set)
-                        ;max_open_conn =
+        # Exercise
+        spec = domain.build_juju_pod_spec(
+            app_name=self.mock_app_name,
+            charm_config=self.mock_config,
+            image_meta=self.mock_image_meta,
+            prometheus_server_details=prometheus_server_details)
 
-                        # Connection Max Lifetime default is 14400
-                        # (means 14400 seconds or 4 hours)
-                        ;conn_max_lifetime = 14400
+        # Assertions
+        prom_host = prometheus_server_details.host
+        prom_port = prometheus_server_details.port
+        assert spec['containers'][0]['volumeConfig'] == [{
+            'name': 'prometheus-ds',
+            'mountPath': '/etc/grafana/provisioning/datasources',
+            'files': [{
+                'path': 'prometheus.yaml',
+                'content': textwrap.dedent(f"""
+                     apiVersion: 1
 
-                        # Set to true to log the sql calls and execution times.
-                        ;log_queries =
-                        """)
+                     datasources:
+                     - name: Prometheus
+                       type: prometheus
+                       access: proxy
+                       url: http://{prom_host}:{prom_port}
+                       isDefault: true
+                       editable: false
+                       jsonData:
+                         customQueryParameters: "max_source_resolution=5m"
+                         httpMethod: "POST"
+                         incrementalQuerying: true
+                         queryTimeout: "60s"
+                         timeInterval: "30s"
+                """)
+            }]
+        }]
+
+    def test_pod_spec_with_dataproxy_config_is_generated(self):
+        # Setup
+        self.mock_config.update({
+            'dataproxy-timeout': 60,
+            'dataproxy-dial-timeout': 5,
+            'dataproxy-keep-alive-seconds': 30,
+            'dataproxy-max-idle-connections': 200,
+            'dataproxy-max-conns-per-host': 0,
+        })
+
+        # Exercise
+        spec = domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                          charm_config=self.mock_config,
+                                          image_meta=self.mock_image_meta)
+
+        # Assertions
+        assert spec['containers'][0]['volumeConfig'] == [{
+            'name': 'grafana-config',
+            'mountPath': '/etc/grafana',
+            'files': [{
+                'path': 'grafana.ini',
+                'content': textwrap.dedent("""
+                    [dataproxy]
+                    dialTimeout = 5
+                    keep_alive_seconds = 30
+                    max_conns_per_host = 0
+                    max_idle_connections = 200
+                    timeout = 60
+                    """)
+            }]
+        }]
+
+    def test_pod_spec_with_mysql_and_dataproxy_config_is_generated(self):
+        # Setup
+        self.mock_config['dataproxy-timeout'] = 60
+
+        # Exercise
+        spec = domain.build_juju_pod_spec(
+            app_name=self.mock_app_name,
+            charm_config=self.mock_config,
+            image_meta=self.mock_image_meta,
+            mysql_server_details=self.mock_mysql_server_details)
+
+        # Assertions
+        grafana_ini = volume_files(
+            spec['containers'][0]['volumeConfig'][0])['grafana.ini']
+        assert grafana_ini.startswith('\n[database]\nhost = ')
+        assert '\n[dataproxy]\ntimeout = 60\n\n[remote_cache]\n' in grafana_ini
+
+    def test_pod_spec_with_server_config_is_generated(self):
+        # Setup
+        self.mock_config.update({
+            'enable-gzip': True,
+            'cdn-url': 'https://grafana-assets.grafana.net',
+            'router-logging': False,
+        })
+        server_section = textwrap.dedent("""
+            [server]
+            cdn_url = https://grafana-assets.grafana.net
+            enable_gzip = true
+            router_logging = false
+            """)
+
+        for mysql_server_details in (None, self.mock_mysql_server_details):
+            # Exercise
+            spec = domain.build_juju_pod_spec(
+                app_name=self.mock_app_name,
+                charm_config=self.mock_config,
+                image_meta=self.mock_image_meta,
+                mysql_server_details=mysql_server_details)
+
+            # Assertions
+            assert volume_files(spec['containers'][0]['volumeConfig'][0])[
+                'grafana.ini'].endswith(server_section)
+
+    def test_invalid_cdn_url_is_rejected(self):
+        # Setup
+        self.mock_config['cdn-url'] = 'grafana-assets.grafana.net'
+
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                       charm_config=self.mock_config,
+                                       image_meta=self.mock_image_meta)
+
+        # Assert
+        assert err.value.status.message.startswith('cdn-url')
+
+    def test_pod_spec_with_sqlite_config_is_generated(self):
+        # Setup
+        self.mock_config.update({
+            'sqlite-wal': True,
+            'sqlite-cache-mode': 'shared',
+            'sqlite-query-retries': 5,
+            'sqlite-transaction-retries': 10,
+        })
+
+        # Exercise
+        spec = domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                          charm_config=self.mock_config,
+                                          image_meta=self.mock_image_meta)
+
+        # Assertions
+        assert spec['containers'][0]['volumeConfig'] == [{
+            'name': 'grafana-config',
+            'mountPath': '/etc/grafana',
+            'files': [{
+                'path': 'grafana.ini',
+                'content': textwrap.dedent("""
+                    [database]
+                    cache_mode = shared
+                    query_retries = 5
+                    transaction_retries = 10
+                    type = sqlite3
+                    wal = true
+                    """)
+            }]
+        }]
+
+    def test_sqlite_config_is_ignored_when_mysql_is_related(self):
+        # Setup
+        self.mock_config.update({
+            'sqlite-wal': True,
+            'sqlite-cache-mode': 'shared',
+        })
+
+        # Exercise
+        spec = domain.build_juju_pod_spec(
+            app_name=self.mock_app_name,
+            charm_config=self.mock_config,
+            image_meta=self.mock_image_meta,
+            mysql_server_details=self.mock_mysql_server_details)
+
+        # Assertions
+        grafana_ini = volume_files(
+            spec['containers'][0]['volumeConfig'][0])['grafana.ini']
+        assert 'type = mysql' in grafana_ini
+        assert 'sqlite3' not in grafana_ini
+        assert 'wal' not in grafana_ini
+
+    def test_invalid_sqlite_cache_mode_is_rejected(self):
+        # Setup
+        self.mock_config['sqlite-cache-mode'] = 'public'
+
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                       charm_config=self.mock_config,
+                                       image_meta=self.mock_image_meta)
+
+        # Assert
+        assert err.value.status.message.startswith('sqlite-cache-mode')
+
+    def test_negative_dataproxy_config_is_rejected(self):
+        # Setup
+        self.mock_config['dataproxy-timeout'] = -1
+
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                       charm_config=self.mock_config,
+                                       image_meta=self.mock_image_meta)
+
+        # Assert
+        assert err.value.status.message.startswith('dataproxy-timeout')
+
+    def test_pod_spec_with_plugins_is_generated(self):
+        # Setup
+        self.mock_config.update({
+            'plugins': 'grafana-piechart-panel, grafana-clock-panel@1.0.3',
+            'plugins-repo': 'http://plugins.example.com',
+        })
+
+        # Exercise
+        spec = domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                          charm_config=self.mock_config,
+                                          image_meta=self.mock_image_meta)
+
+        # Assertions
+        container = spec['containers'][0]
+        assert container['command'] == [
+            '/bin/sh', '/etc/grafana/entrypoint/entrypoint.sh'
+        ]
+        assert container['envConfig'] == {
+            'GF_PATHS_PLUGINS': '/var/lib/grafana/plugins',
+            'GF_PLUGIN_REPO': 'http://plugins.example.com',
+        }
+        volumes = {i['name']: i for i in container['volumeConfig']}
+        assert volumes['entrypoint']['mountPath'] == '/etc/grafana/entrypoint'
+        assert 'grafana-cli' in \
+            volume_files(volumes['entrypoint'])['entrypoint.sh']
+        assert volume_files(volumes['entrypoint'])['plugins-manifest'] == \
+            'grafana-clock-panel 1.0.3\ngrafana-piechart-panel latest\n'
+
+    def test_pod_spec_without_plugins_keeps_the_image_entrypoint(self):
+        # Setup
+        with open('config.yaml') as config_file:
+            options = yaml.safe_load(config_file)['options']
+        charm_config = {k: v.get('default') for k, v in options.items()}
+
+        for plugins in ('', ' , '):
+            charm_config['plugins'] = plugins
+
+            # Exercise
+            spec = domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                              charm_config=charm_config,
+                                              image_meta=self.mock_image_meta)
+
+            # Assertions
+            container = spec['containers'][0]
+            assert 'command' not in container
+            assert 'envConfig' not in container
+            assert 'entrypoint' not in \
+                [i['name'] for i in container.get('volumeConfig', [])]
+
+    def test_pod_spec_with_leader_only_alerting_is_generated(self):
+        # Setup
+        leader_pod_name = str(uuid4())
+        self.mock_config.update({
+            'alerting-mode': 'leader',
+            'alerting-concurrent-render-limit': 2,
+            'alerting-evaluation-timeout': 15,
+        })
+
+        # Exercise
+        spec = domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                          charm_config=self.mock_config,
+                                          image_meta=self.mock_image_meta,
+                                          alerting_leader=leader_pod_name)
+
+        # Assertions
+        container = spec['containers'][0]
+        assert 'envConfig' not in container
+        volumes = {i['name']: i for i in container['volumeConfig']}
+        assert volume_files(volumes['entrypoint']) == {
+            'entrypoint.sh': textwrap.dedent(f"""\
+                #!/bin/sh
+                if [ "$HOSTNAME" != "{leader_pod_name}" ]; then
+                    export GF_ALERTING_EXECUTE_ALERTS=false
+                    export GF_UNIFIED_ALERTING_EXECUTE_ALERTS=false
+                fi
+
+                exec /run.sh "$@"
+                """)
+        }
+        assert volume_files(volumes['grafana-config'])['grafana.ini'].startswith(
+            textwrap.dedent("""
+                [alerting]
+                concurrent_render_limit = 2
+                evaluation_timeout_seconds = 15
+                """))
+
+    def test_all_units_evaluate_alerts_until_the_leader_pod_is_known(self):
+        # Setup
+        self.mock_config['alerting-mode'] = 'leader'
+
+        # Exercise
+        spec = domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                          charm_config=self.mock_config,
+                                          image_meta=self.mock_image_meta)
+
+        # Assertions
+        assert 'command' not in spec['containers'][0]
+
+    def test_invalid_plugin_is_rejected(self):
+        # Setup
+        self.mock_config['plugins'] = 'grafana-clock-panel@1.0.3; rm -rf /'
+
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                       charm_config=self.mock_config,
+                                       image_meta=self.mock_image_meta)
+
+        # Assert
+        assert err.value.status.message.startswith('plugins')
+
+    def test_pod_spec_with_pinned_image_is_generated(self):
+        # Setup
+        digest = 'sha256:' + '0123456789abcdef' * 4
+        self.mock_config.update({
+            'image-pull-policy': 'IfNotPresent',
+            'image-digest': digest,
+        })
+        image_meta = ImageMeta({
+            'registrypath': 'localhost:32000/grafana/grafana:7.0.0',
+            'username': str(uuid4()),
+            'password': str(uuid4()),
+        })
+
+        # Exercise
+        spec = domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                          charm_config=self.mock_config,
+                                          image_meta=image_meta)
+
+        # Assertions
+        container = spec['containers'][0]
+        assert container['imagePullPolicy'] == 'IfNotPresent'
+        assert container['imageDetails']['imagePath'] == \
+            f'localhost:32000/grafana/grafana@{digest}'
+
+    def test_invalid_image_pull_policy_is_rejected(self):
+        # Setup
+        self.mock_config['image-pull-policy'] = 'Sometimes'
+
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                       charm_config=self.mock_config,
+                                       image_meta=self.mock_image_meta)
+
+        # Assert
+        assert err.value.status.message.startswith('image-pull-policy')
+
+    def test_pod_spec_with_renderer_is_generated(self):
+        # Setup
+        renderer_image = str(uuid4())
+        self.mock_config.update({
+            'renderer-image': renderer_image,
+            'renderer-concurrency': 3,
+        })
+
+        # Exercise
+        spec = domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                          charm_config=self.mock_config,
+                                          image_meta=self.mock_image_meta)
+
+        # Assertions
+        assert spec['containers'][1] == {
+            'name': f'{self.mock_app_name}-renderer',
+            'imageDetails': {
+                'imagePath': renderer_image,
+            },
+            'ports': [{
+                'containerPort': 8081,
+                'protocol': 'TCP'
+            }],
+            'envConfig': {
+                'HTTP_PORT': 8081,
+                'RENDERING_MODE': 'clustered',
+                'RENDERING_CLUSTERING_MODE': 'browser',
+                'RENDERING_CLUSTERING_MAX_CONCURRENCY': 3,
+            }
+        }
+        assert textwrap.dedent(f"""
+            [rendering]
+            callback_url = http://localhost:{self.mock_advertised_port}/
+            concurrent_render_request_limit = 3
+            server_url = http://localhost:8081/render
+            """) in volume_files(spec['containers'][0]['volumeConfig'][0])[
+            'grafana.ini']
+
+    def test_invalid_renderer_concurrency_is_rejected(self):
+        # Setup
+        self.mock_config.update({
+            'renderer-image': str(uuid4()),
+            'renderer-concurrency': 0,
+        })
+
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                       charm_config=self.mock_config,
+                                       image_meta=self.mock_image_meta)
+
+        # Assert
+        assert err.value.status.message.startswith('renderer-concurrency')
+
+    def test_pod_spec_with_h2_is_generated(self):
+        # Setup
+        self.mock_config.update({
+            'protocol': 'h2',
+            'renderer-image': str(uuid4()),
+            'renderer-concurrency': 3,
+        })
+        tls_certificate = {'cert': str(uuid4()), 'key': str(uuid4())}
+
+        # Exercise
+        spec = domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                          charm_config=self.mock_config,
+                                          image_meta=self.mock_image_meta,
+                                          tls_certificate=tls_certificate)
+
+        # Assertions
+        container = spec['containers'][0]
+        assert container['kubernetes']['readinessProbe']['httpGet'] == {
+            'path': '/api/health',
+            'port': self.mock_advertised_port,
+            'scheme': 'HTTPS',
+        }
+        k8s_resources = domain.build_juju_k8s_resources(
+            app_name=self.mock_app_name,
+            charm_config=self.mock_config,
+            tls_certificate=tls_certificate)
+        secret = k8s_resources['kubernetesResources']['secrets'][0]
+        assert container['volumeConfig'][1] == {
+            'name': 'grafana-tls',
+            'mountPath': '/etc/grafana/tls',
+            'secret': {
+                'name': secret['name'],
+            }
+        }
+        assert tls_certificate['key'] not in json.dumps(spec)
+        grafana_ini = volume_files(container['volumeConfig'][0])['grafana.ini']
+        assert textwrap.dedent("""
+            [server]
+            cert_file = /etc/grafana/tls/tls.crt
+            cert_key = /etc/grafana/tls/tls.key
+            protocol = h2
+            """) in grafana_ini
+        assert f'callback_url = https://localhost:{self.mock_advertised_port}/' \
+            in grafana_ini
+        assert spec['containers'][1]['envConfig']['IGNORE_HTTPS_ERRORS'] is True
+
+    def test_tls_protocol_without_a_certificate_is_rejected(self):
+        # Setup
+        self.mock_config['protocol'] = 'https'
+
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_juju_pod_spec(app_name=self.mock_app_name,
+                                       charm_config=self.mock_config,
+                                       image_meta=self.mock_image_meta)
+
+        # Assert
+        assert err.value.status.message.startswith('protocol')
+
+    def test_invalid_protocol_is_rejected(self):
+        # Setup
+        self.mock_config['protocol'] = 'socket'
+
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_juju_pod_spec(
+                app_name=self.mock_app_name,
+                charm_config=self.mock_config,
+                image_meta=self.mock_image_meta,
+                tls_certificate={'cert': str(uuid4()), 'key': str(uuid4())})
+
+        # Assert
+        assert err.value.status.message.startswith('protocol')
+
+
+class BuildGrafanaIniTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_mysql_server_details = interface_mysql.MySQLServerDetails(
+            dict(
+                host=str(uuid4()),
+                port=str(random.randint(1, 65535)),
+                database=str(uuid4()),
+                user=str(uuid4()),
+                password=str(uuid4()),
+            )
+        )
+
+    def test__overrides_are_merged_in_sorted_order(self):
+        # Setup
+        charm_config = {
+            'dataproxy-timeout': 30,
+            'dataproxy-dial-timeout': 10,
+            'grafana-ini-overrides': textwrap.dedent("""
+                users:
+                  default_theme: light
+                dataproxy:
+                  timeout: 60
+                auth.anonymous:
+                  enabled: true
+                """),
+        }
+
+        # Exercise
+        grafana_ini = domain.build_grafana_ini(charm_config)
+
+        # Assert
+        assert grafana_ini == textwrap.dedent("""
+            [auth.anonymous]
+            enabled = true
+
+            [dataproxy]
+            dialTimeout = 10
+            timeout = 60
+
+            [users]
+            default_theme = light
+            """)
+
+    def test__relation_provided_settings_cannot_be_overridden(self):
+        # Setup
+        charm_config = {
+            'grafana-ini-overrides': 'database: {host: "127.0.0.1:3306"}',
+        }
+
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_grafana_ini(charm_config,
+                                     self.mock_mysql_server_details)
+
+        # Assert
+        assert err.value.status.message == \
+            'grafana-ini-overrides: database.host is provided by a relation'
+
+    def test__other_database_settings_can_be_overridden(self):
+        # Setup
+        charm_config = {
+            'grafana-ini-overrides': 'database: {max_open_conn: 50}',
+        }
+
+        # Exercise
+        grafana_ini = domain.build_grafana_ini(charm_config,
+                                               self.mock_mysql_server_details)
+
+        # Assert
+        assert '\nmax_open_conn = 50\n' in grafana_ini
+        assert '\ntype = mysql\n' in grafana_ini
+
+    def test__invalid_overrides_are_rejected(self):
+        for overrides in ('[dataproxy]',
+                          'dataproxy: 60',
+                          'dataproxy: {timeout: [60]}',
+                          '"data proxy": {timeout: 60}',
+                          'server: {domain: "a\\nb"}',
+                          'dataproxy: {timeout'):
+            # Exercise
+            with pytest.raises(domain.ConfigError) as err:
+                domain.build_grafana_ini({'grafana-ini-overrides': overrides})
+
+            # Assert
+            assert err.value.status.message.startswith(
+                'grafana-ini-overrides')
+
+
+class BuildRemoteCacheConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_host = str(uuid4())
+        self.mock_port = str(random.randint(1, 65535))
+        self.mock_mysql_server_details = interface_mysql.MySQLServerDetails(
+            dict(
+                host=str(uuid4()),
+                database=str(uuid4()),
+                user=str(uuid4()),
+                password=str(uuid4()),
+            )
+        )
+
+    def test__redis_relation_takes_precedence_over_mysql(self):
+        # Setup
+        cache_server_details = interface_cache.CacheServerDetails(dict(
+            cache_type='redis',
+            hostname=self.mock_host,
+            port=self.mock_port,
+            password='secret',
+        ))
+
+        # Exercise
+        remote_cache_config = domain.build_remote_cache_config(
+            cache_server_details, self.mock_mysql_server_details)
+
+        # Assert
+        assert remote_cache_config == {
+            'type': 'redis',
+            'connstr': f'addr={self.mock_host}:{self.mock_port},'
+                       f'pool_size=100,db=0,ssl=false,password=secret',
+        }
+
+    def test__memcached_relation(self):
+        # Setup
+        cache_server_details = interface_cache.CacheServerDetails(dict(
+            cache_type='memcached',
+            host=self.mock_host,
+            port=self.mock_port,
+        ))
+
+        # Exercise
+        remote_cache_config = domain.build_remote_cache_config(
+            cache_server_details, None)
+
+        # Assert
+        assert remote_cache_config == {
+            'type': 'memcached',
+            'connstr': f'{self.mock_host}:{self.mock_port}',
+        }
+
+    def test__defaults_to_the_mysql_database(self):
+        # Exercise
+        remote_cache_config = domain.build_remote_cache_config(
+            None, self.mock_mysql_server_details)
+
+        # Assert
+        assert remote_cache_config == {'type': 'database'}
+
+    def test__is_empty_without_a_shared_backend(self):
+        # Exercise
+        remote_cache_config = domain.build_remote_cache_config(None, None)
+
+        # Assert
+        assert remote_cache_config == {}
+
+
+class BuildPrometheusJsonDataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_prometheus_server_details = interface_http.ServerDetails(
+            host=str(uuid4()),
+            port=random.randint(1, 65535),
+            scrape_interval='15s',
+        )
+
+    def test__config_overrides_the_advertised_scrape_interval(self):
+        # Exercise
+        json_data = domain.build_prometheus_json_data(
+            {'prometheus-time-interval': '1m'},
+            self.mock_prometheus_server_details)
+
+        # Assert
+        assert json_data == {'timeInterval': '1m'}
+
+    def test__compound_durations_are_accepted(self):
+        # Setup
+        prometheus_server_details = interface_http.ServerDetails(
+            host=str(uuid4()),
+            port=random.randint(1, 65535),
+            scrape_interval='1m30s',
+        )
+
+        # Exercise
+        json_data = domain.build_prometheus_json_data(
+            {'prometheus-query-timeout': '1h30m'}, prometheus_server_details)
+
+        # Assert
+        assert json_data == {'timeInterval': '1m30s', 'queryTimeout': '1h30m'}
+
+    def test__invalid_advertised_scrape_interval_is_ignored(self):
+        # Setup
+        prometheus_server_details = interface_http.ServerDetails(
+            host=str(uuid4()),
+            port=random.randint(1, 65535),
+            scrape_interval='every minute',
+        )
+
+        # Exercise
+        json_data = domain.build_prometheus_json_data(
+            {}, prometheus_server_details)
+
+        # Assert
+        assert json_data == {}
+
+    def test__invalid_http_method_is_rejected(self):
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_prometheus_json_data(
+                {'prometheus-http-method': 'PUT'},
+                self.mock_prometheus_server_details)
+
+        # Assert
+        assert type(err.value.status) == BlockedStatus
+        assert err.value.status.message.startswith('prometheus-http-method')
+
+    def test__invalid_duration_is_rejected(self):
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_prometheus_json_data(
+                {'prometheus-query-timeout': 'forever'},
+                self.mock_prometheus_server_details)
+
+        # Assert
+        assert err.value.status.message.startswith('prometheus-query-timeout')
+
+    def test__invalid_cache_level_is_rejected(self):
+        # Exercise
+        with pytest.raises(domain.ConfigError):
+            domain.build_prometheus_json_data(
+                {'prometheus-cache-level': 'Extreme'},
+                self.mock_prometheus_server_details)
+
+
+class BuildDashboardGroupsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dashboards = {
+            f'{uuid4()}.json': json.dumps({
+                'id': random.randint(1, 1000),
+                'uid': str(uuid4()),
+                'title': str(uuid4()),
+                'panels': [],
+            }, indent=4)
+            for _ in range(100)
+        }
+
+    def test__minifies_and_drops_database_ids(self):
+        # Exercise
+        groups = domain.build_dashboard_groups(self.dashboards,
+                                               group_count=4,
+                                               group_size_budget=100000,
+                                               size_budget=1000000)
+
+        # Assert
+        files = {k: v for i in groups.values() for k, v in i.items()}
+        assert len(files) == len(self.dashboards)
+        for content in files.values():
+            assert ' ' not in content
+            assert 'id' not in json.loads(content)
+
+    def test__deduplicates_dashboards_by_uid(self):
+        # Setup
+        dashboard = {'uid': str(uuid4()), 'title': str(uuid4())}
+        dashboards = {
+            str(uuid4()): dashboard,
+            str(uuid4()): json.dumps(dashboard),
+        }
+
+        # Exercise
+        groups = domain.build_dashboard_groups(dashboards,
+                                               group_count=1,
+                                               group_size_budget=100000,
+                                               size_budget=1000000)
+
+        # Assert
+        assert list(groups.values()) == [{
+            f"{dashboard['uid']}.json": json.dumps(
+                dashboard, separators=(',', ':'), sort_keys=True)
+        }]
+
+    def test__skips_invalid_dashboards(self):
+        # Setup
+        dashboards = {str(uuid4()): '[]', str(uuid4()): '{'}
+
+        # Exercise
+        groups = domain.build_dashboard_groups(dashboards,
+                                               group_count=2,
+                                               group_size_budget=100000,
+                                               size_budget=1000000)
+
+        # Assert
+        assert groups == {
+            'dashboards-0': {domain.DASHBOARD_GROUP_PLACEHOLDER: ''},
+            'dashboards-1': {domain.DASHBOARD_GROUP_PLACEHOLDER: ''},
+        }
+
+    def test__groups_that_exceed_the_group_size_budget_are_rejected(self):
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_dashboard_groups(self.dashboards,
+                                          group_count=2,
+                                          group_size_budget=1000,
+                                          size_budget=1000000)
+
+        # Assert
+        assert err.value.status.message.startswith('dashboards-groups')
+
+    def test__a_changed_dashboard_only_changes_its_own_group(self):
+        # Setup
+        groups = domain.build_dashboard_groups(self.dashboards,
+                                               group_count=8,
+                                               group_size_budget=100000,
+                                               size_budget=1000000)
+        source_name = sorted(self.dashboards)[0]
+        dashboard = json.loads(self.dashboards[source_name])
+        dashboard['panels'].append({'title': str(uuid4())})
+        changed_dashboards = dict(self.dashboards)
+        changed_dashboards[source_name] = json.dumps(dashboard)
+
+        # Exercise
+        changed_groups = domain.build_dashboard_groups(
+            changed_dashboards,
+            group_count=8,
+            group_size_budget=100000,
+            size_budget=1000000)
+
+        # Assert
+        assert set(changed_groups) == set(groups)
+        assert len([i for i in groups
+                    if groups[i] != changed_groups[i]]) == 1
+
+    def test__removing_every_dashboard_of_a_group_keeps_the_group(self):
+        # Setup
+        groups = domain.build_dashboard_groups(self.dashboards,
+                                               group_count=8,
+                                               group_size_budget=100000,
+                                               size_budget=1000000)
+        filenames = set(groups['dashboards-0'])
+        remaining_dashboards = {
+            k: v for k, v in self.dashboards.items()
+            if f"{json.loads(v)['uid']}.json" not in filenames
+        }
+
+        # Exercise
+        changed_groups = domain.build_dashboard_groups(
+            remaining_dashboards,
+            group_count=8,
+            group_size_budget=100000,
+            size_budget=1000000)
+
+        # Assert
+        assert set(changed_groups) == set(groups)
+        assert changed_groups['dashboards-0'] == \
+            {domain.DASHBOARD_GROUP_PLACEHOLDER: ''}
+
+    def test__dashboards_over_the_size_budget_are_rejected(self):
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_dashboard_groups(self.dashboards,
+                                          group_count=4,
+                                          group_size_budget=100000,
+                                          size_budget=1000)
+
+        # Assert
+        assert err.value.status.message.startswith('dashboards-size-budget')
+
+    def test__pod_spec_mounts_each_group_and_the_provider(self):
+        # Setup
+        charm_config = {
+            'advertised-port': random.randint(1, 65535),
+            'dashboards-groups': 4,
+            'dashboards-group-size-budget': 100000,
+            'dashboards-size-budget': 1000000,
+        }
+        image_meta = ImageMeta({
+            'registrypath': str(uuid4()),
+            'username': str(uuid4()),
+            'password': str(uuid4()),
+        })
+
+        # Exercise
+        spec = domain.build_juju_pod_spec(app_name=str(uuid4()),
+                                          charm_config=charm_config,
+                                          image_meta=image_meta,
+                                          dashboards=self.dashboards)
+
+        # Assert
+        volumes = {i['name']: i for i in spec['containers'][0]['volumeConfig']}
+        groups = domain.build_dashboard_groups(self.dashboards,
+                                               group_count=4,
+                                               group_size_budget=100000,
+                                               size_budget=1000000)
+        assert 'path: /etc/grafana/dashboards' in \
+            volume_files(volumes['dashboards-provider'])['dashboards.yaml']
+        assert len(groups) == 4
+        for group_name, group_files in groups.items():
+            assert volumes[group_name]['mountPath'] == \
+                f'/etc/grafana/dashboards/{group_name}'
+            assert volume_files(volumes[group_name]) == group_files
+
+
+def build_pod_status_dict(phase='Running', ready=True, waiting_reason=None,
+                          restart_count=0, last_termination_reason=None,
+                          revision=None):
+    container_state = {'running': {}}
+    if waiting_reason:
+        container_state = {'waiting': {'reason': waiting_reason}}
+
+    last_container_state = {}
+    if last_termination_reason:
+        last_container_state = {
+            'terminated': {'reason': last_termination_reason}
+        }
+
+    return {
+        'metadata': {
+            'annotations': {
+                'juju.io/unit': str(uuid4())
+            },
+            'labels': {
+                'controller-revision-hash': revision
+            }
+        },
+        'status': {
+            'phase': phase,
+            'conditions': [{
+                'type': 'ContainersReady',
+                'status': str(ready)
+            }],
+            'containerStatuses': [{
+                'restartCount': restart_count,
+                'state': container_state,
+                'lastState': last_container_state
+            }]
+        }
+    }
+
+
+class BuildJujuUnitStatusTest(unittest.TestCase):
+
+    def test__pod_is_unknown(self):
+        # Exercise
+        unit_status = domain.build_juju_unit_status(PodStatus(None))
+
+        # Assert
+        assert unit_status == MaintenanceStatus("Waiting for pod to appear")
+
+    def test__pod_is_starting(self):
+        # Setup
+        pod_status = PodStatus(build_pod_status_dict(phase='Pending',
+                                                     ready=False))
+
+        # Exercise
+        unit_status = domain.build_juju_unit_status(pod_status)
+
+        # Assert
+        assert unit_status == MaintenanceStatus("Pod is starting")
+
+    def test__pod_was_oom_killed_and_is_crash_looping(self):
+        # Setup
+        pod_status = PodStatus(build_pod_status_dict(
+            ready=False,
+            waiting_reason='CrashLoopBackOff',
+            restart_count=4,
+            last_termination_reason='OOMKilled'))
+
+        # Exercise
+        unit_status = domain.build_juju_unit_status(pod_status)
+
+        # Assert
+        assert unit_status == MaintenanceStatus(
+            "Pod is getting ready (CrashLoopBackOff; "
+            "last terminated: OOMKilled; 4 restarts)")
+
+    def test__pod_is_ready(self):
+        # Setup
+        pod_status = PodStatus(build_pod_status_dict())
+
+        # Exercise
+        unit_status = domain.build_juju_unit_status(pod_status)
+
+        # Assert
+        assert unit_status == ActiveStatus()
+
+    def test__pod_is_ready_with_resource_usage(self):
+        # Setup
+        pod_status = PodStatus(build_pod_status_dict(restart_count=1))
+        pod_metrics = PodMetrics({
+            'kind': 'PodMetrics',
+            'containers': [{
+                'usage': {
+                    'cpu': '250000000n',
+                    'memory': '131072Ki'
                 }
             }]
-        }]}
+        })
+
+        # Exercise
+        unit_status = domain.build_juju_unit_status(pod_status, pod_metrics)
+
+        # Assert
+        assert unit_status == ActiveStatus("1 restarts; cpu 250m, mem 128Mi")
+
+
+class BuildPodStatusSummaryTest(unittest.TestCase):
+
+    def test__summarizes_each_unit(self):
+        # Setup
+        restart_count = random.randint(1, 100)
+        revision = str(uuid4())
+        pod_statuses = {
+            'grafana/0': PodStatus(build_pod_status_dict(revision=revision)),
+            'grafana/1': PodStatus(build_pod_status_dict(phase='Pending',
+                                                         ready=False,
+                                                         revision=revision)),
+            'grafana/2': PodStatus(build_pod_status_dict(
+                ready=False,
+                waiting_reason='CrashLoopBackOff',
+                restart_count=restart_count,
+                last_termination_reason='OOMKilled',
+                revision=revision)),
+        }
+
+        # Exercise
+        summary = domain.build_pod_status_summary(pod_statuses)
+
+        # Assert
+        assert summary == {
+            'grafana/0': {'state': 'ready', 'restarts': 0,
+                          'last-terminated': None, 'revision': revision},
+            'grafana/1': {'state': 'starting', 'restarts': 0,
+                          'last-terminated': None, 'revision': revision},
+            'grafana/2': {'state': 'crash-looping', 'restarts': restart_count,
+                          'last-terminated': 'OOMKilled',
+                          'revision': revision},
+        }
+
+
+class BuildJujuUnitStatusFromSummaryTest(unittest.TestCase):
+
+    def test__ready_pod_keeps_its_restart_details(self):
+        # Exercise
+        unit_status = domain.build_juju_unit_status_from_summary({
+            'state': 'ready',
+            'restarts': 2,
+            'last-terminated': 'OOMKilled',
+        })
+
+        # Assert
+        assert unit_status == ActiveStatus(
+            "last terminated: OOMKilled; 2 restarts")
+
+    def test__pod_that_is_not_ready_has_no_status(self):
+        # Exercise and Assert
+        assert domain.build_juju_unit_status_from_summary(
+            {'state': 'starting', 'restarts': 0}) is None
+        assert domain.build_juju_unit_status_from_summary({}) is None
+
+
+class BuildJujuAppStatusTest(unittest.TestCase):
+
+    def test__all_units_are_ready(self):
+        # Setup
+        summary = {
+            'grafana/0': {'state': 'ready', 'restarts': 1},
+            'grafana/1': {'state': 'ready', 'restarts': 2},
+        }
+
+        # Exercise
+        app_status = domain.build_juju_app_status(summary)
+
+        # Assert
+        assert type(app_status) == ActiveStatus
+        assert app_status.message == \
+            "2/2 units ready, 0 starting, 0 crash-looping, 3 restarts"
+
+    def test__some_units_are_not_ready(self):
+        # Setup
+        summary = {
+            'grafana/0': {'state': 'ready', 'restarts': 0},
+            'grafana/1': {'state': 'starting', 'restarts': 0},
+            'grafana/2': {'state': 'crash-looping', 'restarts': 5},
+        }
+
+        # Exercise
+        app_status = domain.build_juju_app_status(summary)
+
+        # Assert
+        assert type(app_status) == MaintenanceStatus
+        assert app_status.message == \
+            "1/3 units ready, 1 starting, 1 crash-looping, 5 restarts"
+
+    def test__no_units_are_known(self):
+        # Exercise
+        app_status = domain.build_juju_app_status({})
+
+        # Assert
+        assert type(app_status) == MaintenanceStatus
+
+    def test__autoscaler_wants_more_replicas_than_there_are_units(self):
+        # Setup
+        summary = {
+            'grafana/0': {'state': 'ready', 'restarts': 0},
+        }
+
+        # Exercise
+        app_status = domain.build_juju_app_status(
+            summary, {'current': 1, 'desired': 2})
+
+        # Assert
+        assert type(app_status) == MaintenanceStatus
+        assert app_status.message == "1/1 units ready, 0 starting, " \
+            "0 crash-looping, 0 restarts, 1/2 replicas"
+
+    def test__autoscaler_and_units_agree(self):
+        # Setup
+        summary = {
+            'grafana/0': {'state': 'ready', 'restarts': 0},
+            'grafana/1': {'state': 'ready', 'restarts': 0},
+        }
+
+        # Exercise
+        app_status = domain.build_juju_app_status(
+            summary, {'current': 2, 'desired': 2, 'min': 1, 'max': 3})
+
+        # Assert
+        assert type(app_status) == ActiveStatus
+
+    def test__juju_scale_outside_the_autoscaler_bounds_is_blocked(self):
+        # Setup
+        summary = {
+            'grafana/0': {'state': 'ready', 'restarts': 0},
+            'grafana/1': {'state': 'ready', 'restarts': 0},
+            'grafana/2': {'state': 'ready', 'restarts': 0},
+            'grafana/3': {'state': 'ready', 'restarts': 0},
+        }
+
+        # Exercise
+        app_status = domain.build_juju_app_status(
+            summary, {'current': 4, 'desired': 3, 'min': 2, 'max': 3})
+
+        # Assert
+        assert type(app_status) == BlockedStatus
+        assert app_status.message == \
+            "4 units is outside autoscaling-min-replicas 2 and " \
+            "autoscaling-max-replicas 3; run juju scale-application " \
+            "within them"
+
+
+class BuildIngressAnnotationsTest(unittest.TestCase):
+
+    def test__annotations_are_removed_when_disabled(self):
+        # Exercise
+        annotations = domain.build_ingress_annotations({
+            'ingress-gzip': False,
+            'ingress-static-max-age': 0,
+        })
+
+        # Assert
+        assert annotations == {
+            domain.INGRESS_SNIPPET_ANNOTATION: None,
+            domain.INGRESS_BACKEND_PROTOCOL_ANNOTATION: None,
+        }
+
+    def test__gzip_and_static_asset_caching(self):
+        # Exercise
+        annotations = domain.build_ingress_annotations({
+            'ingress-gzip': True,
+            'ingress-static-max-age': 3600,
+        })
+
+        # Assert
+        assert annotations == {
+            domain.INGRESS_SNIPPET_ANNOTATION:
+                'gzip on;\n'
+                'gzip_types text/css application/javascript '
+                'application/json image/svg+xml;\n'
+                'if ($request_uri ~* "^/public/") {\n'
+                '  expires 3600s;\n'
+                '}\n',
+            domain.INGRESS_BACKEND_PROTOCOL_ANNOTATION: None,
+        }
+
+    def test__ingress_talks_tls_to_grafana_serving_h2(self):
+        # Exercise
+        annotations = domain.build_ingress_annotations({'protocol': 'h2'})
+
+        # Assert
+        assert annotations[domain.INGRESS_BACKEND_PROTOCOL_ANNOTATION] == \
+            'HTTPS'
+
+
+class BuildJujuK8sResourcesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_app_name = str(uuid4())
+
+    def test__there_are_no_resources_by_default(self):
+        # Exercise and Assert
+        assert domain.build_juju_k8s_resources(self.mock_app_name, {}) is None
+
+    def test__tls_certificate_goes_into_a_secret(self):
+        # Setup
+        tls_certificate = {'cert': str(uuid4()), 'key': str(uuid4())}
+
+        # Exercise
+        k8s_resources = domain.build_juju_k8s_resources(
+            self.mock_app_name, {'protocol': 'https'}, tls_certificate)
+
+        # Assert
+        secrets = k8s_resources['kubernetesResources']['secrets']
+        assert len(secrets) == 1
+        assert secrets[0]['name'].startswith(f'{self.mock_app_name}-tls-')
+        assert secrets[0]['type'] == 'kubernetes.io/tls'
+        assert secrets[0]['stringData'] == {
+            'tls.crt': tls_certificate['cert'],
+            'tls.key': tls_certificate['key'],
+        }
+        assert 'pod' not in k8s_resources['kubernetesResources']
+
+    def test__a_new_certificate_gets_a_new_secret(self):
+        # Setup
+        tls_certificates = [{'cert': str(uuid4()), 'key': str(uuid4())}
+                            for _ in range(2)]
+
+        # Exercise
+        secret_names = [domain.build_juju_k8s_resources(
+            self.mock_app_name, {'protocol': 'h2'}, tls_certificate)[
+                'kubernetesResources']['secrets'][0]['name']
+            for tls_certificate in tls_certificates]
+
+        # Assert
+        assert secret_names[0] != secret_names[1]
+
+    def test__there_is_no_secret_without_tls(self):
+        # Exercise and Assert
+        assert domain.build_juju_k8s_resources(
+            self.mock_app_name, {'protocol': 'http'},
+            {'cert': str(uuid4()), 'key': str(uuid4())}) is None
+
+
+class BuildHorizontalPodAutoscalerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_app_name = str(uuid4())
+        self.mock_config = {
+            'autoscaling-max-replicas': 5,
+            'autoscaling-min-replicas': 2,
+            'autoscaling-cpu-target': 70,
+        }
+
+    def test__autoscaler_targets_the_app_statefulset(self):
+        # Exercise
+        autoscaler = domain.build_horizontal_pod_autoscaler(
+            self.mock_app_name, self.mock_config)
+
+        # Assert
+        assert autoscaler['metadata']['name'] == self.mock_app_name
+        assert autoscaler['spec']['scaleTargetRef'] == {
+            'apiVersion': 'apps/v1',
+            'kind': 'StatefulSet',
+            'name': self.mock_app_name,
+        }
+        assert autoscaler['spec']['minReplicas'] == 2
+        assert autoscaler['spec']['maxReplicas'] == 5
+        assert autoscaler['spec']['metrics'][0]['resource'] == {
+            'name': 'cpu',
+            'target': {
+                'type': 'Utilization',
+                'averageUtilization': 70,
+            },
+        }
+
+    def test__autoscaling_is_disabled_by_default(self):
+        # Setup
+        self.mock_config['autoscaling-max-replicas'] = 0
+
+        # Exercise and Assert
+        assert domain.build_horizontal_pod_autoscaler(
+            self.mock_app_name, self.mock_config) is None
+
+    def test__max_replicas_below_min_replicas_is_rejected(self):
+        # Setup
+        self.mock_config['autoscaling-max-replicas'] = 1
+
+        # Exercise
+        with pytest.raises(domain.ConfigError) as err:
+            domain.build_horizontal_pod_autoscaler(self.mock_app_name,
+                                                   self.mock_config)
+
+        # Assert
+        assert err.value.status.message.startswith('autoscaling-max-replicas')
+
+
+class BuildLoadTestSummaryTest(unittest.TestCase):
+
+    def test__it_reports_throughput_and_percentiles_per_scenario(self):
+        # Setup
+        samples = [('search', i / 1000, True) for i in range(1, 101)] + \
+            [('query', 0.5, False), ('query', 0.25, True)]
+        result = LoadTestResult(samples, elapsed=2.0)
+
+        # Exercise
+        summary = domain.build_load_test_summary(result)
+
+        # Assert
+        assert summary['requests'] == '102'
+        assert summary['errors'] == '1'
+        assert summary['elapsed'] == '2.00s'
+        assert summary['throughput'] == '51.0/s'
+        assert summary['search.requests'] == '100'
+        assert summary['search.errors'] == '0'
+        assert summary['search.p50'] == '50.0ms'
+        assert summary['search.p90'] == '90.0ms'
+        assert summary['search.p99'] == '99.0ms'
+        assert summary['search.max'] == '100.0ms'
+        assert summary['query.errors'] == '1'
+        assert summary['query.p50'] == '250.0ms'
+        assert summary['query.max'] == '500.0ms'
+
+    def test__all_results_are_flat_strings(self):
+        # Setup
+        samples = [('search', 0.1, True), ('query', 0.2, False)]
+        result = LoadTestResult(samples, elapsed=1.0)
+
+        # Exercise
+        summary = domain.build_load_test_summary(result)
+
+        # Assert
+        assert all(isinstance(value, str) for value in summary.values())
+
+    def test__it_reports_no_scenarios_without_samples(self):
+        # Exercise
+        summary = domain.build_load_test_summary(LoadTestResult([], 0))
+
+        # Assert
+        assert summary == {
+            'requests': '0',
+            'errors': '0',
+            'elapsed': '0.00s',
+            'throughput': '0.0/s',
+        }
+
+
+class BuildMigrationSummaryTest(unittest.TestCase):
+
+    def test__it_reports_rows_per_table_with_valid_result_keys(self):
+        # Exercise
+        summary = domain.build_migration_summary(
+            {'dashboard': 300, 'dashboard_version': 900}, elapsed=4.0)
+
+        # Assert
+        assert summary == {
+            'tables': '2',
+            'rows': '1200',
+            'elapsed': '4.00s',
+            'throughput': '300.0 rows/s',
+            'copied.dashboard': '300',
+            'copied.dashboard-version': '900',
+        }
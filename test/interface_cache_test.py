@@ -0,0 +1,117 @@
+import random
+import sys
+import unittest
+from unittest.mock import (
+    patch,
+)
+from uuid import uuid4
+
+sys.path.append('lib')
+from ops.testing import (
+    Harness,
+)
+
+sys.path.append('src')
+import charm
+from interface_cache import (
+    CacheServerDetails,
+)
+
+
+class CacheServerDetailsTest(unittest.TestCase):
+
+    def test__address_prefers_the_ingress_address(self):
+        # Setup
+        ingress_address = str(uuid4())
+        port = str(random.randint(1, 65535))
+
+        # Exercise
+        server_details = CacheServerDetails({
+            'cache_type': 'redis',
+            'hostname': str(uuid4()),
+            'ingress-address': ingress_address,
+            'port': port,
+        })
+
+        # Assert
+        assert server_details.address == f'{ingress_address}:{port}'
+        assert server_details.password is None
+
+    def test__restore__restores_from_snapshot(self):
+        # Setup
+        server_details = CacheServerDetails({
+            'cache_type': 'memcached',
+            'host': str(uuid4()),
+            'port': str(random.randint(1, 65535)),
+        })
+
+        # Exercise
+        restored = CacheServerDetails.restore(server_details.snapshot())
+
+        # Assert
+        assert restored.cache_type == server_details.cache_type
+        assert restored.address == server_details.address
+
+
+class CacheInterfaceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.harness = Harness(charm.Charm)
+        self.harness.begin()
+
+    @patch.object(charm, 'on_server_new_relation_handler', spec_set=True)
+    def test__emits_new_relation_with_the_cache_type(
+            self,
+            mock_on_server_new_relation_handler):
+        # Setup
+        relation_id = self.harness.add_relation('memcached', 'memcached')
+        self.harness.add_relation_unit(relation_id, 'memcached/0')
+
+        # Exercise
+        self.harness.update_relation_data(relation_id, 'memcached/0', {
+            'host': str(uuid4()),
+            'port': str(random.randint(1, 65535)),
+        })
+
+        # Assert
+        assert mock_on_server_new_relation_handler.call_count == 1
+
+        args, kwargs = mock_on_server_new_relation_handler.call_args
+        assert args[0].server_details.cache_type == 'memcached'
+
+    @patch.object(charm, 'on_server_new_relation_handler', spec_set=True)
+    def test__waits_for_the_remote_address(
+            self,
+            mock_on_server_new_relation_handler):
+        # Setup
+        relation_id = self.harness.add_relation('redis', 'redis')
+        self.harness.add_relation_unit(relation_id, 'redis/0')
+
+        # Exercise
+        self.harness.update_relation_data(relation_id, 'redis/0', {
+            str(uuid4()): str(uuid4()),
+        })
+
+        # Assert
+        assert mock_on_server_new_relation_handler.call_count == 0
+
+    @patch.object(charm, 'on_server_new_relation_handler', spec_set=True)
+    def test__forgets_the_cache_when_the_relation_is_broken(
+            self,
+            mock_on_server_new_relation_handler):
+        # Setup
+        relation_id = self.harness.add_relation('redis', 'redis')
+        self.harness.add_relation_unit(relation_id, 'redis/0')
+        self.harness.update_relation_data(relation_id, 'redis/0', {
+            'host': str(uuid4()),
+            'port': str(random.randint(1, 65535)),
+        })
+        relation = self.harness.charm.model.get_relation('redis', relation_id)
+
+        # Exercise
+        self.harness.charm.on['redis'].relation_broken.emit(relation)
+
+        # Assert
+        assert mock_on_server_new_relation_handler.call_count == 2
+        assert dict(self.harness.charm.state.cache_servers) == {}
+        assert charm.get_cache_server_details(self.harness.charm.state) is None
@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 import shutil
 import random
@@ -84,8 +85,21 @@ class ServerDetailsTest(unittest.TestCase):
         assert snapshot == {
             'server_details.host': server_details.host,
             'server_details.port': server_details.port,
+            'server_details.scrape_interval': server_details.scrape_interval,
         }
 
+    def test__restore__restores_from_snapshot_with_scrape_interval(self):
+        # Set up
+        server_details = ServerDetails(host=f'{uuid4()}',
+                                       port=random.randint(1, 65535),
+                                       scrape_interval='30s')
+
+        # Exercise
+        restored = ServerDetails.restore(server_details.snapshot())
+
+        # Assertions
+        assert restored.scrape_interval == '30s'
+
     def test__restore__restores_from_snapshot(self):
         # Set up
         mock_port = random.randint(1, 65535)
@@ -162,6 +176,18 @@ class ClientTest(unittest.TestCase):
 
         return framework
 
+    def mock_relation(self, mock_framework_adapter_cls, app_data=None,
+                      app_name='prometheus'):
+        mock_relation = Mock()
+        mock_relation.app.name = app_name
+        mock_relation.units = []
+        mock_relation.data = {mock_relation.app: app_data or {}}
+
+        mock_adapter = mock_framework_adapter_cls.return_value
+        mock_adapter.get_relations.return_value = [mock_relation]
+
+        return mock_relation
+
     @patch('interface_http.framework.FrameworkAdapter',
            autospec=True, spec_set=True)
     def test__init__observes_the_relation_changed_event(
@@ -171,6 +197,7 @@ class ClientTest(unittest.TestCase):
         mock_adapter = mock_framework_adapter_cls.return_value
         mock_relation_name = f'{uuid4()}'
         mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
         mock_charm.on = {mock_relation_name: Mock()}
 
         # Exercise
@@ -194,11 +221,17 @@ class ClientTest(unittest.TestCase):
         # Set up
         mock_relation_name = f'{uuid4()}'
         mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
         mock_charm.on = {mock_relation_name: Mock()}
         mock_event = create_autospec(EventBase, spec_set=True)
+        self.mock_relation(mock_framework_adapter_cls)
 
         mock_service_spec = create_autospec(k8s.ServiceSpec, spec_set=True)
+        mock_service_spec.host = f'{uuid4()}'
+        mock_service_spec.port = random.randint(1, 65535)
+        mock_service_spec.resource_version = f'{uuid4()}'
         mock_k8s_mod.get_service_spec.return_value = mock_service_spec
+        mock_k8s_mod.get_service_dns_name.return_value = None
 
         mock_emit_method = Mock()
         mock_server_available_attr = Mock()
@@ -219,3 +252,470 @@ class ClientTest(unittest.TestCase):
         args, kwargs = mock_emit_method.call_args
         assert args[0].host == mock_service_spec.host
         assert args[0].port == mock_service_spec.port
+
+    @patch('interface_http.framework.FrameworkAdapter',
+           autospec=True, spec_set=True)
+    @patch('interface_http.k8s', autospec=True, spec_set=True)
+    def test__on_relation_change__skips_download_if_version_unchanged(
+            self,
+            mock_k8s_mod,
+            mock_framework_adapter_cls):
+        # Set up
+        mock_relation_name = f'{uuid4()}'
+        mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
+        mock_charm.on = {mock_relation_name: Mock()}
+        mock_event = create_autospec(EventBase, spec_set=True)
+        self.mock_relation(mock_framework_adapter_cls)
+
+        mock_resource_version = f'{uuid4()}'
+        mock_service_spec = create_autospec(k8s.ServiceSpec, spec_set=True)
+        mock_service_spec.host = f'{uuid4()}'
+        mock_service_spec.port = random.randint(1, 65535)
+        mock_service_spec.resource_version = mock_resource_version
+        mock_k8s_mod.get_service_spec.return_value = mock_service_spec
+        mock_k8s_mod.get_service_dns_name.return_value = None
+        mock_k8s_mod.get_service_resource_version.return_value = \
+            mock_resource_version
+
+        mock_emit_method = Mock()
+        mock_client_events = \
+            create_autospec(ClientEvents, spec_set=True).return_value
+        mock_client_events.server_available = Mock(emit=mock_emit_method)
+
+        # Exercise
+        client = Client(mock_charm, mock_relation_name)
+
+        with patch.object(Client, 'on', mock_client_events):
+            client.on_relation_changed(mock_event)
+            client.on_relation_changed(mock_event)
+
+        # Assertions
+        assert mock_k8s_mod.get_service_spec.call_count == 1
+        assert mock_k8s_mod.get_service_resource_version.call_count == 1
+        assert mock_emit_method.call_count == 1
+
+    @patch('interface_http.framework.FrameworkAdapter',
+           autospec=True, spec_set=True)
+    @patch('interface_http.k8s', autospec=True, spec_set=True)
+    def test__on_relation_change__does_not_emit_if_details_unchanged(
+            self,
+            mock_k8s_mod,
+            mock_framework_adapter_cls):
+        # Set up
+        mock_relation_name = f'{uuid4()}'
+        mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
+        mock_charm.on = {mock_relation_name: Mock()}
+        mock_event = create_autospec(EventBase, spec_set=True)
+        self.mock_relation(mock_framework_adapter_cls)
+
+        mock_service_spec = create_autospec(k8s.ServiceSpec, spec_set=True)
+        mock_service_spec.host = f'{uuid4()}'
+        mock_service_spec.port = random.randint(1, 65535)
+        mock_service_spec.resource_version = f'{uuid4()}'
+        mock_k8s_mod.get_service_spec.return_value = mock_service_spec
+        mock_k8s_mod.get_service_dns_name.return_value = None
+        mock_k8s_mod.get_service_resource_version.return_value = \
+            f'{uuid4()}'
+
+        mock_emit_method = Mock()
+        mock_client_events = \
+            create_autospec(ClientEvents, spec_set=True).return_value
+        mock_client_events.server_available = Mock(emit=mock_emit_method)
+
+        # Exercise
+        client = Client(mock_charm, mock_relation_name)
+
+        with patch.object(Client, 'on', mock_client_events):
+            client.on_relation_changed(mock_event)
+            client.on_relation_changed(mock_event)
+
+        # Assertions
+        assert mock_k8s_mod.get_service_spec.call_count == 2
+        assert mock_emit_method.call_count == 1
+
+    @patch('interface_http.framework.FrameworkAdapter',
+           autospec=True, spec_set=True)
+    @patch('interface_http.k8s', autospec=True, spec_set=True)
+    def test__on_relation_change__emits_the_advertised_scrape_interval(
+            self,
+            mock_k8s_mod,
+            mock_framework_adapter_cls):
+        # Set up
+        mock_relation_name = f'{uuid4()}'
+        mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
+        mock_charm.on = {mock_relation_name: Mock()}
+        mock_event = create_autospec(EventBase, spec_set=True)
+        self.mock_relation(mock_framework_adapter_cls,
+                           app_data={'scrape-interval': '15s'})
+
+        mock_service_spec = create_autospec(k8s.ServiceSpec, spec_set=True)
+        mock_service_spec.host = f'{uuid4()}'
+        mock_service_spec.port = random.randint(1, 65535)
+        mock_service_spec.resource_version = f'{uuid4()}'
+        mock_k8s_mod.get_service_spec.return_value = mock_service_spec
+        mock_k8s_mod.get_service_dns_name.return_value = None
+
+        mock_emit_method = Mock()
+        mock_client_events = \
+            create_autospec(ClientEvents, spec_set=True).return_value
+        mock_client_events.server_available = Mock(emit=mock_emit_method)
+
+        # Exercise
+        client = Client(mock_charm, mock_relation_name)
+
+        with patch.object(Client, 'on', mock_client_events):
+            client.on_relation_changed(mock_event)
+
+        # Assertions
+        args, kwargs = mock_emit_method.call_args
+        assert args[0].scrape_interval == '15s'
+
+    @patch('interface_http.framework.FrameworkAdapter',
+           autospec=True, spec_set=True)
+    @patch('interface_http.k8s', autospec=True, spec_set=True)
+    def test__on_relation_change__leader_publishes_server_details(
+            self,
+            mock_k8s_mod,
+            mock_framework_adapter_cls):
+        # Set up
+        mock_relation_name = f'{uuid4()}'
+        mock_peer_relation_name = f'{uuid4()}'
+        mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
+        mock_charm.on = {mock_relation_name: Mock(),
+                         mock_peer_relation_name: Mock()}
+        mock_event = create_autospec(EventBase, spec_set=True)
+        self.mock_relation(mock_framework_adapter_cls)
+
+        mock_adapter = mock_framework_adapter_cls.return_value
+        mock_adapter.am_i_leader.return_value = True
+        peer_data = {}
+        mock_adapter.get_app_relation_data.return_value = peer_data
+
+        mock_service_spec = create_autospec(k8s.ServiceSpec, spec_set=True)
+        mock_service_spec.host = f'{uuid4()}'
+        mock_service_spec.port = random.randint(1, 65535)
+        mock_service_spec.resource_version = f'{uuid4()}'
+        mock_k8s_mod.get_service_spec.return_value = mock_service_spec
+        mock_k8s_mod.get_service_dns_name.return_value = None
+
+        mock_client_events = \
+            create_autospec(ClientEvents, spec_set=True).return_value
+        mock_client_events.server_available = Mock()
+
+        # Exercise
+        client = Client(mock_charm, mock_relation_name,
+                        peer_relation_name=mock_peer_relation_name)
+
+        with patch.object(Client, 'on', mock_client_events):
+            client.on_relation_changed(mock_event)
+
+        # Assertions
+        published = json.loads(peer_data[client.published_details_key])
+        assert ServerDetails.restore(published).host == mock_service_spec.host
+        assert mock_adapter.get_app_relation_data.call_args == \
+            call(mock_peer_relation_name)
+
+    @patch('interface_http.framework.FrameworkAdapter',
+           autospec=True, spec_set=True)
+    @patch('interface_http.k8s', autospec=True, spec_set=True)
+    def test__on_relation_change__non_leader_uses_published_details(
+            self,
+            mock_k8s_mod,
+            mock_framework_adapter_cls):
+        # Set up
+        mock_relation_name = f'{uuid4()}'
+        mock_peer_relation_name = f'{uuid4()}'
+        mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
+        mock_charm.on = {mock_relation_name: Mock(),
+                         mock_peer_relation_name: Mock()}
+        mock_event = create_autospec(EventBase, spec_set=True)
+
+        server_details = ServerDetails(host=f'{uuid4()}',
+                                       port=random.randint(1, 65535))
+        mock_adapter = mock_framework_adapter_cls.return_value
+        mock_adapter.am_i_leader.return_value = False
+        mock_adapter.get_app_relation_data.return_value = {
+            f'{mock_relation_name}-server-details':
+                json.dumps(server_details.snapshot()),
+        }
+
+        mock_emit_method = Mock()
+        mock_client_events = \
+            create_autospec(ClientEvents, spec_set=True).return_value
+        mock_client_events.server_available = Mock(emit=mock_emit_method)
+
+        # Exercise
+        client = Client(mock_charm, mock_relation_name,
+                        peer_relation_name=mock_peer_relation_name)
+
+        with patch.object(Client, 'on', mock_client_events):
+            client.on_relation_changed(mock_event)
+            client.on_peer_relation_changed(mock_event)
+
+        # Assertions
+        assert mock_k8s_mod.get_service_spec.call_count == 0
+        assert mock_k8s_mod.get_service_resource_version.call_count == 0
+        assert mock_emit_method.call_count == 1
+
+        args, kwargs = mock_emit_method.call_args
+        assert args[0].snapshot() == server_details.snapshot()
+
+    @patch('interface_http.framework.FrameworkAdapter',
+           autospec=True, spec_set=True)
+    @patch('interface_http.k8s', autospec=True, spec_set=True)
+    def test__on_relation_change__uses_the_address_in_relation_data(
+            self,
+            mock_k8s_mod,
+            mock_framework_adapter_cls):
+        # Set up
+        mock_relation_name = f'{uuid4()}'
+        mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
+        mock_charm.on = {mock_relation_name: Mock()}
+        mock_event = create_autospec(EventBase, spec_set=True)
+        mock_host = f'{uuid4()}'
+        mock_port = str(random.randint(1, 65535))
+        self.mock_relation(mock_framework_adapter_cls,
+                           app_data={'host': mock_host, 'port': mock_port})
+
+        mock_emit_method = Mock()
+        mock_client_events = \
+            create_autospec(ClientEvents, spec_set=True).return_value
+        mock_client_events.server_available = Mock(emit=mock_emit_method)
+
+        # Exercise
+        client = Client(mock_charm, mock_relation_name)
+
+        with patch.object(Client, 'on', mock_client_events):
+            client.on_relation_changed(mock_event)
+
+        # Assertions
+        assert mock_k8s_mod.get_service_dns_name.call_count == 0
+        assert mock_k8s_mod.get_service_spec.call_count == 0
+
+        args, kwargs = mock_emit_method.call_args
+        assert args[0].host == mock_host
+        assert args[0].port == mock_port
+
+    @patch('interface_http.framework.FrameworkAdapter',
+           autospec=True, spec_set=True)
+    @patch('interface_http.k8s', autospec=True, spec_set=True)
+    def test__on_relation_change__uses_dns_name_with_the_published_port(
+            self,
+            mock_k8s_mod,
+            mock_framework_adapter_cls):
+        # Set up
+        mock_relation_name = f'{uuid4()}'
+        mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
+        mock_charm.on = {mock_relation_name: Mock()}
+        mock_event = create_autospec(EventBase, spec_set=True)
+        mock_port = str(random.randint(1, 65535))
+        self.mock_relation(mock_framework_adapter_cls,
+                           app_data={'port': mock_port})
+
+        mock_dns_name = f'{uuid4()}.{uuid4()}.svc'
+        mock_k8s_mod.get_service_dns_name.return_value = mock_dns_name
+
+        mock_emit_method = Mock()
+        mock_client_events = \
+            create_autospec(ClientEvents, spec_set=True).return_value
+        mock_client_events.server_available = Mock(emit=mock_emit_method)
+
+        # Exercise
+        client = Client(mock_charm, mock_relation_name)
+
+        with patch.object(Client, 'on', mock_client_events):
+            client.on_relation_changed(mock_event)
+
+        # Assertions
+        assert mock_k8s_mod.get_service_spec.call_count == 0
+        assert mock_k8s_mod.get_service_resource_version.call_count == 0
+
+        args, kwargs = mock_emit_method.call_args
+        assert args[0].host == mock_dns_name
+        assert args[0].port == mock_port
+
+    @patch('interface_http.framework.FrameworkAdapter',
+           autospec=True, spec_set=True)
+    @patch('interface_http.k8s', autospec=True, spec_set=True)
+    def test__on_relation_change__caches_the_dns_name_after_service_lookup(
+            self,
+            mock_k8s_mod,
+            mock_framework_adapter_cls):
+        # Set up
+        mock_relation_name = f'{uuid4()}'
+        mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
+        mock_charm.on = {mock_relation_name: Mock()}
+        mock_event = create_autospec(EventBase, spec_set=True)
+        self.mock_relation(mock_framework_adapter_cls)
+
+        mock_dns_name = f'{uuid4()}.{uuid4()}.svc'
+        mock_k8s_mod.get_service_dns_name.return_value = mock_dns_name
+        mock_service_spec = create_autospec(k8s.ServiceSpec, spec_set=True)
+        mock_service_spec.host = f'{uuid4()}'
+        mock_service_spec.port = random.randint(1, 65535)
+        mock_service_spec.resource_version = f'{uuid4()}'
+        mock_k8s_mod.get_service_spec.return_value = mock_service_spec
+        mock_k8s_mod.get_service_resource_version.return_value = \
+            mock_service_spec.resource_version
+
+        mock_emit_method = Mock()
+        mock_client_events = \
+            create_autospec(ClientEvents, spec_set=True).return_value
+        mock_client_events.server_available = Mock(emit=mock_emit_method)
+
+        # Exercise
+        client = Client(mock_charm, mock_relation_name)
+
+        with patch.object(Client, 'on', mock_client_events):
+            client.on_relation_changed(mock_event)
+            client.on_relation_changed(mock_event)
+
+        # Assertions
+        assert mock_k8s_mod.get_service_dns_name.call_count == 1
+        assert mock_k8s_mod.get_service_spec.call_count == 1
+        # The port is re-validated before the cached DNS name is reused
+        assert mock_k8s_mod.get_service_resource_version.call_count == 1
+        assert mock_emit_method.call_count == 1
+
+        args, kwargs = mock_emit_method.call_args
+        assert args[0].host == mock_dns_name
+        assert args[0].port == mock_service_spec.port
+
+    @patch('interface_http.framework.FrameworkAdapter',
+           autospec=True, spec_set=True)
+    @patch('interface_http.k8s', autospec=True, spec_set=True)
+    def test__on_relation_change__skips_dns_once_resolved_from_service(
+            self,
+            mock_k8s_mod,
+            mock_framework_adapter_cls):
+        # Set up
+        mock_relation_name = f'{uuid4()}'
+        mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
+        mock_charm.on = {mock_relation_name: Mock()}
+        mock_event = create_autospec(EventBase, spec_set=True)
+        self.mock_relation(mock_framework_adapter_cls)
+
+        mock_k8s_mod.get_service_dns_name.return_value = None
+        mock_service_spec = create_autospec(k8s.ServiceSpec, spec_set=True)
+        mock_service_spec.host = f'{uuid4()}'
+        mock_service_spec.port = random.randint(1, 65535)
+        mock_service_spec.resource_version = f'{uuid4()}'
+        mock_k8s_mod.get_service_spec.return_value = mock_service_spec
+        mock_k8s_mod.get_service_resource_version.return_value = \
+            mock_service_spec.resource_version
+
+        mock_client_events = \
+            create_autospec(ClientEvents, spec_set=True).return_value
+        mock_client_events.server_available = Mock()
+
+        # Exercise
+        client = Client(mock_charm, mock_relation_name)
+
+        with patch.object(Client, 'on', mock_client_events):
+            client.on_relation_changed(mock_event)
+            client.on_relation_changed(mock_event)
+
+        # Assertions
+        assert mock_k8s_mod.get_service_dns_name.call_count == 1
+        assert mock_k8s_mod.get_service_spec.call_count == 1
+        assert mock_k8s_mod.get_service_resource_version.call_count == 1
+
+    @patch('interface_http.framework.FrameworkAdapter',
+           autospec=True, spec_set=True)
+    @patch('interface_http.k8s', autospec=True, spec_set=True)
+    def test__on_relation_change__picks_up_a_changed_service_port(
+            self,
+            mock_k8s_mod,
+            mock_framework_adapter_cls):
+        # Set up
+        mock_relation_name = f'{uuid4()}'
+        mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
+        mock_charm.on = {mock_relation_name: Mock()}
+        mock_event = create_autospec(EventBase, spec_set=True)
+        self.mock_relation(mock_framework_adapter_cls)
+
+        mock_dns_name = f'{uuid4()}.{uuid4()}.svc'
+        mock_k8s_mod.get_service_dns_name.return_value = mock_dns_name
+        mock_service_specs = []
+        for _ in range(2):
+            mock_service_spec = create_autospec(k8s.ServiceSpec,
+                                                spec_set=True)
+            mock_service_spec.host = f'{uuid4()}'
+            mock_service_spec.port = random.randint(1, 65535)
+            mock_service_spec.resource_version = f'{uuid4()}'
+            mock_service_specs.append(mock_service_spec)
+        mock_k8s_mod.get_service_spec.side_effect = mock_service_specs
+        mock_k8s_mod.get_service_resource_version.return_value = \
+            mock_service_specs[1].resource_version
+
+        mock_emit_method = Mock()
+        mock_client_events = \
+            create_autospec(ClientEvents, spec_set=True).return_value
+        mock_client_events.server_available = Mock(emit=mock_emit_method)
+
+        # Exercise
+        client = Client(mock_charm, mock_relation_name)
+
+        with patch.object(Client, 'on', mock_client_events):
+            client.on_relation_changed(mock_event)
+            client.on_relation_changed(mock_event)
+
+        # Assertions
+        assert mock_k8s_mod.get_service_spec.call_count == 2
+        assert mock_emit_method.call_count == 2
+
+        args, kwargs = mock_emit_method.call_args
+        assert args[0].host == mock_dns_name
+        assert args[0].port == mock_service_specs[1].port
+
+    @patch('interface_http.framework.FrameworkAdapter',
+           autospec=True, spec_set=True)
+    @patch('interface_http.k8s', autospec=True, spec_set=True)
+    def test__on_relation_change__forgets_the_address_of_another_app(
+            self,
+            mock_k8s_mod,
+            mock_framework_adapter_cls):
+        # Set up
+        mock_relation_name = f'{uuid4()}'
+        mock_charm = Mock()
+        mock_charm.framework = self.create_framework()
+        mock_charm.on = {mock_relation_name: Mock()}
+        mock_event = create_autospec(EventBase, spec_set=True)
+        mock_port = str(random.randint(1, 65535))
+
+        mock_dns_names = [f'{uuid4()}.{uuid4()}.svc' for _ in range(2)]
+        mock_k8s_mod.get_service_dns_name.side_effect = mock_dns_names
+
+        mock_emit_method = Mock()
+        mock_client_events = \
+            create_autospec(ClientEvents, spec_set=True).return_value
+        mock_client_events.server_available = Mock(emit=mock_emit_method)
+
+        # Exercise
+        client = Client(mock_charm, mock_relation_name)
+
+        with patch.object(Client, 'on', mock_client_events):
+            self.mock_relation(mock_framework_adapter_cls,
+                               app_data={'port': mock_port},
+                               app_name=f'{uuid4()}')
+            client.on_relation_changed(mock_event)
+            self.mock_relation(mock_framework_adapter_cls,
+                               app_data={'port': mock_port},
+                               app_name=f'{uuid4()}')
+            client.on_relation_changed(mock_event)
+
+        # Assertions
+        assert mock_k8s_mod.get_service_dns_name.call_count == 2
+
+        args, kwargs = mock_emit_method.call_args
+        assert args[0].host == mock_dns_names[1]
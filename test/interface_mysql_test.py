@@ -0,0 +1,165 @@
+import random
+import sys
+import unittest
+from unittest.mock import (
+    patch,
+)
+from uuid import uuid4
+
+sys.path.append('lib')
+from ops.testing import (
+    Harness,
+)
+
+sys.path.append('src')
+import charm
+from interface_mysql import (
+    fingerprint,
+    MySQLServerDetails,
+)
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dict = {
+            'host': str(uuid4()),
+            'port': str(random.randint(1, 65535)),
+            'database': str(uuid4()),
+            'user': str(uuid4()),
+            'password': str(uuid4()),
+        }
+
+    def test__ignores_unconsumed_keys(self):
+        # Setup
+        noisy_data_dict = dict(self.data_dict)
+        noisy_data_dict[str(uuid4())] = str(uuid4())
+
+        # Exercise and Assert
+        assert fingerprint(noisy_data_dict) == fingerprint(self.data_dict)
+
+    def test__changes_when_a_consumed_key_changes(self):
+        # Setup
+        changed_data_dict = dict(self.data_dict)
+        changed_data_dict['password'] = str(uuid4())
+
+        # Exercise and Assert
+        assert fingerprint(changed_data_dict) != fingerprint(self.data_dict)
+
+
+class MySQLServerDetailsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dict = {
+            'host': str(uuid4()),
+            'port': str(random.randint(1, 65535)),
+            'database': str(uuid4()),
+            'user': str(uuid4()),
+            'password': str(uuid4()),
+        }
+
+    def test__snapshot__only_keeps_the_consumed_values(self):
+        # Setup
+        noisy_data_dict = dict(self.data_dict)
+        noisy_data_dict['ingress-address'] = str(uuid4())
+        noisy_data_dict[str(uuid4())] = str(uuid4())
+
+        # Exercise
+        snapshot = MySQLServerDetails(noisy_data_dict).snapshot()
+
+        # Assert
+        assert snapshot == dict(self.data_dict,
+                                host=noisy_data_dict['ingress-address'])
+        assert MySQLServerDetails.restore(snapshot).snapshot() == snapshot
+
+    def test__raises_value_error_if_a_required_value_is_missing(self):
+        # Setup
+        del self.data_dict['password']
+
+        # Exercise and Assert
+        with self.assertRaises(ValueError):
+            MySQLServerDetails(self.data_dict)
+
+
+class MySQLInterfaceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.harness = Harness(charm.Charm)
+        self.harness.begin()
+
+        self.relation_id = self.harness.add_relation('mysql', 'mysql')
+        self.harness.add_relation_unit(self.relation_id, 'mysql/0')
+
+        self.remote_data = {
+            'host': str(uuid4()),
+            'port': str(random.randint(1, 65535)),
+            'database': str(uuid4()),
+            'user': str(uuid4()),
+            'password': str(uuid4()),
+        }
+
+    @patch.object(charm, 'on_server_new_relation_handler', spec_set=True)
+    def test__emits_new_relation_when_consumed_data_changes(
+            self,
+            mock_on_server_new_relation_handler):
+        # Exercise
+        self.harness.update_relation_data(self.relation_id, 'mysql/0',
+                                          self.remote_data)
+
+        # Assert
+        assert mock_on_server_new_relation_handler.call_count == 1
+
+        args, kwargs = mock_on_server_new_relation_handler.call_args
+        assert args[0].server_details.snapshot() == \
+            MySQLServerDetails(self.remote_data).snapshot()
+
+    @patch.object(charm, 'on_server_new_relation_handler', spec_set=True)
+    def test__does_not_emit_when_only_unconsumed_data_changes(
+            self,
+            mock_on_server_new_relation_handler):
+        # Setup
+        self.harness.update_relation_data(self.relation_id, 'mysql/0',
+                                          self.remote_data)
+
+        # Exercise
+        self.harness.update_relation_data(self.relation_id, 'mysql/0',
+                                          {str(uuid4()): str(uuid4())})
+
+        # Assert
+        assert mock_on_server_new_relation_handler.call_count == 1
+
+    @patch.object(charm, 'on_server_new_relation_handler', spec_set=True)
+    def test__emits_again_after_the_remote_unit_departs_and_returns(
+            self,
+            mock_on_server_new_relation_handler):
+        # Setup
+        self.harness.update_relation_data(self.relation_id, 'mysql/0',
+                                          self.remote_data)
+        relation = self.harness.model.get_relation('mysql', self.relation_id)
+        unit = self.harness.model.get_unit('mysql/0')
+
+        # Exercise
+        self.harness.charm.on['mysql'].relation_departed.emit(
+            relation, relation.app, unit)
+        self.harness.charm.on['mysql'].relation_changed.emit(
+            relation, relation.app, unit)
+
+        # Assert
+        assert mock_on_server_new_relation_handler.call_count == 2
+
+    @patch.object(charm, 'on_server_new_relation_handler', spec_set=True)
+    def test__waits_for_the_remote_unit_to_publish_all_details(
+            self,
+            mock_on_server_new_relation_handler):
+        # Setup
+        partial_data = dict(self.remote_data)
+        del partial_data['password']
+
+        # Exercise
+        self.harness.update_relation_data(self.relation_id, 'mysql/0',
+                                          partial_data)
+        self.harness.update_relation_data(self.relation_id, 'mysql/0',
+                                          self.remote_data)
+
+        # Assert
+        assert mock_on_server_new_relation_handler.call_count == 1